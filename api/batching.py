@@ -0,0 +1,114 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    # Collects feature vectors from concurrent requests and scores them with
+    # one predict call per batch. A batch is flushed when it has max_batch
+    # rows or max_wait_ms after its first row, whichever comes first.
+    # predict_fn runs in a single worker thread, so the event loop keeps
+    # accepting requests while a batch is being scored.
+    def __init__(self, predict_fn, max_batch=64, max_wait_ms=2.0):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+
+        self.batches = 0
+        self.rows = 0
+
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+            self._worker = None
+
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, row) -> float:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            # drain what is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+
+            try:
+                probs = await loop.run_in_executor(self._executor, self.predict_fn, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.rows += len(batch)
+
+            for (_, future), prob in zip(batch, probs):
+                # the client may have gone away
+                if not future.done():
+                    future.set_result(float(prob))
+
+
+class LatencyTracker:
+    # Percentiles over the most recent `window` request latencies
+    def __init__(self, window=10000):
+        self._samples = deque(maxlen=window)
+        self.requests = 0
+
+    def observe(self, seconds):
+        self._samples.append(seconds * 1000)
+        self.requests += 1
+
+    def percentiles(self) -> dict:
+        if not self._samples:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+        p50, p95, p99 = np.percentile(np.fromiter(self._samples, dtype=float), [50, 95, 99])
+        return {
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3)
+        }
@@ -0,0 +1,36 @@
+import os
+
+from database.env import load_env
+
+# the service reads its settings once at start-up, .env included
+load_env()
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+# micro-batching: concurrent requests are scored together in one
+# predict_proba call of up to API_MAX_BATCH rows, waiting at most
+# API_MAX_WAIT_MS for the batch to fill up
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "64"))
+API_MAX_WAIT_MS = float(os.getenv("API_MAX_WAIT_MS", "2"))
+
+# latency objective reported by /metrics and checked by benchmarks.api_load
+API_P99_TARGET_MS = float(os.getenv("API_P99_TARGET_MS", "50"))
+
+# number of recent requests the latency percentiles are computed over
+API_LATENCY_WINDOW = int(os.getenv("API_LATENCY_WINDOW", "10000"))
+
+# online feature store: rows kept per user (at least the 7 day behavior
+# window), snapshot file for fast restarts ("" disables it) and how often
+# new core.transactions rows are pulled in
+FEATURE_STORE_RETENTION_DAYS = int(os.getenv("FEATURE_STORE_RETENTION_DAYS", "7"))
+FEATURE_STORE_SNAPSHOT = os.getenv("FEATURE_STORE_SNAPSHOT", "ml/cache/feature_store.pkl")
+FEATURE_STORE_REFRESH_SECONDS = float(os.getenv("FEATURE_STORE_REFRESH_SECONDS", "5"))
+
+# pulled rows are applied on the event loop this many at a time, requests
+# are served between the slices
+FEATURE_STORE_APPLY_ROWS = int(os.getenv("FEATURE_STORE_APPLY_ROWS", "1000"))
+
+# how often the rule file is checked for changes; a new rule set is swapped
+# in without a restart, an invalid one keeps the current rule set
+FRAUD_RULES_RELOAD_SECONDS = float(os.getenv("FRAUD_RULES_RELOAD_SECONDS", "5"))
@@ -0,0 +1,386 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+import os
+import pickle
+
+from database.etl.incremental import current_load_id
+
+# In-process online feature store keyed by user_id.
+#
+# Serves the same values as the feature SQL:
+# - transaction_features_1h / 24h: windows [ts - span, ts), strictly
+#   earlier transactions only, averages rounded like NUMERIC(12,2)
+# - is_new_device: no earlier transaction of the user on the device
+# - user_behavior_features: transaction_ts >= now - 7 days
+#
+# Per user, timestamps (epoch microseconds) and cumulative amounts (cents)
+# are kept in flat arrays, so a window is two bisects and one subtraction.
+# Appends in time order are amortized O(1); rows older than the retention
+# are compacted away from the front of the arrays.
+
+SNAPSHOT_VERSION = 1
+
+EPOCH = datetime(1970, 1, 1)
+MICROS = timedelta(microseconds=1)
+
+HOUR = 3600 * 1_000_000
+DAY = 24 * HOUR
+
+WINDOWS = {
+    "1h": HOUR,
+    "24h": DAY,
+}
+
+BEHAVIOR_WINDOW = 7 * DAY
+
+WARM_UP_FETCH_ROWS = 50_000
+
+TRANSACTIONS_SINCE_SQL = """
+    SELECT user_id, transaction_ts, amount, transaction_country, device_id, load_id
+    FROM core.transactions
+    WHERE load_id > %s
+      AND load_id <= %s
+    ORDER BY transaction_ts
+"""
+
+
+# users with a transaction that promotion changed, moved or re-stamped
+# (core.transaction_revisions) after the store observed it: rebuilt from
+# core instead of observing the new version on top of the old one
+REVISED_USERS_SQL = """
+    SELECT previous_user_id
+    FROM core.transaction_revisions
+    WHERE load_id > %(from_load_id)s
+      AND load_id <= %(to_load_id)s
+      AND previous_load_id <= %(from_load_id)s
+    UNION
+    SELECT user_id
+    FROM core.transaction_revisions
+    WHERE load_id > %(from_load_id)s
+      AND load_id <= %(to_load_id)s
+      AND previous_load_id <= %(from_load_id)s
+"""
+
+USER_TRANSACTIONS_SQL = """
+    SELECT user_id, transaction_ts, amount, transaction_country, device_id
+    FROM core.transactions
+    WHERE user_id = ANY(%s)
+      AND load_id <= %s
+    ORDER BY transaction_ts
+"""
+
+
+def to_micros(ts) -> int:
+    return (ts - EPOCH) // MICROS
+
+
+def to_cents(amount) -> int:
+    # NUMERIC(12,2) values are exact in cents
+    if isinstance(amount, Decimal):
+        return int(amount.scaleb(2))
+
+    return round(amount * 100)
+
+
+def average(total_cents, count):
+    # AVG(amount)::NUMERIC(12,2): rounded half away from zero
+    if count == 0:
+        return None
+
+    sign = -1 if total_cents < 0 else 1
+    cents = (2 * abs(total_cents) + count) // (2 * count)
+    return Decimal(sign * cents).scaleb(-2)
+
+
+class UserHistory:
+    __slots__ = ("ts", "cum_cents", "start", "devices", "countries")
+
+    def __init__(self):
+        self.ts = array("q")
+        # cum_cents[i] = sum of amounts before ts[i], one extra entry at the end
+        self.cum_cents = array("q", [0])
+        self.start = 0
+        self.devices = {}    # device_id -> first transaction_ts
+        self.countries = {}  # transaction_country -> last transaction_ts
+
+    def observe(self, ts, cents, country, device_id):
+        if not self.ts or ts >= self.ts[-1]:
+            self.ts.append(ts)
+            self.cum_cents.append(self.cum_cents[-1] + cents)
+        else:
+            # late event: O(n) insert, later prefix sums shift by its amount
+            i = bisect_right(self.ts, ts, self.start)
+            self.ts.insert(i, ts)
+            self.cum_cents.insert(i + 1, self.cum_cents[i] + cents)
+
+            for j in range(i + 2, len(self.cum_cents)):
+                self.cum_cents[j] += cents
+
+        first_seen = self.devices.get(device_id)
+
+        if first_seen is None or ts < first_seen:
+            self.devices[device_id] = ts
+
+        if ts > self.countries.get(country, ts - 1):
+            self.countries[country] = ts
+
+    def compact(self, before):
+        # drop rows older than `before`; physically shrink once half is dead
+        self.start = bisect_left(self.ts, before, self.start)
+
+        if self.start > 64 and self.start * 2 > len(self.ts):
+            base = self.cum_cents[self.start]
+            del self.ts[:self.start]
+            del self.cum_cents[:self.start]
+
+            for i in range(len(self.cum_cents)):
+                self.cum_cents[i] -= base
+
+            self.start = 0
+
+    def window(self, lower, upper=None) -> tuple:
+        # (count, cents) of rows with lower <= ts < upper
+        lo = bisect_left(self.ts, lower, self.start)
+        hi = len(self.ts) if upper is None else bisect_left(self.ts, upper, lo)
+        return hi - lo, self.cum_cents[hi] - self.cum_cents[lo]
+
+    def is_new_device(self, device_id, ts) -> bool:
+        first_seen = self.devices.get(device_id)
+        return first_seen is None or first_seen >= ts
+
+
+class OnlineFeatureStore:
+    def __init__(self, retention_days=7):
+        # None keeps the full history (parity checks)
+        if retention_days is not None and retention_days < 7:
+            raise ValueError("retention_days must cover the 7 day behavior window")
+
+        self.retention = retention_days * DAY if retention_days is not None else None
+        self.users = {}      # user_id -> (registration_date, home_country, risk_segment)
+        self.histories = {}  # user_id -> UserHistory
+        self.last_load_id = 0
+        self.last_user_ts = None
+
+    def add_user(self, user_id, registration_date, home_country, risk_segment):
+        self.users[user_id] = (registration_date, home_country, risk_segment)
+
+    def observe(self, user_id, transaction_ts, amount, transaction_country, device_id):
+        history = self.histories.get(user_id)
+
+        if history is None:
+            history = UserHistory()
+            self.histories[user_id] = history
+
+        self._observe(history, transaction_ts, amount, transaction_country, device_id)
+
+    def _observe(self, history, transaction_ts, amount, transaction_country, device_id):
+        ts = to_micros(transaction_ts)
+        history.observe(ts, to_cents(amount), transaction_country, device_id)
+
+        if self.retention is not None:
+            history.compact(history.ts[-1] - self.retention)
+
+    def transaction_features(self, user_id, transaction_ts, device_id, transaction_country) -> dict:
+        # features.transaction_features_1h + features.transaction_features_24h
+        ts = to_micros(transaction_ts)
+        history = self.histories.get(user_id)
+        features = {}
+
+        for name, span in WINDOWS.items():
+            count, cents = history.window(ts - span, ts) if history else (0, 0)
+            features[f"tx_count_last_{name}"] = count
+            features[f"avg_amount_last_{name}"] = average(cents, count)
+
+        features["is_new_device"] = history.is_new_device(device_id, ts) if history else True
+        features["is_foreign_tx"] = self.users[user_id][1] != transaction_country
+
+        return features
+
+    def user_behavior_features(self, user_id, now=None):
+        # features.user_behavior_features row, None when the user has no
+        # transactions in the window (the SQL has no row either)
+        history = self.histories.get(user_id)
+
+        if history is None:
+            return None
+
+        lower = to_micros(now or datetime.now()) - BEHAVIOR_WINDOW
+        count, cents = history.window(lower)
+
+        if count == 0:
+            return None
+
+        return {
+            "tx_count_7d": count,
+            "avg_amount_7d": average(cents, count),
+            "distinct_countries_7d": sum(
+                1 for last_ts in history.countries.values() if last_ts >= lower
+            ),
+        }
+
+    def _fetch_users(self, conn) -> list:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT user_id, registration_date, home_country, risk_segment, created_at
+                FROM core.users
+                WHERE %(since)s IS NULL OR created_at >= %(since)s
+            """, {"since": self.last_user_ts})
+
+            return cur.fetchall()
+
+    def _fetch_revised(self, conn, to_load_id) -> dict:
+        # user_id -> history rebuilt from core, None when no rows are left
+        with conn.cursor() as cur:
+            cur.execute(REVISED_USERS_SQL, {
+                "from_load_id": self.last_load_id,
+                "to_load_id": to_load_id,
+            })
+            revised = {user_id: None for user_id, in cur.fetchall()}
+
+            if not revised:
+                return revised
+
+            cur.execute(USER_TRANSACTIONS_SQL, (list(revised), to_load_id))
+
+            for user_id, transaction_ts, amount, country, device_id in cur:
+                history = revised[user_id]
+
+                if history is None:
+                    history = revised[user_id] = UserHistory()
+
+                self._observe(history, transaction_ts, amount, country, device_id)
+
+        return revised
+
+    def fetch_updates(self, conn) -> tuple:
+        # rows added to core since the last sync, up to the load_id promotion
+        # has committed, and the rebuilt histories of revised users; does not
+        # touch the store, so it can run on a DB thread while it keeps serving
+        users = self._fetch_users(conn)
+
+        with conn.cursor() as cur:
+            to_load_id = current_load_id(cur)
+
+        revised = self._fetch_revised(conn, to_load_id)
+
+        with conn.cursor() as cur:
+            cur.execute(TRANSACTIONS_SINCE_SQL, (self.last_load_id, to_load_id))
+            transactions = cur.fetchall()
+
+        return users, transactions, revised, to_load_id
+
+    def apply_updates(self, users, transactions, revised, to_load_id) -> int:
+        n = 0
+
+        for n in self.apply_slices(users, transactions, revised, to_load_id):
+            pass
+
+        return n
+
+    def apply_slices(self, users, transactions, revised, to_load_id, slice_rows=None):
+        # apply_updates slice_rows transactions at a time, yielding the count
+        # applied so far after each slice, so a caller on an event loop can
+        # serve requests in between. Rows come in time order: between slices
+        # the store is the state of a shorter pull, never a half-applied row.
+        for user_id, registration_date, home_country, risk_segment, created_at in users:
+            self.add_user(user_id, registration_date, home_country, risk_segment)
+
+            if self.last_user_ts is None or created_at > self.last_user_ts:
+                self.last_user_ts = created_at
+
+        for user_id, history in revised.items():
+            if history is None:
+                self.histories.pop(user_id, None)
+            else:
+                self.histories[user_id] = history
+
+        n = 0
+
+        for user_id, transaction_ts, amount, country, device_id, _ in transactions:
+            # already in the rebuilt history
+            if user_id not in revised:
+                self.observe(user_id, transaction_ts, amount, country, device_id)
+
+            n += 1
+
+            if slice_rows and n % slice_rows == 0:
+                yield n
+
+        self.last_load_id = max(self.last_load_id, to_load_id)
+
+        yield n
+
+    def sync(self, conn) -> int:
+        # warm-up: streams rows through a server-side cursor
+        users = self._fetch_users(conn)
+
+        with conn.cursor() as cur:
+            to_load_id = current_load_id(cur)
+
+        revised = self._fetch_revised(conn, to_load_id)
+
+        with conn.cursor(name="feature_store_sync") as cur:
+            cur.itersize = WARM_UP_FETCH_ROWS
+            cur.execute(TRANSACTIONS_SINCE_SQL, (self.last_load_id, to_load_id))
+
+            return self.apply_updates(users, cur, revised, to_load_id)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+
+        with open(tmp, "wb") as f:
+            pickle.dump((SNAPSHOT_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # readers never see a half-written snapshot
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            version, store = pickle.load(f)
+
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"snapshot version {version}, expected {SNAPSHOT_VERSION}")
+
+        return store
+
+
+def open_store(conn, snapshot_path, retention_days=7) -> OnlineFeatureStore:
+    # snapshot + rows loaded since its load_id, or a full warm-up when the
+    # snapshot is missing, from another retention, or ahead of the database
+    # (e.g. the database was recreated)
+    store = None
+
+    if snapshot_path and Path(snapshot_path).exists():
+        try:
+            store = OnlineFeatureStore.load(snapshot_path)
+        except (ValueError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Ignoring feature store snapshot: {e}")
+
+        expected = retention_days * DAY if retention_days is not None else None
+
+        with conn.cursor() as cur:
+            db_load_id = current_load_id(cur)
+
+        if store is not None and (
+            store.retention != expected or store.last_load_id > db_load_id
+        ):
+            store = None
+
+    if store is None:
+        store = OnlineFeatureStore(retention_days)
+
+    rows = store.sync(conn)
+
+    print(f"Feature store: {len(store.users)} users, {rows} new transactions, "
+          f"load_id {store.last_load_id}")
+
+    if snapshot_path:
+        store.save(snapshot_path)
+
+    return store
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from data_generator.fraud_logic import user_age_days
+
+# Online features for a single incoming transaction, served by the
+# in-process feature store (api/feature_store.py) with the same definitions
+# as the feature SQL: windows look back from the transaction time and only
+# count strictly earlier transactions.
+
+REQUIRED_FIELDS = (
+    "transaction_id",
+    "user_id",
+    "amount",
+    "merchant_category",
+    "transaction_country",
+    "device_id",
+)
+
+
+class UnknownUser(LookupError):
+    pass
+
+
+def parse_transaction(payload) -> dict:
+    missing = [field for field in REQUIRED_FIELDS if field not in payload]
+
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+
+    tx = dict(payload)
+    tx["amount"] = float(tx["amount"])
+
+    ts = tx.get("transaction_ts")
+    tx["transaction_ts"] = datetime.fromisoformat(ts) if ts else datetime.now()
+
+    return tx
+
+
+def _optional_float(value) -> float:
+    return float(value) if value is not None else float("nan")
+
+
+def online_features(store, tx) -> tuple:
+    # (model features, rule context) for one transaction
+    user = store.users.get(tx["user_id"])
+
+    if user is None:
+        raise UnknownUser(tx["user_id"])
+
+    registration_date, home_country, risk_segment = user
+
+    window = store.transaction_features(
+        tx["user_id"],
+        tx["transaction_ts"],
+        tx["device_id"],
+        tx["transaction_country"]
+    )
+    behavior = store.user_behavior_features(tx["user_id"]) or {}
+
+    features = {
+        "amount": tx["amount"],
+        "tx_count_last_1h": window["tx_count_last_1h"],
+        "avg_amount_last_1h": _optional_float(window["avg_amount_last_1h"]),
+        "is_new_device": int(window["is_new_device"]),
+        "is_foreign_tx": int(window["is_foreign_tx"]),
+        "tx_count_last_24h": window["tx_count_last_24h"],
+        "avg_amount_last_24h": _optional_float(window["avg_amount_last_24h"]),
+        "tx_count_7d": _optional_float(behavior.get("tx_count_7d")),
+        "avg_amount_7d": _optional_float(behavior.get("avg_amount_7d")),
+        "distinct_countries_7d": _optional_float(behavior.get("distinct_countries_7d")),
+        "user_age_days": user_age_days(registration_date, tx["transaction_ts"]),
+    }
+
+    context = {
+        "transaction_ts": tx["transaction_ts"],
+        "transaction_country": tx["transaction_country"],
+        "merchant_category": tx["merchant_category"],
+        "tx_count_last_1h": window["tx_count_last_1h"],
+        "tx_count_last_24h": window["tx_count_last_24h"],
+        "is_new_device": window["is_new_device"],
+        "user_home_country": home_country,
+        "user_registration_date": registration_date,
+        "risk_segment": risk_segment,
+    }
+
+    return features, context
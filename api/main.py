@@ -1,10 +1,282 @@
-from  database.connection import get_connection
+import asyncio
+import json
+import time
 
-conn = get_connection()
-cur = conn.cursor()
+from database.connection import AsyncConnectionPool
+from data_generator.rules import get_rules, reload_rules
+from api.batching import MicroBatcher, LatencyTracker
+from api.features import parse_transaction, online_features, UnknownUser
+from api.feature_store import open_store
+from api.model import predict_rows
+from ml.serving import ModelCache
+from api.config import (
+    API_HOST,
+    API_PORT,
+    API_MAX_BATCH,
+    API_MAX_WAIT_MS,
+    API_P99_TARGET_MS,
+    API_LATENCY_WINDOW,
+    FEATURE_STORE_RETENTION_DAYS,
+    FEATURE_STORE_SNAPSHOT,
+    FEATURE_STORE_REFRESH_SECONDS,
+    FEATURE_STORE_APPLY_ROWS,
+    FRAUD_RULES_RELOAD_SECONDS
+)
 
-cur.execute("SELECT 1")
-print(cur.fetchone())
+# Real-time scoring service (HTTP/1.1, keep-alive, JSON).
+#
+# POST /score   transaction payload -> probability, decision, rule reasons
+# GET  /health  active model version
+# GET  /metrics latency percentiles vs API_P99_TARGET_MS, batching stats
+#
+# Features come from the in-process feature store: warmed up from
+# core.transactions (or a snapshot) at startup and refreshed every
+# FEATURE_STORE_REFRESH_SECONDS, so requests never query the database.
+# A scored transaction is not observed by the store: it counts once it is
+# promoted to core, like in the SQL features the model was trained on.
+# Observing it here as well would count it twice (the store follows core by
+# load_id, not transaction_id), and count requests that never become
+# transactions (retries, declined or test payloads).
+#
+# python -m api.main
 
-cur.close()
-conn.close()
\ No newline at end of file
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class ScoringService:
+    def __init__(self, db=None):
+        self.db = db or AsyncConnectionPool()
+        self.models = ModelCache()
+        self.rules = None
+        self.store = None
+        self.batcher = None
+        self._refresher = None
+        self._rules_watcher = None
+        self.latency = LatencyTracker(API_LATENCY_WINDOW)
+        self.errors = 0
+
+    async def start(self):
+        # compiled once per rule file version, see _reload_rules
+        self.rules = get_rules()
+        self._rules_watcher = asyncio.create_task(self._reload_rules())
+
+        self.store = await self.db.run(
+            open_store, FEATURE_STORE_SNAPSHOT, FEATURE_STORE_RETENTION_DAYS
+        )
+        self._refresher = asyncio.create_task(self._refresh_store())
+
+        # loads the active model, then watches the registry for new versions
+        await asyncio.to_thread(self.models.start)
+
+        self.batcher = MicroBatcher(predict_rows, API_MAX_BATCH, API_MAX_WAIT_MS)
+        self.batcher.start()
+
+        print(f"Scoring with {self.models.version or self.rules.version}")
+
+    async def _refresh_store(self):
+        while True:
+            await asyncio.sleep(FEATURE_STORE_REFRESH_SECONDS)
+
+            try:
+                # the query and the rebuild of revised users run on a DB
+                # thread; rows are applied on the loop, which owns the store,
+                # in slices with requests served in between
+                updates = await self.db.run(self.store.fetch_updates)
+
+                for _ in self.store.apply_slices(*updates, FEATURE_STORE_APPLY_ROWS):
+                    await asyncio.sleep(0)
+            except Exception as e:
+                print(f"Feature store refresh failed: {e}")
+
+    async def _reload_rules(self):
+        while True:
+            await asyncio.sleep(FRAUD_RULES_RELOAD_SECONDS)
+
+            try:
+                # file check and compilation off the loop; requests keep the
+                # rule set they started with
+                if await asyncio.to_thread(reload_rules):
+                    previous, self.rules = self.rules.version, get_rules()
+                    print(f"Rule set: {previous} -> {self.rules.version}")
+            except Exception as e:
+                print(f"Rule set reload failed: {e}")
+
+    async def stop(self):
+        for task in (self._refresher, self._rules_watcher):
+            if task is not None:
+                task.cancel()
+
+        if self.batcher is not None:
+            await self.batcher.stop()
+
+        await asyncio.to_thread(self.models.stop)
+
+        if self.store is not None and FEATURE_STORE_SNAPSHOT:
+            self.store.save(FEATURE_STORE_SNAPSHOT)
+
+        self.db.close()
+
+    async def score(self, payload) -> dict:
+        tx = parse_transaction(payload)
+        features, context = online_features(self.store, tx)
+
+        # one rule set for the whole request, even if a new one is swapped in
+        rules = self.rules
+        rule_score, reason_mask = rules.score(context)
+
+        # one model for the whole request, even if a new one is swapped in
+        model = self.models.current
+
+        if model is None:
+            probability = rule_score
+            version, threshold = rules.version, rules.threshold
+        else:
+            probability = await self.batcher.submit((model, model.vector(features)))
+            version, threshold = model.version, model.threshold
+
+        return {
+            "transaction_id": tx["transaction_id"],
+            "fraud_probability": probability,
+            "is_fraud": probability >= threshold,
+            "threshold": threshold,
+            "model_version": version,
+            "rule_score": rule_score,
+            "reasons": rules.decode_reasons(reason_mask),
+            "reason_mask": reason_mask,
+        }
+
+    def metrics(self) -> dict:
+        latency = self.latency.percentiles()
+        batches = self.batcher.batches if self.batcher else 0
+        rows = self.batcher.rows if self.batcher else 0
+
+        return {
+            "requests": self.latency.requests,
+            "errors": self.errors,
+            **latency,
+            "p99_target_ms": API_P99_TARGET_MS,
+            "p99_within_target": (
+                latency["p99_ms"] is not None and latency["p99_ms"] <= API_P99_TARGET_MS
+            ),
+            "batches": batches,
+            "avg_batch_size": round(rows / batches, 2) if batches else None,
+        }
+
+    async def dispatch(self, method, path, body) -> tuple:
+        if path == "/health":
+            return 200, {"status": "ok", "model_version": self.models.version or self.rules.version}
+
+        if path == "/metrics":
+            return 200, self.metrics()
+
+        if path != "/score":
+            return 404, {"error": f"unknown path {path}"}
+
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            return 200, await self.score(json.loads(body))
+        except UnknownUser as e:
+            return 404, {"error": f"unknown user {e}"}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            self.errors += 1
+            return 500, {"error": str(e)}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                started = time.perf_counter()
+
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+
+                if path == "/score":
+                    self.latency.observe(time.perf_counter() - started)
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader):
+    line = await reader.readline()
+
+    if not line:
+        return None
+
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+
+    while True:
+        line = await reader.readline()
+
+        if line in (b"\r\n", b"\n", b""):
+            break
+
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0"))
+    body = await reader.readexactly(length) if length else b""
+
+    return method, path, headers, body
+
+
+def encode_response(status, payload, keep_alive=True) -> bytes:
+    body = json.dumps(payload, default=str).encode()
+
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n"
+    )
+
+    return head.encode("latin-1") + body
+
+
+async def serve(host=API_HOST, port=API_PORT):
+    service = ScoringService()
+    await service.start()
+
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Listening on {host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import numpy as np
+
+# The service scores with the active model of ml.serving.ModelCache; without
+# an active model in the registry, scores fall back to the rule score of the
+# rule set (version and threshold from data_generator.rules.get_rules()).
+
+
+def predict_rows(rows) -> np.ndarray:
+    # rows are (model, feature vector) pairs. Each request keeps the model it
+    # started with, so a batch spanning a hot swap is scored per model.
+    probs = np.empty(len(rows))
+    by_model = {}
+
+    for i, (model, _) in enumerate(rows):
+        by_model.setdefault(id(model), (model, []))[1].append(i)
+
+    for model, idx in by_model.values():
+        X = np.asarray([rows[i][1] for i in idx], dtype=np.float64)
+        probs[idx] = model.predict(X)
+
+    return probs
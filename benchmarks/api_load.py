@@ -0,0 +1,144 @@
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from database.connection import connection
+from api.config import API_PORT, API_P99_TARGET_MS
+
+# Load test for the scoring service (python -m api.main must be running).
+# Payloads reuse real users, devices and merchants from core.transactions.
+# Each client holds one keep-alive connection and sends requests back to back.
+# Exits with status 1 when the client-side p99 exceeds API_P99_TARGET_MS.
+#
+# python -m benchmarks.api_load [n_requests] [concurrency] [host] [port]
+
+
+def sample_payloads(n) -> list:
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT t.user_id, t.amount, t.currency, t.merchant_id,
+                   m.merchant_category, t.transaction_country, t.device_id
+            FROM core.transactions t
+            JOIN core.merchants m ON m.merchant_id = t.merchant_id
+            ORDER BY random()
+            LIMIT 10000
+        """)
+        rows = cur.fetchall()
+
+    if not rows:
+        raise RuntimeError("core.transactions is empty, run the pipeline first")
+
+    now = datetime.now().isoformat()
+    payloads = []
+
+    for _ in range(n):
+        user_id, amount, currency, merchant_id, category, country, device_id = random.choice(rows)
+
+        payloads.append({
+            "transaction_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount": float(amount),
+            "currency": currency,
+            "merchant_id": merchant_id,
+            "merchant_category": category,
+            "transaction_country": country,
+            "device_id": device_id,
+            "transaction_ts": now,
+        })
+
+    return payloads
+
+
+async def request(reader, writer, method, path, payload=None) -> tuple:
+    body = json.dumps(payload).encode() if payload is not None else b""
+
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Host: localhost\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+
+    while True:
+        line = await reader.readline()
+
+        if line in (b"\r\n", b""):
+            break
+
+        name, _, value = line.decode("latin-1").partition(":")
+
+        if name.lower() == "content-length":
+            length = int(value)
+
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, payloads, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+
+    try:
+        for payload in payloads:
+            started = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/score", payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(n_requests, concurrency, host, port) -> float:
+    payloads = sample_payloads(n_requests)
+    latencies = []
+    statuses = {}
+
+    started = time.perf_counter()
+
+    await asyncio.gather(*(
+        client(host, port, payloads[i::concurrency], latencies, statuses)
+        for i in range(concurrency)
+    ))
+
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+
+    print(f"{n_requests} requests, concurrency {concurrency}: {elapsed:.2f}s, "
+          f"{n_requests / elapsed:.0f} req/s")
+    print(f"status codes: {statuses}")
+    print(f"client latency ms: p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} "
+          f"(target p99 {API_P99_TARGET_MS})")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+
+    print(f"server metrics: {metrics}")
+
+    return p99
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    host = sys.argv[3] if len(sys.argv) > 3 else "127.0.0.1"
+    port = int(sys.argv[4]) if len(sys.argv) > 4 else API_PORT
+
+    p99 = asyncio.run(run(n_requests, concurrency, host, port))
+
+    if p99 > API_P99_TARGET_MS:
+        print("p99 latency target missed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import sys
+import time
+from datetime import datetime
+
+from database.connection import connection
+from data_generator import generate_columnar as columnar
+from data_generator.rules import get_rules
+from data_generator.run import (
+    TRANSACTION_COLUMNS,
+    PREDICTION_COLUMNS,
+    insert_transactions,
+    insert_fraud_predictions
+)
+
+# Compares row-by-row executemany INSERTs with the COPY loaders used by
+# data_generator.run. Everything runs in a transaction that is rolled back.
+#
+# python -m benchmarks.bulk_load [n_users]
+
+
+def executemany_transactions(cur, labeled_transactions):
+    ingestion_ts = datetime.utcnow()
+
+    cur.executemany(
+        f"""
+        INSERT INTO raw.transactions ({', '.join(TRANSACTION_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(TRANSACTION_COLUMNS))})
+        """,
+        [tx[:9] + (ingestion_ts,) for tx in labeled_transactions]
+    )
+
+
+def executemany_fraud_predictions(cur, labeled_transactions):
+    prediction_ts = datetime.utcnow()
+    rules_version = get_rules().version
+
+    cur.executemany(
+        f"""
+        INSERT INTO mart.fraud_predictions ({', '.join(PREDICTION_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(PREDICTION_COLUMNS))})
+        ON CONFLICT (transaction_id, model_version) DO NOTHING
+        """,
+        [
+            (tx[0], tx[-3], tx[-2], rules_version, "rules", prediction_ts, tx[-1])
+            for tx in labeled_transactions
+        ]
+    )
+
+
+def make_rows(n_users):
+    rng = columnar.make_rng()
+
+    users = columnar.generate_users_columnar(rng, n_users)
+    devices = columnar.generate_devices_columnar(rng, users)
+    merchants = columnar.generate_merchants_columnar(rng, 10)
+    transactions = columnar.generate_transactions_columnar(rng, users, devices, merchants)
+
+    rows = columnar.transactions_to_rows(transactions, users, devices, merchants)
+
+    # rule labels are not relevant for load speed
+    return [tx + (0.01, False, []) for tx in rows]
+
+
+def timed(conn, loader, rows):
+    with conn.cursor() as cur:
+        started = time.perf_counter()
+        loader(cur, rows)
+        elapsed = time.perf_counter() - started
+
+    conn.rollback()
+    return elapsed
+
+
+def main():
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rows = make_rows(n_users)
+
+    print(f"{len(rows)} transactions")
+
+    paths = {
+        "executemany": (executemany_transactions, executemany_fraud_predictions),
+        "copy": (insert_transactions, insert_fraud_predictions)
+    }
+
+    with connection() as conn:
+        for name, (load_transactions, load_predictions) in paths.items():
+            for table, loader in (
+                ("raw.transactions", load_transactions),
+                ("mart.fraud_predictions", load_predictions)
+            ):
+                elapsed = timed(conn, loader, rows)
+                print(
+                    f"{name:12} {table:24} {elapsed:8.2f}s "
+                    f"{len(rows) / elapsed:12.0f} rows/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import sys
+import time
+import tracemalloc
+
+from data_generator import generate_columnar as columnar
+from data_generator.config import N_MERCHANTS
+from data_generator.label_entities import label_entities
+from data_generator.label_transactions import label_transactions
+
+# Memory and labeling time of generated data: row tuples (*_to_rows,
+# labeled by label_transactions) against the compact EntityStore (labeled
+# by label_entities), per user (with its devices) and per transaction.
+# Row memory is what the rows keep allocated (tracemalloc); store memory is
+# the size of its arrays.
+#
+# python -m benchmarks.entity_memory [n_users]
+
+
+def allocated(fn, *args) -> tuple:
+    # (result, bytes it keeps allocated)
+    tracemalloc.start()
+    result = fn(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return result, size
+
+
+def timed(fn, *args) -> float:
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def user_rows(store):
+    return (
+        columnar.users_to_rows(store.users),
+        columnar.devices_to_dict(store.users, store.devices)
+    )
+
+
+def transaction_rows(store):
+    return columnar.transactions_to_rows(
+        store.transactions, store.users, store.devices, store.merchants
+    )
+
+
+def main():
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    store = columnar.generate_store(columnar.make_rng(), n_users, N_MERCHANTS)
+    n_tx = len(store.transactions["transaction_id"])
+
+    (users, devices_by_user), user_bytes = allocated(user_rows, store)
+    labeled, tx_bytes = allocated(
+        lambda: label_transactions(transaction_rows(store), users)
+    )
+    del devices_by_user, labeled
+
+    # labeling only, the rows and the store exist beforehand
+    transactions = transaction_rows(store)
+    rows_seconds = timed(label_transactions, transactions, users)
+    del users, transactions
+
+    store_seconds = timed(label_entities, store)
+    sizes = store.nbytes()
+
+    print(f"{n_users} users, {n_tx} transactions")
+    print(f"{'':14} {'B/user':>9} {'B/tx':>9} {'label s':>9}")
+
+    for name, per_user, per_tx, seconds in (
+        ("rows", user_bytes / n_users, tx_bytes / n_tx, rows_seconds),
+        ("entity store", (sizes["users"] + sizes["devices"]) / n_users,
+         sizes["transactions"] / n_tx, store_seconds),
+    ):
+        print(f"{name:14} {per_user:9.0f} {per_tx:9.0f} {seconds:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
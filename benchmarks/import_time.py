@@ -0,0 +1,119 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Cold-start budget: how long importing each entry point takes and which
+# heavy packages it pulls in.
+#
+# Every module is imported in a fresh interpreter under `python -X importtime`
+# IMPORT_BENCH_RUNS times; the best cumulative time is compared with its
+# budget (milliseconds, scaled by IMPORT_BUDGET_SCALE for slower machines).
+# Importing a module must not import any of its forbidden packages: they are
+# loaded by the functions that need them, on first use.
+#
+# Exits with 1 when a budget is exceeded or a forbidden package is imported.
+#
+# python -m benchmarks.import_time [--runs 5] [--scale 1.0]
+
+IMPORT_BENCH_RUNS = int(os.getenv("IMPORT_BENCH_RUNS", "5"))
+IMPORT_BUDGET_SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1.0"))
+
+GENERATOR_HEAVY = ("faker", "dotenv", "numpy", "pandas", "sklearn", "lightgbm")
+ML_HEAVY = ("faker", "dotenv", "pandas", "sklearn", "lightgbm", "joblib", "pyarrow")
+
+# module: (budget in ms, packages it must not import)
+IMPORT_BUDGETS = {
+    "database.connection": (150, GENERATOR_HEAVY),
+    "database.instrumentation": (175, GENERATOR_HEAVY),
+    "data_generator.config": (60, GENERATOR_HEAVY),
+    "data_generator.run": (200, GENERATOR_HEAVY),
+    "scripts.run_pipeline": (200, GENERATOR_HEAVY),
+    "ml.registry": (60, ML_HEAVY),
+    "ml.train": (400, ML_HEAVY),
+}
+
+
+def import_profile(module) -> tuple:
+    # (cumulative import time in ms, names of all imported modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    cumulative = None
+    imported = set()
+
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, total, name = line[len("import time:"):].split("|")
+
+        if not total.strip().isdigit():
+            continue
+
+        imported.add(name.strip())
+
+        if name.strip() == module and not name[1:].startswith(" "):
+            cumulative = int(total) / 1000
+
+    return cumulative, imported
+
+
+def check_module(module, budget_ms, forbidden, runs) -> list:
+    best = None
+    imported = set()
+
+    for _ in range(runs):
+        ms, imported = import_profile(module)
+        best = ms if best is None else min(best, ms)
+
+    problems = []
+
+    if best > budget_ms:
+        problems.append(f"{best:.1f} ms, budget {budget_ms:.0f} ms")
+
+    heavy = sorted(
+        package for package in forbidden
+        if any(name == package or name.startswith(package + ".") for name in imported)
+    )
+
+    if heavy:
+        problems.append(f"imports {', '.join(heavy)}")
+
+    print(f"{module:28} {best:8.1f} ms  budget {budget_ms:6.0f} ms  "
+          + ("FAIL: " + "; ".join(problems) if problems else "ok"))
+
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time")
+    parser.add_argument("--runs", type=int, default=IMPORT_BENCH_RUNS)
+    parser.add_argument("--scale", type=float, default=IMPORT_BUDGET_SCALE)
+    parser.add_argument("modules", nargs="*", default=list(IMPORT_BUDGETS))
+    args = parser.parse_args(argv)
+
+    failed = []
+
+    for module in args.modules:
+        budget_ms, forbidden = IMPORT_BUDGETS.get(module, (float("inf"), ()))
+
+        if check_module(module, budget_ms * args.scale, forbidden, args.runs):
+            failed.append(module)
+
+    if failed:
+        print(f"{len(failed)} modules over their import budget: {', '.join(failed)}")
+        return 1
+
+    print("All imports within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
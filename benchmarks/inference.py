@@ -0,0 +1,89 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.connection import connection
+from ml.data import load_training_dataset
+from ml.inference import FastPredictor
+from ml.registry import active_model_version, load_model
+
+# Per-row scoring latency of the current path (DataFrame + bool -> int +
+# LGBMClassifier.predict_proba, as in ml/train.py) against ml.inference
+# (preallocated float32 buffer + native predictor) at batch sizes 1, 8, 64
+# and 1024, on rows of the training dataset.
+#
+# python -m benchmarks.inference [model_version]
+
+BATCH_SIZES = (1, 8, 64, 1024)
+MIN_SECONDS = 1.0
+
+
+def time_per_row(fn, batches) -> float:
+    # microseconds per row, cycling through batches for at least MIN_SECONDS
+    rows = 0
+    calls = 0
+    started = time.perf_counter()
+
+    while True:
+        batch = batches[calls % len(batches)]
+        fn(batch)
+        rows += len(batch)
+        calls += 1
+
+        elapsed = time.perf_counter() - started
+
+        if elapsed >= MIN_SECONDS and calls >= len(batches):
+            return elapsed / rows * 1e6
+
+
+def main():
+    if len(sys.argv) > 1:
+        version = sys.argv[1]
+    else:
+        with connection() as conn, conn.cursor() as cur:
+            version = active_model_version(cur)
+
+    if version is None:
+        raise RuntimeError("No active model in meta.model_registry, pass a model_version")
+
+    model = load_model(version)
+    feature_names = list(model.booster_.feature_name())
+    predictor = FastPredictor(model.booster_, feature_names)
+
+    df = load_training_dataset()[feature_names]
+    records = df.to_dict("records")
+    X = df.astype(np.float32).to_numpy()
+
+    def current_path(batch):
+        frame = pd.DataFrame([records[i] for i in batch], columns=feature_names)
+        bool_cols = frame.select_dtypes(include="bool").columns
+        frame[bool_cols] = frame[bool_cols].astype(int)
+        return model.predict_proba(frame)[:, 1]
+
+    def fast_path(batch):
+        predictor.rows[:len(batch)] = X[batch]
+        return predictor.predict(len(batch))
+
+    rng = np.random.default_rng(0)
+
+    print(f"{version}: {len(feature_names)} features, {len(X)} rows")
+    print(f"{'batch':>6} {'current us/row':>15} {'fast us/row':>12} {'speedup':>8} {'max |diff|':>11}")
+
+    for size in BATCH_SIZES:
+        batches = [rng.integers(0, len(X), size) for _ in range(32)]
+
+        max_diff = max(
+            np.abs(current_path(batch) - fast_path(batch)).max()
+            for batch in batches
+        )
+
+        current = time_per_row(current_path, batches)
+        fast = time_per_row(fast_path, batches)
+
+        print(f"{size:>6} {current:>15.2f} {fast:>12.2f} {current / fast:>7.1f}x {max_diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
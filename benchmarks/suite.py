@@ -0,0 +1,384 @@
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import psycopg2
+
+from database.connection import connection_params
+from database.etl.incremental import run_incremental, run_user_behavior
+from database.etl.promotion import run_promotion
+from database.partitions import maintain_partitions
+from data_generator import generate_columnar as columnar
+from data_generator.config import N_MERCHANTS
+from data_generator.fraud_logic import compute_fraud_score
+from data_generator.generate_devices import generate_devices
+from data_generator.generate_merchants import generate_merchants
+from data_generator.generate_transactions import generate_transactions
+from data_generator.generate_users import generate_users
+from data_generator.entities import EntityStore
+from data_generator.label_entities import label_entities
+from data_generator.label_transactions import TransactionLabeler, label_transactions
+from data_generator.run import (
+    insert_users,
+    insert_devices,
+    insert_merchants,
+    insert_transactions,
+    insert_fraud_predictions
+)
+
+# Scaling benchmarks for the generator, labeler, rule scorer and SQL ETL.
+#
+# For every size (number of users) each stage records rows, seconds, rows/s,
+# microseconds per row and the peak of Python allocations (tracemalloc, in a
+# second untimed run so tracing does not slow down the timed one; none for
+# SQL stages, which run in the server).
+#
+# - generate:        Faker generator (generate_transactions), sizes up to
+#                    BENCH_FAKER_MAX_USERS
+# - generate_columnar: NumPy generator; its seeded rows feed the later stages
+#                    so every run measures the same data
+# - label:           label_transactions (velocity state + rules)
+# - generate_store / label_store: the same data as a compact EntityStore,
+#                    labeled by label_entities (what the NumPy backends run)
+# - score:           compute_fraud_score on prebuilt contexts
+# - load_raw, raw_to_core_*, features_*, user_behavior: the pipeline's SQL
+#   steps in a scratch database created on the configured server from
+#   database/init.sql and dropped afterwards
+#
+# Python stages take the best of BENCH_REPEATS timed runs; SQL stages change
+# the database and run once. Rows of SQL stages are the transactions loaded.
+#
+# Results are written as JSON and compared against a baseline: a stage is a
+# regression when its time per row or peak memory is more than
+# BENCH_REGRESSION_THRESHOLD (default 0.2 = 20%) above the baseline. Stages
+# that took less than BENCH_MIN_COMPARE_SECONDS are too noisy to compare on
+# time.
+#
+# python -m benchmarks.suite [--sizes 500,5000,20000] [--baseline PATH] [--save-baseline]
+#
+# 100k users is about 7.8M transactions and needs well above 5 GB of memory.
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+BENCH_SIZES = os.getenv("BENCH_SIZES", "500,5000,20000")
+BENCH_FAKER_MAX_USERS = int(os.getenv("BENCH_FAKER_MAX_USERS", "20000"))
+BENCH_REPEATS = int(os.getenv("BENCH_REPEATS", "3"))
+BENCH_REGRESSION_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.2"))
+BENCH_MIN_COMPARE_SECONDS = float(os.getenv("BENCH_MIN_COMPARE_SECONDS", "0.05"))
+BENCH_RESULTS_DIR = Path(os.getenv("BENCH_RESULTS_DIR", "benchmarks/results"))
+BENCH_BASELINE = Path(os.getenv("BENCH_BASELINE", "benchmarks/baseline.json"))
+
+# stage results are compared on these, lower is better
+COMPARED_METRICS = ("us_per_row", "peak_mib")
+
+
+def measure(stage, size, fn, *args, count=len, memory=True, repeats=BENCH_REPEATS) -> tuple:
+    # (result, record); count(result) is the number of rows processed
+    seconds = None
+
+    for _ in range(repeats):
+        result = None
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    peak_mib = None
+
+    if memory:
+        tracemalloc.start()
+        fn(*args)
+        peak_mib = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    rows = count(result)
+
+    record = {
+        "stage": stage,
+        "size": size,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_s": round(rows / seconds, 1) if seconds else None,
+        "us_per_row": round(seconds / rows * 1e6, 3) if rows else None,
+        "peak_mib": round(peak_mib, 2) if peak_mib is not None else None,
+    }
+
+    print(f"{stage:26} {size:>7} users {rows:>9} rows {seconds:9.3f}s "
+          f"{record['rows_per_s'] or 0:>12.0f} rows/s {record['us_per_row'] or 0:>9.2f} us/row"
+          + (f" {peak_mib:9.1f} MiB" if peak_mib is not None else ""))
+
+    return result, record
+
+
+def columnar_rows(n_users):
+    rng = columnar.make_rng()
+
+    users = columnar.generate_users_columnar(rng, n_users)
+    devices = columnar.generate_devices_columnar(rng, users)
+    merchants = columnar.generate_merchants_columnar(rng, N_MERCHANTS)
+    transactions = columnar.generate_transactions_columnar(rng, users, devices, merchants)
+
+    return (
+        columnar.users_to_rows(users),
+        columnar.devices_to_dict(users, devices),
+        columnar.merchants_to_rows(merchants),
+        columnar.transactions_to_rows(transactions, users, devices, merchants)
+    )
+
+
+def generate_store(n_users):
+    return columnar.generate_store(columnar.make_rng(), n_users, N_MERCHANTS)
+
+
+def label_store(generated):
+    # a fresh store per run: label_entities replaces its transactions
+    return label_entities(EntityStore(
+        generated.users, generated.devices, generated.merchants, dict(generated.transactions)
+    ))
+
+
+def build_contexts(transactions, users) -> list:
+    labeler = TransactionLabeler(users)
+    contexts = []
+
+    for tx in sorted(transactions, key=lambda x: x[-1]):
+        contexts.append(labeler.context(tx))
+        labeler.observe(tx)
+
+    return contexts
+
+
+def score_all(contexts) -> list:
+    return [compute_fraud_score(context) for context in contexts]
+
+
+def faker_inputs(n_users) -> tuple:
+    users = generate_users(n_users)
+    devices_by_user = generate_devices(users)
+    merchants = generate_merchants(N_MERCHANTS)
+
+    return users, devices_by_user, merchants
+
+
+@contextmanager
+def scratch_database():
+    # empty database from init.sql on the configured server, dropped on exit
+    params = connection_params()
+    name = f"{params['dbname']}_bench_{os.getpid()}"
+
+    admin = psycopg2.connect(**{**params, "dbname": "postgres"})
+    admin.autocommit = True
+
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f'CREATE DATABASE "{name}"')
+
+        conn = psycopg2.connect(**{**params, "dbname": name})
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute((BASE_DIR / "database/init.sql").read_text(encoding="utf-8"))
+                maintain_partitions(cur)
+            conn.commit()
+
+            yield conn
+        finally:
+            conn.close()
+
+            with admin.cursor() as cur:
+                cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    finally:
+        admin.close()
+
+
+def sql_stage(conn, fn) -> None:
+    with conn.cursor() as cur:
+        fn(cur)
+
+    conn.commit()
+
+
+def run_sql_stages(size, users, devices_by_user, merchants, labeled) -> list:
+    records = []
+    n_tx = len(labeled)
+
+    def load_raw(cur):
+        insert_users(cur, users)
+        insert_devices(cur, devices_by_user)
+        insert_merchants(cur, merchants)
+        insert_transactions(cur, labeled)
+        insert_fraud_predictions(cur, labeled)
+
+    stages = [
+        ("load_raw", load_raw),
+        ("raw_to_core_users", lambda cur: run_promotion(cur, "core.users")),
+        ("raw_to_core_transactions", lambda cur: run_promotion(cur, "core.transactions")),
+        ("features_1h", lambda cur: run_incremental(cur, "transaction_features_1h")),
+        ("features_24h", lambda cur: run_incremental(cur, "transaction_features_24h")),
+        ("user_behavior", run_user_behavior),
+    ]
+
+    with scratch_database() as conn:
+        for stage, fn in stages:
+            _, record = measure(
+                stage, size, sql_stage, conn, fn, count=lambda _: n_tx, memory=False, repeats=1
+            )
+            records.append(record)
+
+    return records
+
+
+def run_size(size, memory=True) -> list:
+    records = []
+
+    if size <= BENCH_FAKER_MAX_USERS:
+        users, devices_by_user, merchants = faker_inputs(size)
+        _, record = measure(
+            "generate", size, generate_transactions, users, devices_by_user, merchants,
+            memory=memory
+        )
+        records.append(record)
+
+    (users, devices_by_user, merchants, transactions), record = measure(
+        "generate_columnar", size, columnar_rows, size, count=lambda rows: len(rows[3]),
+        memory=memory
+    )
+    records.append(record)
+
+    labeled, record = measure(
+        "label", size, label_transactions, transactions, users, memory=memory
+    )
+    records.append(record)
+
+    generated, record = measure(
+        "generate_store", size, generate_store, size,
+        count=lambda s: len(s.transactions["transaction_id"]), memory=memory
+    )
+    records.append(record)
+
+    _, record = measure(
+        "label_store", size, label_store, generated,
+        count=lambda s: len(s.transactions["transaction_id"]), memory=memory
+    )
+    records.append(record)
+    del generated
+
+    contexts = build_contexts(transactions, users)
+    _, record = measure("score", size, score_all, contexts, memory=memory)
+    records.append(record)
+    del contexts, transactions
+
+    records += run_sql_stages(size, users, devices_by_user, merchants, labeled)
+
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold) -> list:
+    # [(stage, size, metric, baseline value, current value)] above threshold
+    previous = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+
+    for record in results["results"]:
+        base = previous.get((record["stage"], record["size"]))
+
+        if base is None:
+            continue
+
+        for metric in COMPARED_METRICS:
+            current, before = record[metric], base[metric]
+
+            if current is None or not before:
+                continue
+
+            if metric == "us_per_row" and base["seconds"] < BENCH_MIN_COMPARE_SECONDS:
+                continue
+
+            if current > before * (1 + threshold):
+                regressions.append((record["stage"], record["size"], metric, before, current))
+
+    return regressions
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--sizes", default=BENCH_SIZES)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, default=BENCH_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD)
+    parser.add_argument("--no-memory", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    started_at = datetime.utcnow()
+
+    results = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sizes": sizes,
+        },
+        "results": [],
+    }
+
+    for size in sizes:
+        results["results"] += run_size(size, memory=not args.no_memory)
+
+    output = args.output or BENCH_RESULTS_DIR / f"{started_at:%Y%m%d_%H%M%S}.json"
+    write_json(output, results)
+    print(f"Results: {output}")
+
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+
+    for stage, size, metric, before, current in regressions:
+        print(f"REGRESSION {stage} ({size} users) {metric}: {before} -> {current} "
+              f"(+{(current / before - 1) * 100:.0f}%)")
+
+    print(f"{len(regressions)} regressions above {args.threshold:.0%} "
+          f"against {args.baseline} ({baseline['meta'].get('git_commit')})")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,19 +1,71 @@
 import os
+import threading
 import time
-import random
 
-GENERATOR_MODE = os.getenv("GENERATOR_MODE", "DEV")
+from database.env import load_env
 
-if GENERATOR_MODE not in {"DEV", "INCREMENTAL"}:
-    raise ValueError("GENERATOR_MODE must be DEV or INCREMENTAL")
+# Settings read from the environment (and .env) on first use, not at import:
+#
+#   config = get_config()
+#   config.backend, config.random_seed, ...
+#
+# Nothing is seeded or validated until get_config() is called.
 
-# seed 
-if GENERATOR_MODE == "INCREMENTAL":
-    RANDOM_SEED = int(time.time())
-else:
-    RANDOM_SEED = 42
+GENERATOR_MODES = {"DEV", "INCREMENTAL"}
+
+# faker - row by row generation, columnar - vectorized NumPy generation,
+# sharded - columnar generation and labeling of user shards in a process pool,
+# streaming - generate -> label -> load in bounded-memory batches
+GENERATOR_BACKENDS = {"faker", "columnar", "sharded", "streaming"}
+
+
+class GeneratorConfig:
+    def __init__(self, env=os.environ):
+        self.mode = env.get("GENERATOR_MODE", "DEV")
+
+        if self.mode not in GENERATOR_MODES:
+            raise ValueError("GENERATOR_MODE must be DEV or INCREMENTAL")
+
+        self.backend = env.get("GENERATOR_BACKEND", "faker")
+
+        if self.backend not in GENERATOR_BACKENDS:
+            raise ValueError("GENERATOR_BACKEND must be faker, columnar, sharded or streaming")
+
+        # sharded backend: output depends on the shard count only,
+        # the worker count just controls parallelism
+        self.shards = int(env.get("GENERATOR_SHARDS", "16"))
+        self.workers = int(env.get("GENERATOR_WORKERS", str(os.cpu_count() or 1)))
+
+        # streaming backend: users generated per chunk, rows flushed per batch
+        self.stream_chunk_users = int(env.get("STREAM_CHUNK_USERS", "10000"))
+        self.stream_batch_size = int(env.get("STREAM_BATCH_SIZE", "50000"))
+
+        # seed
+        if self.mode == "INCREMENTAL":
+            self.random_seed = int(time.time())
+        else:
+            self.random_seed = 42
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> GeneratorConfig:
+    global _config
+
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                load_env()
+                _config = GeneratorConfig()
+
+    return _config
+
+
+def resolve_seed(seed=None) -> int:
+    return get_config().random_seed if seed is None else seed
 
-random.seed(RANDOM_SEED)
 
 # Generator parameters
 N_USERS = 500
@@ -26,4 +78,6 @@ AVG_TX_PER_DAY = {
     "high": 10
 }
 
+N_MERCHANTS = 10
+
 FRAUD_BASE_PROB = 0.01
@@ -0,0 +1,289 @@
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from data_generator.generate_merchants import CATEGORIES
+from data_generator.generate_transactions import CURRENCIES
+
+# Compact entity store for the NumPy backends.
+#
+# Users, devices, merchants and transactions are dicts of equally sized
+# arrays keyed by column name (the layout of generate_columnar):
+# - ids are raw uuid4 bytes, an (n, 16) uint8 array
+# - entities reference each other by row index (INDEX_DTYPE)
+# - categorical columns hold codes into a fixed Vocabulary
+# - dates and timestamps are datetime64
+# A labeled transaction is about 60 bytes instead of a tuple of Python
+# strings and datetimes (~0.8 KB). Strings are produced only
+# by the *_rows() generators that feed COPY, ROW_CHUNK rows at a time.
+
+INDEX_DTYPE = np.int32
+
+ROW_CHUNK = 100_000
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_DASHES = (8, 12, 16, 20)
+
+
+class Vocabulary:
+    # Interned values of a categorical column: rows store the code
+    # (index into values) in the smallest unsigned dtype that fits.
+    __slots__ = ("values", "dtype", "codes")
+
+    def __init__(self, values):
+        self.values = np.asarray(values)
+        self.dtype = np.min_scalar_type(max(len(self.values) - 1, 0))
+        self.codes = {value: code for code, value in enumerate(self.values.tolist())}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values) -> np.ndarray:
+        # KeyError for a value outside the vocabulary
+        return np.fromiter((self.codes[value] for value in values), dtype=self.dtype)
+
+    def decode(self, codes) -> np.ndarray:
+        return self.values[codes]
+
+
+RISK_SEGMENTS = Vocabulary(["low", "medium", "high"])
+DEVICE_TYPES = Vocabulary(["mobile", "web"])
+MERCHANT_CATEGORIES = Vocabulary(CATEGORIES)
+CURRENCY_CODES = Vocabulary(CURRENCIES)
+
+
+@lru_cache(maxsize=None)
+def countries() -> Vocabulary:
+    # Faker's country list, imported on first use only
+    from faker.providers.address import Provider as AddressProvider
+
+    return Vocabulary(AddressProvider.alpha_2_country_codes)
+
+
+def uuid_strings(raw) -> List[str]:
+    # (n, 16) uuid bytes -> canonical lowercase uuid strings
+    n = len(raw)
+
+    digits = np.empty((n, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+
+    chars = np.insert(digits, _UUID_DASHES, ord("-"), axis=1)
+
+    return np.ascontiguousarray(chars).view("S36").ravel().astype("U36").tolist()
+
+
+def uuid_bytes(ids) -> np.ndarray:
+    # uuid strings -> (n, 16) uuid bytes
+    hex_digits = "".join(ids).replace("-", "")
+
+    return np.frombuffer(bytes.fromhex(hex_digits), dtype=np.uint8).reshape(-1, 16).copy()
+
+
+def _chunks(n, size=ROW_CHUNK):
+    for start in range(0, n, size):
+        yield slice(start, min(start + size, n))
+
+
+class EntityStore:
+    # Generated entities of one run, shard or stream chunk. transactions
+    # gains fraud_score, is_fraud and reasons (a mask of
+    # data_generator.reasons codes) once labeled by data_generator.label_entities.
+    __slots__ = ("users", "devices", "merchants", "transactions")
+
+    def __init__(self, users, devices, merchants, transactions=None):
+        self.users = users
+        self.devices = devices
+        self.merchants = merchants
+        self.transactions = transactions
+
+    def nbytes(self) -> Dict[str, int]:
+        return {
+            name: sum(column.nbytes for column in entity.values())
+            for name, entity in (
+                ("users", self.users),
+                ("devices", self.devices),
+                ("merchants", self.merchants),
+                ("transactions", self.transactions or {})
+            )
+        }
+
+    def sort_transactions(self):
+        # stable: transactions with the same timestamp keep generation order
+        order = np.argsort(self.transactions["transaction_ts"], kind="stable")
+
+        self.transactions = {
+            name: column[order] for name, column in self.transactions.items()
+        }
+
+    # Rows at the database boundary, in the formats of data_generator.run
+
+    def user_rows(self) -> Iterator[Tuple]:
+        users = self.users
+
+        for rows in _chunks(len(users["user_id"])):
+            yield from zip(
+                uuid_strings(users["user_id"][rows]),
+                users["registration_date"][rows].tolist(),
+                countries().decode(users["home_country"][rows]).tolist(),
+                RISK_SEGMENTS.decode(users["risk_segment"][rows]).tolist()
+            )
+
+    def device_rows(self) -> Iterator[Tuple]:
+        devices = self.devices
+
+        for rows in _chunks(len(devices["device_id"])):
+            yield from zip(
+                uuid_strings(devices["device_id"][rows]),
+                DEVICE_TYPES.decode(devices["device_type"][rows]).tolist(),
+                devices["first_seen_ts"][rows].tolist()
+            )
+
+    def devices_by_user(self) -> Dict[str, List[dict]]:
+        user_ids = uuid_strings(self.users["user_id"])
+        devices_by_user = {user_id: [] for user_id in user_ids}
+
+        for user_index, (device_id, device_type, first_seen_ts) in zip(
+            self.devices["user_index"].tolist(), self.device_rows()
+        ):
+            devices_by_user[user_ids[user_index]].append({
+                "device_id": device_id,
+                "device_type": device_type,
+                "first_seen_ts": first_seen_ts
+            })
+
+        return devices_by_user
+
+    def merchant_rows(self) -> Iterator[Tuple[str, str]]:
+        merchants = self.merchants
+
+        yield from zip(
+            uuid_strings(merchants["merchant_id"]),
+            MERCHANT_CATEGORIES.decode(merchants["merchant_category"]).tolist()
+        )
+
+    def _transaction_columns(self, rows) -> list:
+        transactions = self.transactions
+        merchant_index = transactions["merchant_index"][rows]
+
+        return [
+            uuid_strings(transactions["transaction_id"][rows]),
+            uuid_strings(self.users["user_id"][transactions["user_index"][rows]]),
+            transactions["amount"][rows].tolist(),
+            CURRENCY_CODES.decode(transactions["currency"][rows]).tolist(),
+            uuid_strings(self.merchants["merchant_id"][merchant_index]),
+            MERCHANT_CATEGORIES.decode(self.merchants["merchant_category"][merchant_index]).tolist(),
+            countries().decode(transactions["transaction_country"][rows]).tolist(),
+            uuid_strings(self.devices["device_id"][transactions["device_index"][rows]]),
+            transactions["transaction_ts"][rows].tolist()
+        ]
+
+    def transaction_rows(self) -> Iterator[Tuple]:
+        for rows in _chunks(len(self.transactions["transaction_id"])):
+            yield from zip(*self._transaction_columns(rows))
+
+    def labeled_rows(self) -> Iterator[Tuple]:
+        # tx + (score, fraud_flag, reasons), as label_transactions
+        transactions = self.transactions
+
+        for rows in _chunks(len(transactions["transaction_id"])):
+            labels = zip(
+                transactions["fraud_score"][rows].tolist(),
+                transactions["is_fraud"][rows].tolist(),
+                transactions["reasons"][rows].tolist()
+            )
+
+            for tx, label in zip(zip(*self._transaction_columns(rows)), labels):
+                yield tx + label
+
+    @classmethod
+    def from_rows(cls, users, devices_by_user, merchants, transactions) -> "EntityStore":
+        # Interns the row formats of the Faker backend
+        user_ids = [user[0] for user in users]
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+        devices = [
+            (i, device)
+            for i, user_id in enumerate(user_ids)
+            for device in devices_by_user.get(user_id, [])
+        ]
+        device_index = {device["device_id"]: i for i, (_, device) in enumerate(devices)}
+        device_count = np.bincount(
+            np.array([i for i, _ in devices], dtype=INDEX_DTYPE), minlength=len(user_ids)
+        )
+
+        merchant_index = {merchant[0]: i for i, merchant in enumerate(merchants)}
+
+        return cls(
+            users={
+                "user_id": uuid_bytes(user_ids),
+                "registration_date": np.array([u[1] for u in users], dtype="datetime64[D]"),
+                "home_country": countries().encode([u[2] for u in users]),
+                "risk_segment": RISK_SEGMENTS.encode([u[3] for u in users])
+            },
+            devices={
+                "device_id": uuid_bytes([d["device_id"] for _, d in devices]),
+                "device_type": DEVICE_TYPES.encode([d["device_type"] for _, d in devices]),
+                "first_seen_ts": np.array(
+                    [d["first_seen_ts"] for _, d in devices], dtype="datetime64[D]"
+                ),
+                "user_index": np.array([i for i, _ in devices], dtype=INDEX_DTYPE),
+                "device_offset": np.concatenate(([0], np.cumsum(device_count))).astype(INDEX_DTYPE)
+            },
+            merchants={
+                "merchant_id": uuid_bytes([m[0] for m in merchants]),
+                "merchant_category": MERCHANT_CATEGORIES.encode([m[1] for m in merchants])
+            },
+            transactions={
+                "transaction_id": uuid_bytes([tx[0] for tx in transactions]),
+                "user_index": np.array([user_index[tx[1]] for tx in transactions], dtype=INDEX_DTYPE),
+                "amount": np.array([tx[2] for tx in transactions], dtype=np.float64),
+                "currency": CURRENCY_CODES.encode([tx[3] for tx in transactions]),
+                "merchant_index": np.array(
+                    [merchant_index[tx[4]] for tx in transactions], dtype=INDEX_DTYPE
+                ),
+                "transaction_country": countries().encode([tx[6] for tx in transactions]),
+                "device_index": np.array(
+                    [device_index[tx[7]] for tx in transactions], dtype=INDEX_DTYPE
+                ),
+                "transaction_ts": np.array(
+                    [tx[8] for tx in transactions], dtype="datetime64[us]"
+                )
+            }
+        )
+
+    @classmethod
+    def concat(cls, stores) -> "EntityStore":
+        # Stores generated independently (shards) over the same merchants:
+        # user and device indexes are shifted by the rows before them
+        parts = []
+        user_shift = 0
+        device_shift = 0
+
+        for store in stores:
+            parts.append((
+                store.users,
+                {
+                    **store.devices,
+                    "user_index": store.devices["user_index"] + user_shift,
+                    "device_offset": store.devices["device_offset"][1:] + device_shift
+                },
+                {
+                    **store.transactions,
+                    "user_index": store.transactions["user_index"] + user_shift,
+                    "device_index": store.transactions["device_index"] + device_shift
+                }
+            ))
+
+            user_shift += len(store.users["user_id"])
+            device_shift += len(store.devices["device_id"])
+
+        users, devices, transactions = (
+            {column: np.concatenate([entity[column] for entity in entities]) for column in entities[0]}
+            for entities in zip(*parts)
+        )
+
+        devices["device_offset"] = np.concatenate(([0], devices["device_offset"])).astype(INDEX_DTYPE)
+
+        return cls(users, devices, stores[0].merchants, transactions)
@@ -0,0 +1,249 @@
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data_generator.config import resolve_seed, N_USERS, TX_DAYS, AVG_TX_PER_DAY
+from data_generator.entities import (
+    EntityStore,
+    INDEX_DTYPE,
+    RISK_SEGMENTS,
+    DEVICE_TYPES,
+    MERCHANT_CATEGORIES,
+    CURRENCY_CODES,
+    countries
+)
+from data_generator.generate_merchants import WEIGHTS
+from data_generator.generate_transactions import (
+    CURRENCIES,
+    AMOUNT_RANGES,
+    ROUND_BASE_AMOUNTS,
+    ROUND_NOISE
+)
+
+# Columnar counterpart of generate_users / generate_devices /
+# generate_merchants / generate_transactions. Every entity is a dict of
+# equally sized NumPy arrays keyed by column name, drawn in batches from a
+# single seeded numpy Generator, in the compact layout of
+# data_generator.entities: raw uuid bytes, vocabulary codes and row indexes.
+# Codes are drawn as indexes into the vocabulary, which consumes the
+# generator exactly as drawing the values would.
+
+RISK_SEGMENT_PROBS = [0.7, 0.2, 0.1]
+
+DEVICE_COUNTS = np.array([1, 2, 3])
+DEVICE_COUNT_PROBS = [0.7, 0.2, 0.1]
+
+DEVICE_TYPE_PROBS = [0.8, 0.2]
+
+REGISTRATION_DAYS = 3 * 365
+
+_CATEGORY_PROBS = np.array(WEIGHTS) / np.sum(WEIGHTS)
+_FLAT_CATEGORIES = MERCHANT_CATEGORIES.encode(["subscriptions", "utilities"])
+_TRANSFER = MERCHANT_CATEGORIES.codes["transfer"]
+_MIN_AMOUNTS = np.array([AMOUNT_RANGES[c][0] for c in CURRENCIES], dtype=np.float64)
+_MAX_AMOUNTS = np.array([AMOUNT_RANGES[c][1] for c in CURRENCIES], dtype=np.float64)
+_ROUND_BASE_AMOUNTS = np.array(ROUND_BASE_AMOUNTS, dtype=np.float64)
+_ROUND_NOISE = np.array(ROUND_NOISE, dtype=np.float64)
+
+
+def make_rng(seed=None) -> np.random.Generator:
+    return np.random.default_rng(resolve_seed(seed))
+
+
+def generate_uuids(rng, n) -> np.ndarray:
+    # uuid4 ids as raw bytes, shape (n, 16); entities.uuid_strings formats them
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+
+    # RFC 4122 version 4 / variant bits, as uuid.uuid4()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+
+    return raw
+
+
+def draw_codes(rng, vocabulary, size, p=None) -> np.ndarray:
+    return rng.choice(len(vocabulary), size=size, p=p).astype(vocabulary.dtype)
+
+
+def generate_users_columnar(rng, n_users=N_USERS, today=None) -> Dict[str, np.ndarray]:
+    today = np.datetime64(today or datetime.now().date(), "D")
+
+    return {
+        "user_id": generate_uuids(rng, n_users),
+        "registration_date": today - rng.integers(0, REGISTRATION_DAYS + 1, size=n_users),
+        "home_country": draw_codes(rng, countries(), n_users),
+        "risk_segment": draw_codes(rng, RISK_SEGMENTS, n_users, RISK_SEGMENT_PROBS)
+    }
+
+
+def generate_devices_columnar(rng, users, today=None) -> Dict[str, np.ndarray]:
+    today = np.datetime64(today or datetime.now().date(), "D")
+
+    n_users = len(users["user_id"])
+    device_count = rng.choice(DEVICE_COUNTS, size=n_users, p=DEVICE_COUNT_PROBS)
+    user_index = np.repeat(np.arange(n_users), device_count)
+    n_devices = len(user_index)
+
+    registration = users["registration_date"][user_index]
+    days_since = (today - registration).astype(np.int64)
+
+    return {
+        "device_id": generate_uuids(rng, n_devices),
+        "device_type": draw_codes(rng, DEVICE_TYPES, n_devices, DEVICE_TYPE_PROBS),
+        "first_seen_ts": registration + rng.integers(0, days_since + 1),
+        "user_index": user_index.astype(INDEX_DTYPE),
+        # devices of user i are rows device_offset[i] .. device_offset[i + 1]
+        "device_offset": np.concatenate(([0], np.cumsum(device_count))).astype(INDEX_DTYPE)
+    }
+
+
+def generate_merchants_columnar(rng, n_merchants) -> Dict[str, np.ndarray]:
+    return {
+        "merchant_id": generate_uuids(rng, n_merchants),
+        "merchant_category": draw_codes(rng, MERCHANT_CATEGORIES, n_merchants, _CATEGORY_PROBS)
+    }
+
+
+def generate_amounts(rng, currency_index, merchant_category) -> np.ndarray:
+    # Vectorized generate_amount: same branches and distributions;
+    # merchant_category holds MERCHANT_CATEGORIES codes
+    n = len(currency_index)
+    min_amt = _MIN_AMOUNTS[currency_index]
+    max_amt = _MAX_AMOUNTS[currency_index]
+
+    base = _ROUND_BASE_AMOUNTS[rng.integers(0, len(_ROUND_BASE_AMOUNTS), size=n)]
+    noise = _ROUND_NOISE[rng.integers(0, len(_ROUND_NOISE), size=n)]
+
+    amounts = np.round(rng.uniform(min_amt, max_amt), 2)
+
+    is_flat = np.isin(merchant_category, _FLAT_CATEGORIES)
+    amounts[is_flat] = np.minimum(base, max_amt)[is_flat]
+
+    is_transfer = merchant_category == _TRANSFER
+    is_regular_transfer = rng.random(n) < 0.9
+
+    regular = is_transfer & is_regular_transfer
+    amounts[regular] = np.minimum(base + noise, max_amt)[regular]
+
+    # heavy tail of large transfers
+    large = is_transfer & ~is_regular_transfer
+    lower = np.minimum(10_000, max_amt * 0.1)
+    amounts[large] = np.round(rng.uniform(lower, max_amt), 0)[large]
+
+    return amounts
+
+
+def generate_transactions_columnar(
+    rng,
+    users,
+    devices,
+    merchants,
+    start_date=None,
+    user_start=0,
+    user_stop=None,
+    day_start=0,
+    day_stop=TX_DAYS
+) -> Dict[str, np.ndarray]:
+
+    if start_date is None:
+        start_date = datetime.now() - timedelta(days=TX_DAYS)
+
+    if user_stop is None:
+        user_stop = len(users["user_id"])
+
+    start = np.datetime64(start_date, "us") + np.timedelta64(day_start, "D")
+    n_users = user_stop - user_start
+    n_days = day_stop - day_start
+
+    risk_segment = users["risk_segment"][user_start:user_stop]
+    avg_tx = np.zeros((n_users, 1), dtype=np.float64)
+
+    for segment, avg in AVG_TX_PER_DAY.items():
+        avg_tx[risk_segment == RISK_SEGMENTS.codes[segment]] = avg
+
+    # per user and day: max(0, int(gauss(avg, avg * 0.3)))
+    daily = rng.normal(avg_tx, avg_tx * 0.3, size=(n_users, n_days))
+    tx_per_day = np.maximum(0, np.trunc(daily)).astype(np.int64)
+
+    user_index = np.repeat(np.arange(n_users), tx_per_day.sum(axis=1))
+    day_offset = np.repeat(np.tile(np.arange(n_days), n_users), tx_per_day.ravel())
+    n_tx = len(user_index)
+
+    day_us = 24 * 3600 * 1_000_000
+    transaction_ts = (
+        start
+        + day_offset * np.timedelta64(1, "D")
+        + rng.integers(0, day_us, size=n_tx).astype("timedelta64[us]")
+    )
+
+    device_offset = devices["device_offset"][user_start:user_stop + 1]
+    device_count = np.diff(device_offset)[user_index]
+    device_index = device_offset[user_index] + (rng.random(n_tx) * device_count).astype(np.int64)
+
+    merchant_index = rng.integers(0, len(merchants["merchant_id"]), size=n_tx)
+    merchant_category = merchants["merchant_category"][merchant_index]
+
+    currency_index = rng.integers(0, len(CURRENCY_CODES), size=n_tx)
+
+    # merchant_category is not stored: it is the merchant's category
+    return {
+        "transaction_id": generate_uuids(rng, n_tx),
+        "user_index": (user_index + user_start).astype(INDEX_DTYPE),
+        "amount": generate_amounts(rng, currency_index, merchant_category),
+        "currency": currency_index.astype(CURRENCY_CODES.dtype),
+        "merchant_index": merchant_index.astype(INDEX_DTYPE),
+        "transaction_country": draw_codes(rng, countries(), n_tx),
+        "device_index": device_index.astype(INDEX_DTYPE),
+        "transaction_ts": transaction_ts
+    }
+
+
+def iter_transaction_batches(
+    rng,
+    users,
+    devices,
+    merchants,
+    start_date=None,
+    batch_users=50_000
+):
+    # Bounded-memory generation: one columnar batch per slice of users
+    n_users = len(users["user_id"])
+
+    for user_start in range(0, n_users, batch_users):
+        yield generate_transactions_columnar(
+            rng,
+            users,
+            devices,
+            merchants,
+            start_date,
+            user_start=user_start,
+            user_stop=min(user_start + batch_users, n_users)
+        )
+
+
+def generate_store(rng, n_users, n_merchants, today=None, start_date=None) -> EntityStore:
+    users = generate_users_columnar(rng, n_users, today)
+    devices = generate_devices_columnar(rng, users, today)
+    merchants = generate_merchants_columnar(rng, n_merchants)
+    transactions = generate_transactions_columnar(rng, users, devices, merchants, start_date)
+
+    return EntityStore(users, devices, merchants, transactions)
+
+
+# Conversion to the row formats used by label_transactions and run.py
+
+def users_to_rows(users) -> List[Tuple]:
+    return list(EntityStore(users, None, None).user_rows())
+
+
+def devices_to_dict(users, devices) -> Dict[str, List[dict]]:
+    return EntityStore(users, devices, None).devices_by_user()
+
+
+def merchants_to_rows(merchants) -> List[Tuple[str, str]]:
+    return list(EntityStore(None, None, merchants).merchant_rows())
+
+
+def transactions_to_rows(transactions, users, devices, merchants) -> List[Tuple]:
+    return list(EntityStore(users, devices, merchants, transactions).transaction_rows())
@@ -1,11 +1,9 @@
 from typing import List, Dict
-from faker import Faker
-from data_generator.config import RANDOM_SEED
+from data_generator.seeding import get_faker
 
-fake = Faker()
-fake.seed_instance(RANDOM_SEED)
 
 def generate_devices(users) -> Dict[str, List[dict]]:
+    fake = get_faker(__name__)
     devices_by_user = {}
 
     for user in users:
@@ -1,9 +1,6 @@
 from typing import List, Tuple
-from faker import Faker
-from data_generator.config import RANDOM_SEED
+from data_generator.seeding import get_faker
 
-fake = Faker()
-fake.seed_instance(RANDOM_SEED)
 
 CATEGORIES = [
     "food",
@@ -32,6 +29,7 @@ WEIGHTS = [
 ]
 
 def generate_merchants(n_merchants) -> List[Tuple[str, str]]:
+    fake = get_faker(__name__)
     merchants = []
 
     for _ in range(n_merchants):
@@ -1,14 +1,8 @@
 from typing import List, Dict, Tuple
-from faker import Faker
 from datetime import datetime, timedelta
-import random
 
-from data_generator.config import RANDOM_SEED, TX_DAYS, AVG_TX_PER_DAY
-
-
-fake = Faker()
-fake.seed_instance(RANDOM_SEED)
-random.seed(RANDOM_SEED)
+from data_generator.config import TX_DAYS, AVG_TX_PER_DAY
+from data_generator.seeding import get_faker, get_random
 
 CURRENCIES = ["USD", "EUR", "RUB", "KGS"]
 AMOUNT_RANGES = {
@@ -21,7 +15,8 @@ AMOUNT_RANGES = {
 ROUND_BASE_AMOUNTS = [100, 200, 500, 1000, 2000, 5000]
 ROUND_NOISE = [0, 0, 0, 0, 50]
 
-def generate_amount(currency, merchant_category):
+def generate_amount(currency, merchant_category, random=None):
+    random = random or get_random(__name__)
     min_amt, max_amt = AMOUNT_RANGES[currency]
 
     if merchant_category == "transfer":
@@ -48,6 +43,9 @@ def generate_transactions(
     merchants: List[tuple]
 ) -> List[Tuple]:
 
+    fake = get_faker(__name__)
+    random = get_random(__name__)
+
     transactions = []
     start_date = datetime.now() - timedelta(days=TX_DAYS)
 
@@ -71,7 +69,7 @@ def generate_transactions(
                 device = random.choice(user_devices)
                 merchant = random.choice(merchants)
                 currency = random.choice(CURRENCIES)
-                amount = generate_amount(currency, merchant[1])
+                amount = generate_amount(currency, merchant[1], random)
                 transaction_country = fake.country_code()
 
                 transactions.append((
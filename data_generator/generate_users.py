@@ -1,14 +1,13 @@
 from typing import List, Tuple
-from faker import Faker
-from data_generator.config import RANDOM_SEED, N_USERS
+from data_generator.config import N_USERS
+from data_generator.seeding import get_faker
 
-fake = Faker()
-fake.seed_instance(RANDOM_SEED)
 
-def generate_users() -> List[Tuple]:
+def generate_users(n_users=N_USERS) -> List[Tuple]:
+    fake = get_faker(__name__)
     users = []
 
-    for _ in range(N_USERS):
+    for _ in range(n_users):
         user_id = fake.uuid4()
         registration_date = fake.date_between(start_date='-3y', end_date='today')
         home_country = fake.country_code()
@@ -0,0 +1,149 @@
+from typing import Dict
+
+import numpy as np
+
+from data_generator.entities import (
+    EntityStore,
+    INDEX_DTYPE,
+    RISK_SEGMENTS,
+    MERCHANT_CATEGORIES,
+    countries
+)
+from data_generator.rules import CodedColumn, get_rules
+from data_generator.velocity import VELOCITY_WINDOWS
+
+# Array counterpart of label_transactions for an EntityStore: same context,
+# same rule set (RuleSet.score_batch), same time order, so scores, flags and
+# reasons match the row labeler transaction for transaction. Users and
+# devices are addressed by row index, so per-transaction lookups are array
+# indexing instead of dict lookups keyed by uuid strings, and categorical
+# rules are evaluated on vocabulary codes.
+
+_MAX_WINDOW = np.timedelta64(max(VELOCITY_WINDOWS.values()), "us")
+
+
+class ColumnarVelocityState:
+    # VelocityState over row indexes: the (user, timestamp) of transactions
+    # still inside the longest window, and which devices were already seen.
+    # Batches must be labeled in time order, as with VelocityState.
+    __slots__ = ("user_index", "transaction_ts", "device_seen")
+
+    def __init__(self, n_devices):
+        self.user_index = np.empty(0, dtype=INDEX_DTYPE)
+        self.transaction_ts = np.empty(0, dtype="datetime64[us]")
+        self.device_seen = np.zeros(n_devices, dtype=bool)
+
+    def counts(self, user_index, transaction_ts) -> Dict[str, np.ndarray]:
+        # Per transaction, how many earlier transactions of the same user
+        # (history first, then the batch in order) lie within each window,
+        # bounds included, as UserWindowState.counts.
+        users = np.concatenate((self.user_index, user_index))
+        ts = np.concatenate((self.transaction_ts, transaction_ts))
+
+        # ts is sorted: history, then a time-ordered batch not earlier than it.
+        # (user, rank of ts) is one sortable int64 key, and a stable sort by
+        # user keeps every user's transactions in time order.
+        rank = np.concatenate(([0], np.cumsum(ts[1:] != ts[:-1])))
+        n_ranks = int(rank[-1]) + 2 if len(rank) else 1
+        key = users.astype(np.int64) * n_ranks
+
+        order = np.argsort(users, kind="stable")
+        sorted_key = key[order] + rank[order]
+        batch = slice(len(self.user_index), None)
+        result = {}
+
+        for name, span in VELOCITY_WINDOWS.items():
+            # rank of the oldest timestamp still inside the window
+            lower = rank[np.searchsorted(ts, ts - np.timedelta64(span, "us"))]
+
+            # queried in sorted order, so the search walks sorted_key once
+            first = np.searchsorted(sorted_key, key[order] + lower[order])
+
+            count = np.empty(len(ts), dtype=np.int64)
+            count[order] = np.arange(len(ts)) - first
+            result[name] = count[batch]
+
+        return result
+
+    def new_devices(self, device_index) -> np.ndarray:
+        # first use of a device in this batch that was not seen before
+        devices, first = np.unique(device_index, return_index=True)
+
+        is_new = np.zeros(len(device_index), dtype=bool)
+        is_new[first] = ~self.device_seen[devices]
+
+        return is_new
+
+    def observe(self, user_index, transaction_ts, device_index):
+        self.device_seen[device_index] = True
+
+        users = np.concatenate((self.user_index, user_index))
+        ts = np.concatenate((self.transaction_ts, transaction_ts))
+
+        # later transactions are not earlier than the last one observed
+        keep = ts >= ts[-1] - _MAX_WINDOW if len(ts) else slice(None)
+
+        self.user_index = users[keep]
+        self.transaction_ts = ts[keep]
+
+
+class EntityLabeler:
+    # Incremental: label() may be called for consecutive batches of the
+    # same users and devices (streaming), each no earlier than the last.
+    # Per-rule hits and evaluation time are added to stats when given.
+    def __init__(self, store: EntityStore, stats=None):
+        self.store = store
+        self.rules = get_rules()
+        self.stats = stats
+        self.velocity = ColumnarVelocityState(len(store.devices["device_id"]))
+
+    def label(self, transactions) -> dict:
+        # adds fraud_score, is_fraud and reasons; returns the batch in time order
+        order = np.argsort(transactions["transaction_ts"], kind="stable")
+        transactions = {name: column[order] for name, column in transactions.items()}
+
+        users = self.store.users
+        user_index = transactions["user_index"]
+        device_index = transactions["device_index"]
+        transaction_ts = transactions["transaction_ts"]
+        merchant_index = transactions["merchant_index"]
+
+        counts = self.velocity.counts(user_index, transaction_ts)
+        is_new_device = self.velocity.new_devices(device_index)
+
+        scores, hits = self.rules.score_batch({
+            "transaction_ts": transaction_ts,
+            "transaction_country": CodedColumn(
+                transactions["transaction_country"], countries().values
+            ),
+            "merchant_category": CodedColumn(
+                self.store.merchants["merchant_category"][merchant_index],
+                MERCHANT_CATEGORIES.values
+            ),
+            "tx_count_last_1h": counts["1h"],
+            "tx_count_last_24h": counts["24h"],
+            "tx_count_last_7d": counts["7d"],
+            "is_new_device": is_new_device,
+            "user_home_country": CodedColumn(
+                users["home_country"][user_index], countries().values
+            ),
+            "user_registration_date": users["registration_date"][user_index],
+            "risk_segment": CodedColumn(
+                users["risk_segment"][user_index], RISK_SEGMENTS.values
+            ),
+        }, self.stats)
+
+        self.velocity.observe(user_index, transaction_ts, device_index)
+
+        transactions["fraud_score"] = scores
+        transactions["is_fraud"] = self.rules.is_fraud(scores)
+        transactions["reasons"] = self.rules.reason_mask(hits)
+
+        return transactions
+
+
+def label_entities(store: EntityStore, stats=None) -> EntityStore:
+    # velocity state is scoped to this store, as in label_transactions
+    store.transactions = EntityLabeler(store, stats).label(store.transactions)
+
+    return store
@@ -1,23 +1,25 @@
-from data_generator.fraud_logic import compute_fraud_score, is_fraud
-from collections import defaultdict
-from datetime import timedelta
+from data_generator.rules import get_rules
+from data_generator.velocity import VelocityState
 
-user_tx_history = defaultdict(list)
-user_devices_seen = defaultdict(set)
 
-def label_transactions(transactions, users):
-    user_map = {
-        u[0]: {
-            "registration_date": u[1],
-            "home_country": u[2],
-            "risk_segment": u[3]
+class TransactionLabeler:
+    # Incremental labeler: transactions must be fed in time order.
+    # Velocity and device state live for the lifetime of the labeler.
+    def __init__(self, users):
+        self.user_map = {
+            u[0]: {
+                "registration_date": u[1],
+                "home_country": u[2],
+                "risk_segment": u[3]
+            }
+            for u in users
         }
-        for u in users
-    }
 
-    labeled = []
+        self.velocity = VelocityState()
+        self.rules = get_rules()
 
-    for tx in sorted(transactions, key=lambda x: x[-1]):
+    def context(self, tx) -> dict:
+        # rule inputs from the state before tx; tx itself is not observed
         (
             transaction_id,
             user_id,
@@ -30,32 +32,44 @@ def label_transactions(transactions, users):
             transaction_ts
         ) = tx
 
-        history = user_tx_history[user_id]
-
-        tx_count_last_1h = sum(
-            1 for h in history
-            if transaction_ts - h <= timedelta(hours=1)
-        )
-
-        is_new_device = device_id not in user_devices_seen[user_id]
+        user = self.user_map[user_id]
+        state = self.velocity.for_user(user_id)
+        counts = state.counts(transaction_ts)
 
         context = {
             "transaction_ts": transaction_ts,
             "transaction_country": transaction_country,
             "merchant_category": merchant_category,
-            "tx_count_last_1h": tx_count_last_1h,
-            "is_new_device": is_new_device,
-            "user_home_country": user_map[user_id]["home_country"],
-            "user_registration_date": user_map[user_id]["registration_date"],
-            "risk_segment": user_map[user_id]["risk_segment"]
+            "tx_count_last_1h": counts["1h"],
+            "tx_count_last_24h": counts["24h"],
+            "tx_count_last_7d": counts["7d"],
+            "is_new_device": state.is_new_device(device_id),
+            "user_home_country": user["home_country"],
+            "user_registration_date": user["registration_date"],
+            "risk_segment": user["risk_segment"]
         }
 
-        score, reasons = compute_fraud_score(context)
-        fraud_flag = is_fraud(score)
+        return context
+
+    def observe(self, tx):
+        # user_id, device_id, transaction_ts
+        self.velocity.for_user(tx[1]).observe(tx[8], tx[7])
 
-        labeled.append(tx + (score, fraud_flag, reasons))
+    def label(self, tx) -> tuple:
+        # reasons: mask of reason codes (data_generator.reasons)
+        score, reasons = self.rules.score(self.context(tx))
+        fraud_flag = self.rules.is_fraud(score)
 
-        history.append(transaction_ts)
-        user_devices_seen[user_id].add(device_id)
+        self.observe(tx)
+
+        return tx + (score, fraud_flag, reasons)
+
+
+def label_transactions(transactions, users):
+    # velocity state is scoped to this run
+    labeler = TransactionLabeler(users)
 
-    return labeled
\ No newline at end of file
+    return [
+        labeler.label(tx)
+        for tx in sorted(transactions, key=lambda x: x[-1])
+    ]
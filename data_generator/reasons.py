@@ -0,0 +1,41 @@
+# Fraud reason codes.
+#
+# Every reason a rule can report has a fixed bit, its "reason_bit" in the
+# rule file (data_generator/rules.py). Labels carry the reasons of a
+# transaction as one integer mask (sum of 1 << bit), which is also the
+# reasons column of mart.fraud_predictions (BIGINT).
+#
+# meta.fraud_reasons (database/init.sql) is the registry of every code ever
+# written. A rule set registers its codes before its labels are stored, and a
+# bit or reason already registered with another partner is an error, so bits
+# are never reused or renumbered and masks stored by any rule set version
+# decode the same way. A new reason takes a free bit in the rule file, a
+# retired reason keeps its row.
+
+# masks stay positive BIGINTs
+MAX_REASON_BIT = 62
+
+
+def register_reasons(cur, rules):
+    # same transaction as the labels: a conflict rolls them back
+    cur.execute("""
+        INSERT INTO meta.fraud_reasons (reason_bit, reason)
+        SELECT * FROM unnest(%s::SMALLINT[], %s::TEXT[])
+        ON CONFLICT DO NOTHING
+    """, (list(rules.reason_bits), list(rules.reasons)))
+
+    cur.execute("""
+        SELECT reason_bit, reason
+        FROM meta.fraud_reasons
+        WHERE reason_bit = ANY(%s) OR reason = ANY(%s)
+    """, (list(rules.reason_bits), list(rules.reasons)))
+
+    codes = dict(zip(rules.reasons, rules.reason_bits))
+    conflicts = sorted(
+        f"bit {bit} is {reason}" for bit, reason in cur.fetchall() if codes.get(reason) != bit
+    )
+
+    if conflicts:
+        raise ValueError(
+            f"{rules.source}: reason codes conflict with meta.fraud_reasons: {', '.join(conflicts)}"
+        )
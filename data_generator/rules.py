@@ -0,0 +1,597 @@
+from functools import reduce
+from pathlib import Path
+from typing import List, Tuple
+import json
+import operator
+import os
+import sys
+import threading
+import time
+
+from data_generator.reasons import MAX_REASON_BIT
+from database.env import load_env
+
+# Declarative fraud rules.
+#
+# A rule set (data_generator/fraud_rules.json, or the file named by
+# FRAUD_RULES_PATH) lists rules in scoring order. Each has a name, which is
+# also the reason reported when it fires, the bit of that reason in reason
+# masks (reason_bit, see data_generator/reasons.py), a weight and a condition
+# over the rule context (CONTEXT_FIELDS and DERIVED_FIELDS):
+#
+#   {"field": "tx_count_last_1h", "op": ">", "value": 3}
+#   {"field": "merchant_category", "op": "in", "value": ["gambling", "travel"]}
+#   {"field": "user_home_country", "op": "!=", "other": "transaction_country"}
+#   {"all": [...]}, {"any": [...]}, {"not": {...}}
+#
+# score = min(base_score + the weights of the rules that fire, max_score),
+# added in rule order; a transaction is fraud when score >= threshold.
+# Reasons are returned as a bitmask of their reason codes.
+#
+# RuleSet validates and compiles a rule set once:
+# - score(): one generated Python function for a single context
+# - score_batch(): NumPy expressions over columns; categorical columns passed
+#   as CodedColumn are evaluated once per distinct value, not per row
+# Both give the same scores. score_batch() and profile() count per-rule hits
+# and evaluation time in a RuleStats.
+#
+# python -m data_generator.rules [path]    # validate and print a rule set
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / "fraud_rules.json"
+
+REQUIRED = object()
+
+# context field: default when the context does not have it
+CONTEXT_FIELDS = {
+    "transaction_ts": REQUIRED,
+    "transaction_country": REQUIRED,
+    "merchant_category": REQUIRED,
+    "tx_count_last_1h": 0,
+    "tx_count_last_24h": 0,
+    "tx_count_last_7d": 0,
+    "is_new_device": False,
+    "user_home_country": None,
+    "user_registration_date": REQUIRED,
+    "risk_segment": REQUIRED,
+}
+
+
+def _batch_hour(get):
+    import numpy as np
+
+    ts = np.asarray(get("transaction_ts"), dtype="datetime64[us]")
+    return (ts - ts.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+
+
+def _batch_user_age_days(get):
+    import numpy as np
+
+    ts = np.asarray(get("transaction_ts"), dtype="datetime64[us]")
+    registration = np.asarray(get("user_registration_date"), dtype="datetime64[D]")
+    return (ts.astype("datetime64[D]") - registration).astype(np.int64)
+
+
+# derived field: (inputs, scalar expression, batch function)
+DERIVED_FIELDS = {
+    "hour": (
+        ("transaction_ts",),
+        "transaction_ts.hour",
+        _batch_hour
+    ),
+    "user_age_days": (
+        ("transaction_ts", "user_registration_date"),
+        "(transaction_ts.date() - user_registration_date).days",
+        _batch_user_age_days
+    ),
+}
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+MEMBERSHIP = {"in": "in", "not_in": "not in"}
+
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+class CodedColumn:
+    # A categorical batch column as codes into values (values[codes])
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def decode(self):
+        return self.values[self.codes]
+
+
+class RuleStats:
+    # Per rule: transactions it fired on and seconds spent evaluating it
+    __slots__ = ("names", "rows", "hits", "seconds")
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.rows = 0
+        self.hits = [0] * len(self.names)
+        self.seconds = [0.0] * len(self.names)
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.hits = [a + b for a, b in zip(self.hits, other.hits)]
+        self.seconds = [a + b for a, b in zip(self.seconds, other.seconds)]
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "rules": [
+                {
+                    "rule": name,
+                    "hits": hits,
+                    "hit_rate": round(hits / self.rows, 6) if self.rows else None,
+                    "seconds": round(seconds, 6),
+                    "ns_per_row": round(seconds / self.rows * 1e9, 1) if self.rows else None,
+                }
+                for name, hits, seconds in zip(self.names, self.hits, self.seconds)
+            ],
+        }
+
+    def report(self) -> str:
+        lines = [f"{'rule':30} {'hits':>10} {'hit rate':>9} {'ns/row':>9}"]
+
+        for rule in self.as_dict()["rules"]:
+            lines.append(
+                f"{rule['rule']:30} {rule['hits']:>10} {rule['hit_rate'] or 0:>9.4f} "
+                f"{rule['ns_per_row'] or 0:>9.1f}"
+            )
+
+        return "\n".join(lines)
+
+
+def _check_condition(condition, where):
+    if not isinstance(condition, dict):
+        raise ValueError(f"{where}: a condition must be an object")
+
+    for combinator in ("all", "any"):
+        if combinator in condition:
+            parts = condition[combinator]
+
+            if len(condition) != 1 or not isinstance(parts, list) or not parts:
+                raise ValueError(f"{where}: '{combinator}' takes a non-empty list only")
+
+            for part in parts:
+                _check_condition(part, where)
+            return
+
+    if "not" in condition:
+        if len(condition) != 1:
+            raise ValueError(f"{where}: 'not' takes a single condition")
+
+        _check_condition(condition["not"], where)
+        return
+
+    field, op = condition.get("field"), condition.get("op")
+    fields = CONTEXT_FIELDS.keys() | DERIVED_FIELDS.keys()
+
+    if field not in fields:
+        raise ValueError(f"{where}: unknown field {field!r}")
+
+    if op not in COMPARISONS and op not in MEMBERSHIP:
+        raise ValueError(f"{where}: unknown op {op!r}")
+
+    if set(condition) - {"field", "op", "value", "other"} or ("value" in condition) == ("other" in condition):
+        raise ValueError(f"{where}: a comparison has field, op and either value or other")
+
+    if "other" in condition:
+        if condition["other"] not in fields or op in MEMBERSHIP:
+            raise ValueError(f"{where}: 'other' must be a field compared with {', '.join(COMPARISONS)}")
+    elif op in MEMBERSHIP:
+        values = condition["value"]
+
+        if not isinstance(values, list) or not all(isinstance(v, SCALAR_TYPES) for v in values):
+            raise ValueError(f"{where}: '{op}' takes a list of values")
+    elif not isinstance(condition["value"], SCALAR_TYPES):
+        raise ValueError(f"{where}: '{op}' takes a single value")
+
+
+def _fields(condition) -> set:
+    for combinator in ("all", "any"):
+        if combinator in condition:
+            return set().union(*map(_fields, condition[combinator]))
+
+    if "not" in condition:
+        return _fields(condition["not"])
+
+    return {condition["field"]} | ({condition["other"]} if "other" in condition else set())
+
+
+def _with_inputs(fields) -> list:
+    # context fields first, then derived fields, each once
+    needed = set(fields)
+
+    for field in fields:
+        needed.update(DERIVED_FIELDS.get(field, ((),))[0])
+
+    return (
+        [f for f in CONTEXT_FIELDS if f in needed]
+        + [f for f in DERIVED_FIELDS if f in needed]
+    )
+
+
+# Scalar compilation: conditions become Python expressions of one function
+
+def _scalar_expression(condition, constants) -> str:
+    if "all" in condition:
+        return "(" + " and ".join(_scalar_expression(c, constants) for c in condition["all"]) + ")"
+
+    if "any" in condition:
+        return "(" + " or ".join(_scalar_expression(c, constants) for c in condition["any"]) + ")"
+
+    if "not" in condition:
+        return f"(not {_scalar_expression(condition['not'], constants)})"
+
+    field, op = condition["field"], condition["op"]
+
+    if "other" in condition:
+        return f"({field} {op} {condition['other']})"
+
+    if op in MEMBERSHIP:
+        name = f"_values_{len(constants)}"
+        constants[name] = frozenset(condition["value"])
+        return f"({field} {MEMBERSHIP[op]} {name})"
+
+    return f"({field} {op} {condition['value']!r})"
+
+
+def _scalar_loads(fields) -> List[str]:
+    lines = []
+
+    for field in _with_inputs(fields):
+        if field in DERIVED_FIELDS:
+            lines.append(f"{field} = {DERIVED_FIELDS[field][1]}")
+        elif CONTEXT_FIELDS[field] is REQUIRED:
+            lines.append(f"{field} = context[{field!r}]")
+        else:
+            lines.append(f"{field} = context.get({field!r}, {CONTEXT_FIELDS[field]!r})")
+
+    return lines
+
+
+# Batch compilation: conditions become closures over a column getter
+
+def _batch_leaf(condition):
+    import numpy as np
+
+    field, op = condition["field"], condition["op"]
+
+    if "other" in condition:
+        other = condition["other"]
+        compare = COMPARISONS[op]
+
+        def evaluate(get):
+            left, right = get(field), get(other)
+
+            if isinstance(left, CodedColumn) and isinstance(right, CodedColumn):
+                if op in ("==", "!=") and (
+                    left.values is right.values or np.array_equal(left.values, right.values)
+                ):
+                    return compare(left.codes, right.codes)
+
+            return compare(_plain(left), _plain(right))
+
+        return evaluate
+
+    if op in MEMBERSHIP:
+        values = list(condition["value"])
+
+        def test(column):
+            return np.isin(column, values, invert=op == "not_in")
+    else:
+        value = condition["value"]
+        compare = COMPARISONS[op]
+
+        def test(column):
+            return compare(column, value)
+
+    def evaluate(get):
+        column = get(field)
+
+        if isinstance(column, CodedColumn):
+            # one test per distinct value, then a table lookup per row
+            return np.asarray(test(column.values), dtype=bool)[column.codes]
+
+        return np.asarray(test(column), dtype=bool)
+
+    return evaluate
+
+
+def _batch_condition(condition):
+    if "all" in condition:
+        parts = [_batch_condition(c) for c in condition["all"]]
+        return lambda get: reduce(operator.and_, (part(get) for part in parts))
+
+    if "any" in condition:
+        parts = [_batch_condition(c) for c in condition["any"]]
+        return lambda get: reduce(operator.or_, (part(get) for part in parts))
+
+    if "not" in condition:
+        part = _batch_condition(condition["not"])
+        return lambda get: ~part(get)
+
+    return _batch_leaf(condition)
+
+
+def _plain(column):
+    return column.decode() if isinstance(column, CodedColumn) else column
+
+
+class RuleSet:
+    def __init__(self, definition, source="<rules>"):
+        self.definition = definition
+        self.source = source
+        self.version = definition.get("version")
+        self.base_score = definition.get("base_score")
+        self.max_score = definition.get("max_score", 1.0)
+        self.threshold = definition.get("threshold")
+        self.rules = definition.get("rules")
+
+        if not isinstance(self.version, str) or not self.version:
+            raise ValueError(f"{source}: version must be a non-empty string")
+
+        for key in ("base_score", "max_score", "threshold"):
+            if not isinstance(getattr(self, key), (int, float)) or isinstance(getattr(self, key), bool):
+                raise ValueError(f"{source}: {key} must be a number")
+
+        if not isinstance(self.rules, list) or not self.rules:
+            raise ValueError(f"{source}: rules must be a non-empty list")
+
+        names = []
+        bits = []
+
+        for i, rule in enumerate(self.rules):
+            name = rule.get("name") if isinstance(rule, dict) else None
+            where = f"{source}: rule {name or i}"
+
+            if not isinstance(name, str) or not name.isidentifier() or name in names:
+                raise ValueError(f"{where}: name must be a unique identifier")
+
+            bit = rule.get("reason_bit")
+
+            if (
+                not isinstance(bit, int) or isinstance(bit, bool)
+                or not 0 <= bit <= MAX_REASON_BIT or bit in bits
+            ):
+                raise ValueError(f"{where}: reason_bit must be a unique integer in 0..{MAX_REASON_BIT}")
+
+            if not isinstance(rule.get("weight"), (int, float)) or isinstance(rule["weight"], bool):
+                raise ValueError(f"{where}: weight must be a number")
+
+            unknown = set(rule) - {"name", "reason_bit", "weight", "when", "description"}
+
+            if unknown:
+                raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+
+            _check_condition(rule.get("when"), where)
+            names.append(name)
+            bits.append(bit)
+
+        # reasons, in rule order; also the columns of score_batch's hits
+        self.reasons = tuple(names)
+        self.reason_bits = tuple(bits)
+
+        self._compile_scalar()
+        self._batch = [_batch_condition(rule["when"]) for rule in self.rules]
+
+    def _compile_scalar(self):
+        constants = {}
+        expressions = [_scalar_expression(rule["when"], constants) for rule in self.rules]
+        fields = set().union(*(_fields(rule["when"]) for rule in self.rules))
+
+        lines = ["def score(context):"]
+        lines += ["    " + line for line in _scalar_loads(fields)]
+        lines += ["", f"    score = {float(self.base_score)!r}", "    reasons = 0"]
+
+        for rule, bit, expression in zip(self.rules, self.reason_bits, expressions):
+            lines += [
+                f"    if {expression}:",
+                f"        score += {float(rule['weight'])!r}",
+                f"        reasons |= {1 << bit}  # {rule['name']}",
+            ]
+
+        lines.append(f"    return min(score, {float(self.max_score)!r}), reasons")
+
+        # one predicate per rule, for profile()
+        for i, (rule, expression) in enumerate(zip(self.rules, expressions)):
+            lines += ["", f"def rule_{i}(context):"]
+            lines += ["    " + line for line in _scalar_loads(_fields(rule["when"]))]
+            lines.append(f"    return {expression}")
+
+        self.scalar_source = "\n".join(lines) + "\n"
+
+        # field names and ops are validated, values are repr() literals or
+        # constants, so the generated source only reads the context
+        namespace = dict(constants)
+        exec(compile(self.scalar_source, f"<{self.source}>", "exec"), namespace)
+
+        self.score = namespace["score"]
+        self._predicates = [namespace[f"rule_{i}"] for i in range(len(self.rules))]
+
+    def is_fraud(self, score):
+        return score >= self.threshold
+
+    def score_batch(self, columns, stats=None) -> Tuple["np.ndarray", "np.ndarray"]:
+        # columns: context field -> NumPy array, sequence or CodedColumn.
+        # Returns scores and an (n, len(reasons)) bool matrix of rule hits.
+        import numpy as np
+
+        n = len(columns["transaction_ts"])
+        cache = {}
+
+        def get(field):
+            if field not in cache:
+                if field in DERIVED_FIELDS:
+                    cache[field] = DERIVED_FIELDS[field][2](get)
+                elif field in columns:
+                    column = columns[field]
+                    cache[field] = column if isinstance(column, CodedColumn) else np.asarray(column)
+                elif CONTEXT_FIELDS[field] is not REQUIRED:
+                    cache[field] = np.full(n, CONTEXT_FIELDS[field])
+                else:
+                    raise KeyError(field)
+
+            return cache[field]
+
+        hits = np.zeros((n, len(self.rules)), dtype=bool)
+        scores = np.full(n, float(self.base_score), dtype=np.float64)
+
+        for i, (rule, evaluate) in enumerate(zip(self.rules, self._batch)):
+            # a derived field is computed by the first rule that uses it
+            started = time.perf_counter()
+            hit = evaluate(get)
+            hits[:, i] = hit
+
+            # weights added in rule order, as score(): identical floats
+            np.add(scores, float(rule["weight"]), out=scores, where=hits[:, i])
+
+            if stats is not None:
+                stats.seconds[i] += time.perf_counter() - started
+
+        np.minimum(scores, float(self.max_score), out=scores)
+
+        if stats is not None:
+            stats.rows += n
+            stats.hits = [a + int(b) for a, b in zip(stats.hits, hits.sum(axis=0))]
+
+        return scores, hits
+
+    def profile(self, contexts, stats=None) -> RuleStats:
+        # scalar cost: each rule's predicate timed over all contexts
+        stats = stats or self.new_stats()
+
+        for i, predicate in enumerate(self._predicates):
+            started = time.perf_counter()
+            stats.hits[i] += sum(1 for context in contexts if predicate(context))
+            stats.seconds[i] += time.perf_counter() - started
+
+        stats.rows += len(contexts)
+        return stats
+
+    def new_stats(self) -> RuleStats:
+        return RuleStats(self.reasons)
+
+    def __reduce__(self):
+        # the compiled functions do not pickle: recompiled from the definition
+        return RuleSet, (self.definition, self.source)
+
+    def decode_reasons(self, mask) -> List[str]:
+        # reasons in bit order; None (no rule labels) decodes to []
+        if not mask:
+            return []
+
+        mask = int(mask)
+        return [reason for bit, reason in sorted(zip(self.reason_bits, self.reasons)) if mask >> bit & 1]
+
+    def reason_mask(self, hits):
+        # (n, len(reasons)) hits -> one reason mask per row, as score()
+        import numpy as np
+
+        dtype = np.min_scalar_type((2 << max(self.reason_bits)) - 1)
+        return hits @ np.array([1 << bit for bit in self.reason_bits], dtype=dtype)
+
+
+def load_rules(path=DEFAULT_RULES_PATH) -> RuleSet:
+    with open(path, encoding="utf-8") as f:
+        return RuleSet(json.load(f), source=str(path))
+
+
+def rules_path() -> Path:
+    load_env()
+    return Path(os.getenv("FRAUD_RULES_PATH") or DEFAULT_RULES_PATH)
+
+
+def _file_stamp(path) -> tuple:
+    stat = path.stat()
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+_rules = None
+_rules_stamp = None
+_rules_lock = threading.Lock()
+
+
+def get_rules() -> RuleSet:
+    # the rule set of this process, read on first use. Batch runs label with
+    # it from start to end; long-running services call reload_rules().
+    global _rules, _rules_stamp
+
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                path = rules_path()
+                # taken before reading: a change during the read is seen later
+                _rules_stamp = _file_stamp(path)
+                _rules = load_rules(path)
+
+    return _rules
+
+
+def reload_rules() -> bool:
+    # Re-reads the rule file when it changed (path, mtime or size); True when
+    # a new rule set was installed. A file that does not load or validate
+    # keeps the current rule set and is reported once, until it changes again.
+    global _rules, _rules_stamp
+
+    get_rules()
+
+    with _rules_lock:
+        path = rules_path()
+
+        try:
+            stamp = _file_stamp(path)
+        except OSError:
+            # e.g. being replaced; checked again on the next call
+            return False
+
+        if stamp == _rules_stamp:
+            return False
+
+        _rules_stamp = stamp
+
+        try:
+            rules = load_rules(path)
+        except Exception as e:
+            print(f"Keeping rule set {_rules.version}, {path} is invalid: {e}")
+            return False
+
+        _rules = rules
+        return True
+
+
+def use_rules(rules: RuleSet):
+    # installs a given rule set, e.g. the parent's in a worker process, so a
+    # run labels with one rule set even if the file changes meanwhile
+    global _rules
+
+    with _rules_lock:
+        _rules = rules
+
+
+def main(argv):
+    rules = load_rules(argv[0] if argv else DEFAULT_RULES_PATH)
+
+    print(f"{rules.source}: {rules.version}, {len(rules.reasons)} rules, "
+          f"base {rules.base_score}, max {rules.max_score}, threshold {rules.threshold}")
+
+    for rule, bit in zip(rules.rules, rules.reason_bits):
+        print(f"  {rule['weight']:>6} {rule['name']:30} bit {bit:<3} {json.dumps(rule['when'])}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,15 +1,22 @@
 from datetime import datetime
+import time
 from data_generator.generate_users import generate_users
 from data_generator.generate_devices import generate_devices
 from data_generator.generate_merchants import generate_merchants
 from data_generator.generate_transactions import generate_transactions
-from data_generator.label_transactions import label_transactions
 import os
-from database.connection import get_connection
-from data_generator.config import GENERATOR_MODE
+from database.connection import connection
+from database.bulk import copy_rows, copy_rows_on_conflict_do_nothing
+from database.instrumentation import step
+from data_generator.config import get_config, N_USERS, N_MERCHANTS
+from data_generator.rules import get_rules
+from data_generator.reasons import register_reasons
 
 # $env:GENERATOR_MODE="INCREMENTAL"
 # $env:GENERATOR_MODE="DEV"
+# $env:GENERATOR_BACKEND="columnar"
+# $env:GENERATOR_BACKEND="sharded"
+# $env:GENERATOR_BACKEND="streaming"
 # python -m data_generator.run
 
 def reset_raw_tables(cur):
@@ -21,157 +28,279 @@ def reset_raw_tables(cur):
     """)
 
 
-def insert_users(cur, users):
-    cur.executemany(
-        """
-        INSERT INTO raw.users (user_id, registration_date, home_country, risk_segment)
-        VALUES (%s, %s, %s, %s)
-        """,
-        users
-    )
+USER_COLUMNS = ("user_id", "registration_date", "home_country", "risk_segment")
+
+DEVICE_COLUMNS = ("device_id", "device_type", "first_seen_ts")
+
+MERCHANT_COLUMNS = ("merchant_id", "merchant_category")
+
+TRANSACTION_COLUMNS = (
+    "transaction_id",
+    "user_id",
+    "amount",
+    "currency",
+    "merchant_id",
+    "merchant_category",
+    "transaction_country",
+    "device_id",
+    "transaction_ts",
+    "ingestion_ts"
+)
+
+PREDICTION_COLUMNS = (
+    "transaction_id",
+    "fraud_probability",
+    "is_fraud",
+    "model_version",
+    "score_source",
+    "prediction_ts",
+    "reasons"
+)
+
 
+def insert_users(cur, users) -> int:
+    return copy_rows(cur, "raw.users", USER_COLUMNS, users)
 
-def insert_devices(cur, devices_by_user):
-    rows = []
-    for user_devices in devices_by_user.values():
-        for d in user_devices:
-            rows.append((
-                d["device_id"],
-                d["device_type"],
-                d["first_seen_ts"]
-            ))
-    
-    cur.executemany(
-        """
-        INSERT INTO core.devices (device_id, device_type, first_seen_ts)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (device_id) DO NOTHING;
-        """,
-        rows
+
+def insert_device_rows(cur, rows) -> int:
+    return copy_rows_on_conflict_do_nothing(
+        cur, "core.devices", DEVICE_COLUMNS, rows, ("device_id",)
     )
 
 
-def insert_merchants(cur, merchants):
-    cur.executemany(
-        """
-        INSERT INTO core.merchants (merchant_id, merchant_category)
-        VALUES (%s, %s)
-        ON CONFLICT (merchant_id) DO NOTHING;
-        """,
-        merchants
+def insert_devices(cur, devices_by_user) -> int:
+    return insert_device_rows(cur, (
+        (
+            d["device_id"],
+            d["device_type"],
+            d["first_seen_ts"]
+        )
+        for user_devices in devices_by_user.values()
+        for d in user_devices
+    ))
+
+
+def insert_merchants(cur, merchants) -> int:
+    return copy_rows_on_conflict_do_nothing(
+        cur, "core.merchants", MERCHANT_COLUMNS, merchants, ("merchant_id",)
     )
 
 
-def insert_transactions(cur, labeled_transactions):
-    cur.executemany(
-        """
-        INSERT INTO raw.transactions (
-            transaction_id,
-            user_id,
-            amount,
-            currency,
-            merchant_id,
-            merchant_category,
-            transaction_country,
-            device_id,
-            transaction_ts,
-            ingestion_ts
+def insert_transactions(cur, labeled_transactions) -> int:
+    ingestion_ts = datetime.utcnow()  # ingestion_ts (system time)
+
+    return copy_rows(
+        cur,
+        "raw.transactions",
+        TRANSACTION_COLUMNS,
+        (
+            tx[:9] + (ingestion_ts,)  # transaction_ts is tx[8] (event time)
+            for tx in labeled_transactions
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-        [
+    )
+
+
+def insert_fraud_predictions(cur, labeled_transactions) -> int:
+    prediction_ts = datetime.utcnow()
+    rules_version = get_rules().version
+
+    return copy_rows_on_conflict_do_nothing(
+        cur,
+        "mart.fraud_predictions",
+        PREDICTION_COLUMNS,
+        (
             (
-                tx[0],  # transaction_id
-                tx[1],  # user_id
-                tx[2],  # amount
-                tx[3],  # currency
-                tx[4],  # merchant_id
-                tx[5],  # merchant_category
-                tx[6],  # transaction_country
-                tx[7],  # device_id
-                tx[8],  # transaction_ts (event time)
-                datetime.utcnow()  # ingestion_ts (system time)
+                tx[0],          # transaction_id
+                tx[-3],         # fraud_score → fraud_probability
+                tx[-2],         # is_fraud
+                rules_version,
+                "rules",
+                prediction_ts,
+                tx[-1]          # reason mask
             )
             for tx in labeled_transactions
-        ]
+        ),
+        ("transaction_id", "model_version")
     )
 
 
-def insert_fraud_predictions(cur, labeled_transactions):
-    cur.executemany(
-    """
-    INSERT INTO mart.fraud_predictions (
-        transaction_id,
-        fraud_probability,
-        is_fraud,
-        model_version,
-        score_source,
-        prediction_ts
-    )
-    VALUES (%s, %s, %s, %s, %s, %s)
-    ON CONFLICT (transaction_id) DO NOTHING
-    """,
-    [
-        (
-            tx[0],          # transaction_id
-            tx[-3],         # fraud_score → fraud_probability
-            tx[-2],         # is_fraud
-            "rules_v1",
-            "rules",
-            datetime.utcnow()
+# NumPy, the entity store and the NumPy backends are imported only when used
+
+def generate_faker_store():
+    from data_generator.entities import EntityStore
+
+    with step("generate_users") as metrics:
+        users = generate_users()
+        metrics.rows = len(users)
+
+    with step("generate_devices") as metrics:
+        devices_by_user = generate_devices(users)
+        metrics.rows = sum(len(devices) for devices in devices_by_user.values())
+
+    with step("generate_merchants") as metrics:
+        merchants = generate_merchants(N_MERCHANTS)
+        metrics.rows = len(merchants)
+
+    with step("generate_transactions") as metrics:
+        transactions = generate_transactions(
+            users=users,
+            devices_by_user=devices_by_user,
+            merchants=merchants
         )
-        for tx in labeled_transactions
-    ]
-)
+        metrics.rows = len(transactions)
 
+    # the rows are dropped once interned
+    return EntityStore.from_rows(users, devices_by_user, merchants, transactions)
 
-def main():
-    print(f"Starting data generation ({GENERATOR_MODE} mode)")
 
-    users = generate_users()
-    devices_by_user = generate_devices(users)
-    merchants = generate_merchants(10)
+def generate_columnar_store(config):
+    from data_generator import generate_columnar as columnar
 
-    transactions = generate_transactions(
-        users=users,
-        devices_by_user=devices_by_user,
-        merchants=merchants
-    )
+    return columnar.generate_store(columnar.make_rng(config.random_seed), N_USERS, N_MERCHANTS)
+
+
+def report_rules(stats, metrics):
+    # per-rule hits and evaluation cost, stored as the step's plan
+    print(stats.report())
+    metrics.plan = {"rules_version": get_rules().version, **stats.as_dict()}
 
-    labeled_transactions = label_transactions(
-        transactions=transactions,
-        users=users
-    )
 
-    fraud_rate = sum(tx[-2] for tx in labeled_transactions) / len(labeled_transactions)
-    print(f"Fraud rate: {fraud_rate:.4f}")
-    assert 0.0 <= fraud_rate <= 0.05, "Fraud rate out of expected range"
+def main_streaming(config):
+    from data_generator.streaming import stream_generation, batched
 
-    conn = get_connection()
-    cur = conn.cursor()
+    stats = get_rules().new_stats()
 
-    try:
-        if GENERATOR_MODE == "DEV":
+    merchants, chunks = stream_generation(
+        n_users=N_USERS,
+        chunk_users=config.stream_chunk_users,
+        n_merchants=N_MERCHANTS,
+        seed=config.random_seed,
+        stats=stats
+    )
+
+    n_tx = 0
+    n_fraud = 0
+    n_batches = 0
+    started = time.perf_counter()
+
+    # single transaction: nothing is visible until the whole stream is valid,
+    # any error (including the fraud rate check) rolls everything back.
+    # Generation, labeling and loading interleave, so this is one step.
+    with step("stream") as metrics, connection() as conn, conn.cursor() as cur:
+        if config.mode == "DEV":
             print("Resetting raw tables (DEV mode)")
             reset_raw_tables(cur)
 
-        insert_users(cur, users)
-        insert_devices(cur, devices_by_user)
+        register_reasons(cur, get_rules())
         insert_merchants(cur, merchants)
-        insert_transactions(cur, labeled_transactions)
-        insert_fraud_predictions(cur, labeled_transactions)
 
-        conn.commit()
-        print("Data successfully written to database")
+        for chunk_index, (users, devices_by_user, labeled) in enumerate(chunks):
+            insert_users(cur, users)
+            insert_devices(cur, devices_by_user)
+
+            for batch in batched(labeled, config.stream_batch_size):
+                insert_transactions(cur, batch)
+                insert_fraud_predictions(cur, batch)
+
+                n_batches += 1
+                n_tx += len(batch)
+                n_fraud += sum(tx[-2] for tx in batch)
+
+                elapsed = time.perf_counter() - started
+                print(
+                    f"Batch {n_batches} (chunk {chunk_index}): "
+                    f"{len(batch)} rows, {n_tx} total, "
+                    f"{n_tx / elapsed:.0f} rows/s"
+                )
+
+        # no rows (N_USERS=0, TX_DAYS=0): nothing to check
+        if n_tx:
+            fraud_rate = n_fraud / n_tx
+            print(f"Fraud rate: {fraud_rate:.4f}")
+            assert 0.0 <= fraud_rate <= 0.05, "Fraud rate out of expected range"
+        else:
+            print("No transactions generated")
+
+        metrics.rows = n_tx
+        report_rules(stats, metrics)
+
+    print("Data successfully written to database")
+    print("Pipeline finished")
+
+
+def main(config=None):
+    config = config or get_config()
+    print(f"Starting data generation ({config.mode} mode, {config.backend} backend)")
+
+    if config.backend == "streaming":
+        return main_streaming(config)
+
+    stats = get_rules().new_stats()
+
+    if config.backend == "sharded":
+        print(f"Generating {config.shards} shards on {config.workers} workers")
+
+        from data_generator.sharding import generate_sharded
+
+        # shards are labeled inside the workers
+        with step("generate_and_label") as metrics:
+            store = generate_sharded(
+                n_users=N_USERS,
+                n_shards=config.shards,
+                n_merchants=N_MERCHANTS,
+                workers=config.workers,
+                seed=config.random_seed,
+                stats=stats
+            )
+            metrics.rows = len(store.transactions["transaction_id"])
+            report_rules(stats, metrics)
+    else:
+        if config.backend == "columnar":
+            with step("generate") as metrics:
+                store = generate_columnar_store(config)
+                metrics.rows = len(store.transactions["transaction_id"])
+        else:
+            store = generate_faker_store()
+
+        from data_generator.label_entities import label_entities
+
+        with step("label_transactions") as metrics:
+            label_entities(store, stats)
+            metrics.rows = len(store.transactions["transaction_id"])
+            report_rules(stats, metrics)
+
+    n_tx = len(store.transactions["is_fraud"])
+
+    # no rows (N_USERS=0, TX_DAYS=0): nothing to check, as main_streaming
+    if n_tx:
+        fraud_rate = float(store.transactions["is_fraud"].mean())
+        print(f"Fraud rate: {fraud_rate:.4f}")
+        assert 0.0 <= fraud_rate <= 0.05, "Fraud rate out of expected range"
+    else:
+        print("No transactions generated")
+
+    # commits on success, rolls back on error; rows are built from the
+    # store while COPY consumes them
+    with connection() as conn, conn.cursor() as cur:
+        if config.mode == "DEV":
+            print("Resetting raw tables (DEV mode)")
+
+            with step("reset_raw_tables"):
+                reset_raw_tables(cur)
 
-    except Exception:
-        conn.rollback()
-        raise
+        register_reasons(cur, get_rules())
 
-    finally:
-        cur.close()
-        conn.close()
+        for name, insert, rows in (
+            ("insert_users", insert_users, store.user_rows()),
+            ("insert_devices", insert_device_rows, store.device_rows()),
+            ("insert_merchants", insert_merchants, store.merchant_rows()),
+            ("insert_transactions", insert_transactions, store.labeled_rows()),
+            ("insert_fraud_predictions", insert_fraud_predictions, store.labeled_rows()),
+        ):
+            with step(name) as metrics:
+                metrics.rows = insert(cur, rows)
 
+    print("Data successfully written to database")
     print("Pipeline finished")
 
 
@@ -0,0 +1,35 @@
+import random
+import threading
+
+from data_generator.config import get_config
+
+# Seeded generators of the row-by-row (faker) backend, created on first use:
+# importing a generator module neither imports Faker (~130 ms) nor touches
+# the global random state. Every module gets its own instances seeded with
+# the configured seed, as they were when they were created at import.
+
+_fakers = {}
+_randoms = {}
+_lock = threading.Lock()
+
+
+def get_faker(owner):
+    if owner not in _fakers:
+        with _lock:
+            if owner not in _fakers:
+                from faker import Faker
+
+                fake = Faker()
+                fake.seed_instance(get_config().random_seed)
+                _fakers[owner] = fake
+
+    return _fakers[owner]
+
+
+def get_random(owner) -> random.Random:
+    if owner not in _randoms:
+        with _lock:
+            if owner not in _randoms:
+                _randoms[owner] = random.Random(get_config().random_seed)
+
+    return _randoms[owner]
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+import multiprocessing
+
+import numpy as np
+
+from data_generator.config import resolve_seed, TX_DAYS
+from data_generator import generate_columnar as columnar
+from data_generator.entities import EntityStore
+from data_generator.label_entities import label_entities
+from data_generator.rules import get_rules, use_rules
+
+# Sharded generation: the user population is split into a fixed number of
+# shards, each generated and labeled independently with its own seed.
+# Results depend only on the seed and the shard count, never on how many
+# workers run the shards. Workers return compact EntityStores, so only
+# arrays cross the process boundary.
+
+
+def shard_rng(shard_index, seed=None) -> np.random.Generator:
+    return np.random.default_rng(np.random.SeedSequence([resolve_seed(seed), shard_index]))
+
+
+def shard_sizes(n_users, n_shards) -> List[int]:
+    base, extra = divmod(n_users, n_shards)
+    return [base + (1 if i < extra else 0) for i in range(n_shards)]
+
+
+def generate_shard(task) -> tuple:
+    # (labeled store, rule stats)
+    shard_index, n_users, merchants, start_date, seed, rules = task
+
+    # the parent's rule set, not the rule file as it is now
+    use_rules(rules)
+
+    rng = shard_rng(shard_index, seed)
+    today = (start_date + timedelta(days=TX_DAYS)).date()
+
+    users = columnar.generate_users_columnar(rng, n_users, today)
+    devices = columnar.generate_devices_columnar(rng, users, today)
+    transactions = columnar.generate_transactions_columnar(
+        rng, users, devices, merchants, start_date
+    )
+
+    # users of different shards never overlap, so velocity and
+    # new-device context can be built per shard
+    stats = get_rules().new_stats()
+    store = label_entities(EntityStore(users, devices, merchants, transactions), stats)
+
+    return store, stats
+
+
+def generate_sharded(
+    n_users,
+    n_shards,
+    n_merchants,
+    workers=None,
+    seed=None,
+    start_date=None,
+    stats=None
+) -> EntityStore:
+    # resolved here: shard workers never read the configuration
+    seed = resolve_seed(seed)
+
+    if start_date is None:
+        start_date = datetime.now() - timedelta(days=TX_DAYS)
+
+    # merchants are shared by all shards
+    merchants = columnar.generate_merchants_columnar(columnar.make_rng(seed), n_merchants)
+
+    tasks = [
+        (shard_index, size, merchants, start_date, seed, get_rules())
+        for shard_index, size in enumerate(shard_sizes(n_users, n_shards))
+    ]
+
+    if workers == 1:
+        results = list(map(generate_shard, tasks))
+    else:
+        # spawn: forked workers would inherit the parent's open DB
+        # connections and the locks of its other threads
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            results = list(pool.map(generate_shard, tasks))
+
+    if stats is not None:
+        for _, shard_stats in results:
+            stats.merge(shard_stats)
+
+    # shard order, not completion order
+    return EntityStore.concat([store for store, _ in results])
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+from data_generator.config import resolve_seed, TX_DAYS
+from data_generator import generate_columnar as columnar
+from data_generator.entities import EntityStore
+from data_generator.label_entities import EntityLabeler
+from data_generator.sharding import shard_rng, shard_sizes
+
+# Streaming generation: users are produced in fixed-size chunks and each
+# chunk's transactions one day at a time, labeled as they are produced.
+# Only one chunk-day of transactions plus the labeler's 7d windows are held
+# in memory, whatever N_USERS and TX_DAYS are; both are compact arrays
+# (data_generator.entities) until rows are yielded.
+
+
+def iter_labeled_transactions(rng, store, start_date, stats=None):
+    labeler = EntityLabeler(store, stats)
+
+    # days never overlap, so labeling each day in time order
+    # keeps the chunk in time order
+    for day in range(TX_DAYS):
+        transactions = columnar.generate_transactions_columnar(
+            rng,
+            store.users,
+            store.devices,
+            store.merchants,
+            start_date,
+            day_start=day,
+            day_stop=day + 1
+        )
+
+        day_store = EntityStore(
+            store.users, store.devices, store.merchants, labeler.label(transactions)
+        )
+
+        yield from day_store.labeled_rows()
+
+
+def iter_user_chunks(merchants, n_users, chunk_users, start_date, seed=None, stats=None):
+    today = (start_date + timedelta(days=TX_DAYS)).date()
+    n_chunks = max(1, -(-n_users // chunk_users))
+
+    for chunk_index, size in enumerate(shard_sizes(n_users, n_chunks)):
+        rng = shard_rng(chunk_index, seed)
+
+        users = columnar.generate_users_columnar(rng, size, today)
+        devices = columnar.generate_devices_columnar(rng, users, today)
+        store = EntityStore(users, devices, merchants)
+
+        labeled = iter_labeled_transactions(rng, store, start_date, stats)
+
+        yield list(store.user_rows()), store.devices_by_user(), labeled
+
+
+def stream_generation(n_users, chunk_users, n_merchants, seed=None, start_date=None, stats=None):
+    # Returns merchant rows and a lazy iterator of
+    # (users, devices_by_user, labeled transaction iterator) per user chunk;
+    # rule hits and cost are added to stats as transactions are labeled
+    seed = resolve_seed(seed)
+
+    if start_date is None:
+        start_date = datetime.now() - timedelta(days=TX_DAYS)
+
+    merchants = columnar.generate_merchants_columnar(columnar.make_rng(seed), n_merchants)
+
+    chunks = iter_user_chunks(merchants, n_users, chunk_users, start_date, seed, stats)
+
+    return columnar.merchants_to_rows(merchants), chunks
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(islice(iterator, size))
+
+        if not batch:
+            return
+
+        yield batch
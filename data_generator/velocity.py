@@ -0,0 +1,58 @@
+from collections import deque
+from datetime import timedelta
+from typing import Dict
+
+VELOCITY_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7)
+}
+
+
+class UserWindowState:
+    # Per-user sliding windows over transaction timestamps.
+    # Events must be observed in time order: each window only keeps the
+    # timestamps still inside it, so observe() is amortized O(1).
+    __slots__ = ("windows", "devices_seen")
+
+    def __init__(self):
+        self.windows = {name: deque() for name in VELOCITY_WINDOWS}
+        self.devices_seen = set()
+
+    def counts(self, transaction_ts) -> Dict[str, int]:
+        result = {}
+
+        for name, window in self.windows.items():
+            span = VELOCITY_WINDOWS[name]
+
+            # evict timestamps that fell out of the window
+            while window and transaction_ts - window[0] > span:
+                window.popleft()
+
+            result[name] = len(window)
+
+        return result
+
+    def is_new_device(self, device_id) -> bool:
+        return device_id not in self.devices_seen
+
+    def observe(self, transaction_ts, device_id):
+        for window in self.windows.values():
+            window.append(transaction_ts)
+
+        self.devices_seen.add(device_id)
+
+
+class VelocityState:
+    # Velocity and device context for a single labeling run.
+    def __init__(self):
+        self.users: Dict[str, UserWindowState] = {}
+
+    def for_user(self, user_id) -> UserWindowState:
+        state = self.users.get(user_id)
+
+        if state is None:
+            state = UserWindowState()
+            self.users[user_id] = state
+
+        return state
@@ -0,0 +1,97 @@
+import csv
+import io
+from itertools import islice
+
+# Bulk loading through COPY ... FROM STDIN.
+# Rows are serialized to CSV in memory in chunks of COPY_CHUNK_ROWS,
+# None is sent as \N so empty strings stay empty strings.
+
+COPY_CHUNK_ROWS = 100_000
+NULL = r"\N"
+
+
+def _to_csv(rows) -> io.StringIO:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+
+    for row in rows:
+        writer.writerow([NULL if value is None else value for value in row])
+
+    buf.seek(0)
+    return buf
+
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def copy_rows(cur, table, columns, rows) -> int:
+    sql = (
+        f"COPY {table} ({', '.join(columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')"
+    )
+
+    copied = 0
+
+    for chunk in _chunks(rows, COPY_CHUNK_ROWS):
+        cur.copy_expert(sql, _to_csv(chunk))
+        copied += len(chunk)
+
+    return copied
+
+
+def _copy_through_stage(cur, table, columns, rows, on_conflict) -> int:
+    # COPY into a session-local staging table, then move the rows with
+    # INSERT ... ON CONFLICT to keep upsert semantics
+    stage = "stage_" + table.replace(".", "_")
+    column_list = ", ".join(columns)
+
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {stage}
+        (LIKE {table} INCLUDING DEFAULTS)
+        ON COMMIT DELETE ROWS
+    """)
+    cur.execute(f"TRUNCATE {stage}")
+
+    copy_rows(cur, stage, columns, rows)
+
+    cur.execute(f"""
+        INSERT INTO {table} ({column_list})
+        SELECT {column_list}
+        FROM {stage}
+        {on_conflict}
+    """)
+    inserted = cur.rowcount
+
+    cur.execute(f"TRUNCATE {stage}")
+
+    return inserted
+
+
+def copy_rows_on_conflict_do_nothing(cur, table, columns, rows, conflict_columns) -> int:
+    return _copy_through_stage(
+        cur, table, columns, rows,
+        f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+    )
+
+
+def copy_rows_upsert(cur, table, columns, rows, conflict_columns) -> int:
+    # existing rows get the non-key columns of the new rows
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}"
+        for column in columns
+        if column not in conflict_columns
+    )
+
+    return _copy_through_stage(
+        cur, table, columns, rows,
+        f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {updates}"
+    )
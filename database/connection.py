@@ -1,27 +1,245 @@
-from dotenv import load_dotenv
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
 import os
+import threading
+import time
+import weakref
 import psycopg2
+from psycopg2 import pool as pg_pool
+
+from database.env import load_env
+
+
+class DatabaseConfig:
+    # read from the environment (and .env) by database_config(), on first use
+    def __init__(self, env=os.environ):
+        self.host = env.get("DB_HOST")
+        self.port = int(env.get("DB_PORT"))
+        self.dbname = env.get("DB_NAME")
+        self.user = env.get("DB_USER")
+        self.password = env.get("DB_PASSWORD")
+
+        # connections above DB_POOL_MIN are closed when returned to the pool,
+        # so long-running concurrent services should raise DB_POOL_MIN
+        self.pool_min = int(env.get("DB_POOL_MIN", "1"))
+        self.pool_max = int(env.get("DB_POOL_MAX", "10"))
+
+        # seconds to wait for a free connection before giving up
+        self.pool_timeout = float(env.get("DB_POOL_TIMEOUT", "30"))
+
+        # connections idle for longer than this are checked with SELECT 1
+        self.pool_healthcheck_after = float(env.get("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+    def params(self) -> dict:
+        return {
+            "host": self.host,
+            "port": self.port,
+            "dbname": self.dbname,
+            "user": self.user,
+            "password": self.password,
+        }
+
+
+def database_config() -> DatabaseConfig:
+    # rebuilt on every call: cheap, and tests / benchmarks may change DB_*
+    load_env()
+    return DatabaseConfig()
+
+
+def connection_params():
+    return database_config().params()
 
-env_path = Path(__file__).resolve().parents[1] / ".env"
-load_dotenv(env_path, override=True)
 
 def get_connection():
+    # standalone connection, not managed by the pool
     try:
-        print("DB_HOST:", os.getenv("DB_HOST"))
-        print("DB_PORT:", os.getenv("DB_PORT"))
-        print("DB_NAME:", os.getenv("DB_NAME"))
-        print("DB_USER:", os.getenv("DB_USER"))
-
-        return psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=int(os.getenv("DB_PORT")),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-        )
+        return psycopg2.connect(**connection_params())
     except psycopg2.Error as e:
         raise RuntimeError(f"Ошибка подключения к БД: {e}")
-    
+
+
+class ConnectionPool:
+    # Thread-safe psycopg2 pool that blocks while all connections are busy
+    # and replaces connections that fail a health check.
+    def __init__(self, minconn=None, maxconn=None, timeout=None):
+        config = database_config()
+        minconn = config.pool_min if minconn is None else minconn
+        maxconn = config.pool_max if maxconn is None else maxconn
+        timeout = config.pool_timeout if timeout is None else timeout
+
+        try:
+            self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **config.params())
+        except psycopg2.Error as e:
+            raise RuntimeError(f"Ошибка подключения к БД: {e}")
+
+        self.maxconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        self._healthcheck_after = config.pool_healthcheck_after
+        # keyed by the connection object: an entry goes away with its
+        # connection, also when the pool closes one above minconn on putconn
+        self._last_used = weakref.WeakKeyDictionary()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+
+        last_used = self._last_used.get(conn)
+
+        if last_used is not None and time.monotonic() - last_used < self._healthcheck_after:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self._timeout):
+            raise RuntimeError(f"No free DB connection after {self._timeout}s")
+
+        try:
+            conn = self._pool.getconn()
+
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self._pool.putconn(conn, close=True)
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                # never hand out a connection with an open transaction
+                conn.rollback()
+                self._last_used[conn] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+
+    return _pool
+
+
+def close_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def connection():
+    # Pooled connection: commits on success, rolls back on error
+    with get_pool().connection() as conn:
+        yield conn
+
+
+class AsyncConnectionPool:
+    # asyncio front-end for a ConnectionPool: checkout and queries run in a
+    # dedicated thread pool, so the event loop is never blocked by psycopg2.
+    # Waiting for a free connection happens on the event loop (semaphore),
+    # never inside a worker thread.
+    def __init__(self, pool=None):
+        self._pool = pool
+        self._slots = None
+        self._executor = None
+
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            self._pool = get_pool()
+
+        return self._pool
+
+    def _start(self):
+        if self._slots is None:
+            size = self.pool.maxconn
+            # asyncio is only imported by services that use this front-end
+            import asyncio
+
+            self._slots = asyncio.Semaphore(size)
+            self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db")
+
+    async def _call(self, fn, *args):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    @asynccontextmanager
+    async def connection(self):
+        self._start()
+
+        async with self._slots:
+            conn = await self._call(self.pool.getconn)
+
+            try:
+                yield conn
+                await self._call(conn.commit)
+            except Exception:
+                await self._call(conn.rollback)
+                raise
+            finally:
+                await self._call(self.pool.putconn, conn)
+
+    async def run(self, fn, *args):
+        # run fn(conn, *args) on a pooled connection in a worker thread
+        async with self.connection() as conn:
+            return await self._call(fn, conn, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._slots = None
+
+
 if __name__ == "__main__":
-    get_connection()
\ No newline at end of file
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            print(cur.fetchone())
@@ -0,0 +1,23 @@
+from pathlib import Path
+import threading
+
+ENV_PATH = Path(__file__).resolve().parents[1] / ".env"
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    # .env is read once, on first use of a setting rather than at import;
+    # python-dotenv is only imported then
+    global _loaded
+
+    if _loaded:
+        return
+
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv(ENV_PATH, override=True)
+            _loaded = True
@@ -1,3 +1,8 @@
+-- Incremental 1h transaction features.
+-- incremental: rows with load_id in (from_load_id, to_load_id]
+-- backfill:    rows with transaction_ts in [from_ts, to_ts)
+-- Only the selected rows plus their 1h look-back are read
+-- (idx_core_transactions_user_ts, idx_core_transactions_user_device_ts).
 INSERT INTO features.transaction_features_1h (
     transaction_id,
     tx_count_last_1h,
@@ -35,15 +40,26 @@ LEFT JOIN core.transactions t2
  AND t2.transaction_ts < t.transaction_ts
  AND t2.transaction_ts >= t.transaction_ts - INTERVAL '1 hour'
 
-WHERE NOT EXISTS (
-    SELECT 1
-    FROM features.transaction_features_1h tf
-    WHERE tf.transaction_id = t.transaction_id
-)
+WHERE CASE
+    WHEN %(backfill)s THEN
+        t.transaction_ts >= %(from_ts)s
+        AND t.transaction_ts < %(to_ts)s
+    ELSE
+        t.load_id > %(from_load_id)s
+        AND t.load_id <= %(to_load_id)s
+END
 
 GROUP BY
     t.transaction_id,
     t.user_id,
     t.device_id,
+    t.transaction_ts,
     u.home_country,
-    t.transaction_country;
+    t.transaction_country
+
+ON CONFLICT (transaction_id) DO UPDATE SET
+    tx_count_last_1h   = EXCLUDED.tx_count_last_1h,
+    avg_amount_last_1h = EXCLUDED.avg_amount_last_1h,
+    is_new_device      = EXCLUDED.is_new_device,
+    is_foreign_tx      = EXCLUDED.is_foreign_tx,
+    calculated_at      = EXCLUDED.calculated_at;
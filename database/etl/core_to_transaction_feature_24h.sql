@@ -1,3 +1,8 @@
+-- Incremental 24h transaction features.
+-- incremental: rows with load_id in (from_load_id, to_load_id]
+-- backfill:    rows with transaction_ts in [from_ts, to_ts)
+-- Only the selected rows plus their 24h look-back are read
+-- (idx_core_transactions_user_ts).
 INSERT INTO features.transaction_features_24h (
     transaction_id,
     tx_count_last_24h,
@@ -20,11 +25,19 @@ LEFT JOIN core.transactions t2
  AND t2.transaction_ts < t.transaction_ts
  AND t2.transaction_ts >= t.transaction_ts - INTERVAL '24 hour'
 
-WHERE NOT EXISTS (
-    SELECT 1
-    FROM features.transaction_features_24h f
-    WHERE f.transaction_id = t.transaction_id
-)
+WHERE CASE
+    WHEN %(backfill)s THEN
+        t.transaction_ts >= %(from_ts)s
+        AND t.transaction_ts < %(to_ts)s
+    ELSE
+        t.load_id > %(from_load_id)s
+        AND t.load_id <= %(to_load_id)s
+END
 
 GROUP BY
-    t.transaction_id;
+    t.transaction_id
+
+ON CONFLICT (transaction_id) DO UPDATE SET
+    tx_count_last_24h   = EXCLUDED.tx_count_last_24h,
+    avg_amount_last_24h = EXCLUDED.avg_amount_last_24h,
+    calculated_at       = EXCLUDED.calculated_at;
@@ -1,26 +1,179 @@
-TRUNCATE TABLE features.user_behavior_features;
+-- Incremental user behavior features from daily rollups.
+--
+-- 1. Rebuild only the user-day buckets touched by rows with
+--    load_id in (from_load_id, to_load_id], plus the buckets promotion
+--    moved transactions out of (features.user_rollup_stale_buckets, claimed
+--    by deleting them). A bucket left without transactions is removed.
+-- 2. Compose every window in %(windows)s from whole-day buckets plus the
+--    exact rows of the partial first day, so values equal a direct
+--    "transaction_ts >= NOW() - window" aggregation.
+-- 3. Replace feature rows in place (upsert + delete of stale rows) inside
+--    this transaction: readers keep seeing the previous values until commit.
 
-INSERT INTO features.user_behavior_features (
+CREATE TEMP TABLE touched_buckets (
+    user_id        TEXT,
+    activity_date  DATE
+) ON COMMIT DROP;
+
+WITH stale AS (
+    DELETE FROM features.user_rollup_stale_buckets
+    RETURNING user_id, activity_date
+)
+INSERT INTO touched_buckets
+SELECT user_id, activity_date
+FROM stale
+UNION
+SELECT
     user_id,
-    tx_count_7d,
-    avg_amount_7d,
-    distinct_countries_7d,
-    calculated_at
+    transaction_ts::date
+FROM core.transactions
+WHERE load_id > %(from_load_id)s
+  AND load_id <= %(to_load_id)s;
+
+DELETE FROM features.user_daily_rollups r
+USING touched_buckets d
+WHERE r.user_id = d.user_id
+  AND r.activity_date = d.activity_date;
+
+INSERT INTO features.user_daily_rollups (
+    user_id,
+    activity_date,
+    tx_count,
+    amount_sum,
+    countries,
+    updated_at
+)
+SELECT
+    d.user_id,
+    d.activity_date,
+    COUNT(*) AS tx_count,
+    SUM(t.amount) AS amount_sum,
+    ARRAY_AGG(DISTINCT t.transaction_country) AS countries,
+    NOW() AS updated_at
+FROM touched_buckets d
+JOIN core.transactions t
+  ON t.user_id = d.user_id
+ AND t.transaction_ts >= d.activity_date
+ AND t.transaction_ts < d.activity_date + 1
+GROUP BY
+    d.user_id,
+    d.activity_date;
+
+
+CREATE TEMP TABLE user_window_values ON COMMIT DROP AS
+WITH windows AS (
+    SELECT
+        w AS window_days,
+        NOW() - make_interval(days => w) AS window_start
+    FROM unnest(%(windows)s::INTEGER[]) AS w
+),
+parts AS (
+    -- whole days after the window start
+    SELECT
+        w.window_days,
+        r.user_id,
+        r.tx_count,
+        r.amount_sum,
+        r.countries
+    FROM windows w
+    JOIN features.user_daily_rollups r
+      ON r.activity_date > w.window_start::date
+
+    UNION ALL
+
+    -- partial first day
+    SELECT
+        w.window_days,
+        t.user_id,
+        1,
+        t.amount,
+        ARRAY[t.transaction_country]
+    FROM windows w
+    JOIN core.transactions t
+      ON t.transaction_ts >= w.window_start
+     AND t.transaction_ts < w.window_start::date + 1
+),
+totals AS (
+    SELECT
+        window_days,
+        user_id,
+        SUM(tx_count) AS tx_count,
+        SUM(amount_sum) / SUM(tx_count) AS avg_amount
+    FROM parts
+    GROUP BY
+        window_days,
+        user_id
+),
+countries AS (
+    SELECT
+        p.window_days,
+        p.user_id,
+        COUNT(DISTINCT c.country) AS distinct_countries
+    FROM parts p
+    CROSS JOIN LATERAL unnest(p.countries) AS c(country)
+    GROUP BY
+        p.window_days,
+        p.user_id
 )
 SELECT
+    t.window_days,
     t.user_id,
+    t.tx_count,
+    t.avg_amount,
+    c.distinct_countries
+FROM totals t
+JOIN countries c
+  ON c.window_days = t.window_days
+ AND c.user_id = t.user_id;
 
-    COUNT(t.transaction_id) AS tx_count_7d,
 
-    AVG(t.amount) AS avg_amount_7d,
+INSERT INTO features.user_window_features (
+    user_id,
+    window_days,
+    tx_count,
+    avg_amount,
+    distinct_countries,
+    calculated_at
+)
+SELECT
+    user_id,
+    window_days,
+    tx_count,
+    avg_amount,
+    distinct_countries,
+    NOW()
+FROM user_window_values
+ON CONFLICT (user_id, window_days) DO UPDATE SET
+    tx_count           = EXCLUDED.tx_count,
+    avg_amount         = EXCLUDED.avg_amount,
+    distinct_countries = EXCLUDED.distinct_countries,
+    calculated_at      = EXCLUDED.calculated_at;
 
-    COUNT(DISTINCT t.transaction_country) AS distinct_countries_7d,
+-- users without transactions in a window anymore
+DELETE FROM features.user_window_features
+WHERE calculated_at < NOW();
 
-    NOW() AS calculated_at
 
-FROM core.transactions t
+INSERT INTO features.user_behavior_features (
+    user_id,
+    tx_count_7d,
+    avg_amount_7d,
+    distinct_countries_7d,
+    calculated_at
+)
+SELECT
+    user_id,
+    tx_count,
+    avg_amount,
+    distinct_countries,
+    NOW()
+FROM user_window_values
+WHERE window_days = 7;
 
-WHERE t.transaction_ts >= NOW() - INTERVAL '7 day'
+DELETE FROM features.user_behavior_features
+WHERE calculated_at < NOW();
 
-GROUP BY
-    t.user_id;
+
+-- buckets older than the longest window are no longer needed
+DELETE FROM features.user_daily_rollups
+WHERE activity_date < NOW()::date - (SELECT MAX(w) FROM unnest(%(windows)s::INTEGER[]) AS w);
@@ -0,0 +1,169 @@
+from datetime import datetime
+from pathlib import Path
+import os
+import sys
+
+from database.connection import connection
+from database.instrumentation import execute
+
+# Watermark-driven feature computation.
+#
+# Every core.transactions row gets a load_id when it is promoted from raw.
+# meta.etl_watermarks stores, per feature table, the highest load_id already
+# processed; a run only computes features for rows loaded since then.
+#
+# python -m database.etl.incremental
+# python -m database.etl.incremental backfill transaction_features_1h 2026-10-01 2026-10-08
+
+ETL_DIR = Path(__file__).resolve().parent
+
+FEATURE_STEPS = {
+    "transaction_features_1h": "core_to_transaction_feature_1h.sql",
+    "transaction_features_24h": "core_to_transaction_feature_24h.sql",
+}
+
+USER_BEHAVIOR_SQL = "core_to_user_behavior_feature.sql"
+
+# windows (days) composed from features.user_daily_rollups,
+# 7d always feeds features.user_behavior_features
+USER_BEHAVIOR_WINDOWS = sorted({7} | {
+    int(w) for w in os.getenv("USER_BEHAVIOR_WINDOWS", "7,30,90").split(",")
+})
+
+
+def read_sql(feature_table) -> str:
+    return (ETL_DIR / FEATURE_STEPS[feature_table]).read_text(encoding="utf-8")
+
+
+def lock_watermark(cur, name) -> int:
+    cur.execute("""
+        INSERT INTO meta.etl_watermarks (watermark_name)
+        VALUES (%s)
+        ON CONFLICT (watermark_name) DO NOTHING
+    """, (name,))
+
+    # row lock: concurrent runs of the same step serialize here
+    cur.execute("""
+        SELECT last_load_id
+        FROM meta.etl_watermarks
+        WHERE watermark_name = %s
+        FOR UPDATE
+    """, (name,))
+
+    return cur.fetchone()[0]
+
+
+def save_watermark(cur, name, last_load_id):
+    cur.execute("""
+        UPDATE meta.etl_watermarks
+        SET last_load_id = %s,
+            updated_at = now()
+        WHERE watermark_name = %s
+    """, (last_load_id, name))
+
+
+def current_load_id(cur) -> int:
+    # highest load_id promotion has committed (database/etl/promotion.py);
+    # not MAX(load_id): a row with a lower load_id may still be uncommitted,
+    # and a watermark moved past it would never read it
+    cur.execute("""
+        SELECT COALESCE(MAX(last_load_id), 0)
+        FROM meta.etl_watermarks
+        WHERE watermark_name = 'core.transactions'
+    """)
+    return cur.fetchone()[0]
+
+
+def features_load_id(cur) -> int:
+    # highest load_id both transaction feature steps have processed: up to
+    # it every core row has 1h and 24h features of its current version (a
+    # row updated by promotion keeps its old features until then)
+    cur.execute("""
+        SELECT CASE WHEN COUNT(*) = %s THEN MIN(last_load_id) ELSE 0 END
+        FROM meta.etl_watermarks
+        WHERE watermark_name = ANY(%s)
+    """, (len(FEATURE_STEPS), list(FEATURE_STEPS)))
+    return cur.fetchone()[0]
+
+
+def run_incremental(cur, feature_table, metrics=None) -> int:
+    from_load_id = lock_watermark(cur, feature_table)
+    to_load_id = current_load_id(cur)
+
+    if to_load_id <= from_load_id:
+        return 0
+
+    # metrics: optional database.instrumentation step (EXPLAIN plan)
+    rows = execute(cur, read_sql(feature_table), {
+        "backfill": False,
+        "from_load_id": from_load_id,
+        "to_load_id": to_load_id,
+        "from_ts": None,
+        "to_ts": None,
+    }, metrics)
+
+    # same transaction as the insert: features and watermark move together
+    save_watermark(cur, feature_table, to_load_id)
+
+    return rows
+
+
+def run_backfill(cur, feature_table, from_ts, to_ts) -> int:
+    # recomputes (upserts) features for a time range, watermark untouched
+    cur.execute(read_sql(feature_table), {
+        "backfill": True,
+        "from_load_id": None,
+        "to_load_id": None,
+        "from_ts": from_ts,
+        "to_ts": to_ts,
+    })
+
+    return cur.rowcount
+
+
+def run_user_behavior(cur, windows=USER_BEHAVIOR_WINDOWS) -> int:
+    # Rollup buckets only change for new rows, but windows slide with NOW(),
+    # so the window composition runs every time.
+    from_load_id = lock_watermark(cur, "user_behavior_features")
+    to_load_id = current_load_id(cur)
+
+    sql = (ETL_DIR / USER_BEHAVIOR_SQL).read_text(encoding="utf-8")
+
+    cur.execute(sql, {
+        "from_load_id": from_load_id,
+        "to_load_id": to_load_id,
+        "windows": list(windows),
+    })
+
+    save_watermark(cur, "user_behavior_features", max(from_load_id, to_load_id))
+
+    cur.execute("SELECT COUNT(*) FROM features.user_behavior_features")
+    return cur.fetchone()[0]
+
+
+def main(argv):
+    if argv and argv[0] == "backfill":
+        feature_table = argv[1]
+        from_ts = datetime.fromisoformat(argv[2])
+        to_ts = datetime.fromisoformat(argv[3])
+
+        with connection() as conn, conn.cursor() as cur:
+            rows = run_backfill(cur, feature_table, from_ts, to_ts)
+
+        print(f"{feature_table}: backfilled {rows} rows [{from_ts}, {to_ts})")
+        return
+
+    for feature_table in FEATURE_STEPS:
+        with connection() as conn, conn.cursor() as cur:
+            rows = run_incremental(cur, feature_table)
+
+        print(f"{feature_table}: {rows} new rows")
+
+    with connection() as conn, conn.cursor() as cur:
+        users = run_user_behavior(cur)
+
+    print(f"user_behavior_features: {users} users")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
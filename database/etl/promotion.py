@@ -0,0 +1,138 @@
+from datetime import timedelta
+from pathlib import Path
+import os
+import sys
+
+from database.connection import connection
+from database.instrumentation import execute
+
+# Watermark-driven raw -> core promotion.
+#
+# meta.etl_watermarks.last_ingestion_ts stores, per core table, the highest
+# raw ingestion_ts already promoted. A run reads only the raw rows landed
+# since then (idx_raw_*_ingestion_ts), keeps the latest version of each key
+# and upserts it, so its cost follows the new batch, not the raw history.
+# Late updates (a newer raw row for a key already in core) are applied.
+#
+# ingestion_ts is stamped when a load starts, so a load still running while
+# promotion runs can commit rows just behind the watermark. In the pipeline
+# loads finish before promotion starts; with concurrent loaders set
+# PROMOTION_LOOKBACK_SECONDS above the longest load and every run re-reads
+# that much before the watermark. Rows that match core are skipped, so
+# re-reading changes nothing, but it costs time.
+#
+# Promotion is the only writer of core.transactions, and runs serialize on
+# the watermark row lock. load_id is a BIGSERIAL, handed out before commit,
+# so MAX(load_id) can be ahead of rows still uncommitted; readers take the
+# load_id published here instead (database.etl.incremental.current_load_id),
+# written under the same lock and in the same transaction as the upsert.
+#
+# python -m database.etl.promotion
+# python -m database.etl.promotion full    # ignore the watermarks
+
+ETL_DIR = Path(__file__).resolve().parent
+
+# core table: (raw table, SQL); users first, transactions reference them
+PROMOTION_STEPS = {
+    "core.users": ("raw.users", "raw_to_core_users.sql"),
+    "core.transactions": ("raw.transactions", "raw_to_core_transactions.sql"),
+}
+
+# after the core.transactions upsert: revisions and neighbours (see the file)
+RESTAMP_NEIGHBOURS_SQL = "restamp_transaction_neighbours.sql"
+
+PROMOTION_LOOKBACK_SECONDS = float(os.getenv("PROMOTION_LOOKBACK_SECONDS", "0"))
+
+
+def read_sql(core_table) -> str:
+    return (ETL_DIR / PROMOTION_STEPS[core_table][1]).read_text(encoding="utf-8")
+
+
+def lock_ingestion_watermark(cur, name):
+    cur.execute("""
+        INSERT INTO meta.etl_watermarks (watermark_name)
+        VALUES (%s)
+        ON CONFLICT (watermark_name) DO NOTHING
+    """, (name,))
+
+    # row lock: concurrent promotions of the same table serialize here
+    cur.execute("""
+        SELECT last_ingestion_ts
+        FROM meta.etl_watermarks
+        WHERE watermark_name = %s
+        FOR UPDATE
+    """, (name,))
+
+    return cur.fetchone()[0]
+
+
+def save_ingestion_watermark(cur, name, last_ingestion_ts):
+    cur.execute("""
+        UPDATE meta.etl_watermarks
+        SET last_ingestion_ts = %s,
+            updated_at = now()
+        WHERE watermark_name = %s
+    """, (last_ingestion_ts, name))
+
+
+def publish_load_id(cur):
+    # every load_id up to this one is committed together with it
+    cur.execute("""
+        UPDATE meta.etl_watermarks
+        SET last_load_id = GREATEST(
+            last_load_id,
+            (SELECT COALESCE(MAX(load_id), 0) FROM core.transactions)
+        )
+        WHERE watermark_name = 'core.transactions'
+    """)
+
+
+def run_promotion(cur, core_table, metrics=None, full=False) -> int:
+    raw_table, _ = PROMOTION_STEPS[core_table]
+    watermark = lock_ingestion_watermark(cur, core_table)
+
+    # served by idx_raw_*_ingestion_ts
+    cur.execute(f"SELECT MAX(ingestion_ts) FROM {raw_table}")
+    to_ts = cur.fetchone()[0]
+
+    if to_ts is None:
+        if core_table == "core.transactions":
+            publish_load_id(cur)
+
+        return 0
+
+    from_ts = None
+
+    if watermark is not None and not full:
+        from_ts = watermark - timedelta(seconds=PROMOTION_LOOKBACK_SECONDS)
+
+    # metrics: optional database.instrumentation step (EXPLAIN plan)
+    rows = execute(cur, read_sql(core_table), {
+        "from_ts": from_ts,
+        "to_ts": to_ts,
+    }, metrics)
+
+    if core_table == "core.transactions":
+        cur.execute((ETL_DIR / RESTAMP_NEIGHBOURS_SQL).read_text(encoding="utf-8"))
+
+    # same transaction as the upsert: core rows and watermark move together
+    save_ingestion_watermark(cur, core_table, max(to_ts, watermark or to_ts))
+
+    if core_table == "core.transactions":
+        publish_load_id(cur)
+
+    return rows
+
+
+def main(argv):
+    full = bool(argv) and argv[0] == "full"
+
+    for core_table in PROMOTION_STEPS:
+        with connection() as conn, conn.cursor() as cur:
+            rows = run_promotion(cur, core_table, full=full)
+
+        print(f"{core_table}: {rows} rows inserted or updated")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,4 +1,128 @@
--- transactions insertion
+-- Incremental transactions promotion (database/etl/promotion.py).
+-- Only raw rows with ingestion_ts in (from_ts, to_ts] are read
+-- (idx_raw_transactions_ingestion_ts). The latest version of each
+-- transaction wins:
+-- - merchants and devices it references are created when missing
+-- - new transactions are inserted, changed ones updated with a new load_id
+--   so the incremental feature steps recompute them, unchanged ones skipped
+-- - a correction that moves transaction_ts (part of the key) replaces the
+--   old row; core.transaction_keys moves with it, its foreign key keeps
+--   one row per transaction_id
+-- - the user-day bucket a transaction leaves (changed transaction_ts date or
+--   user_id) is queued in features.user_rollup_stale_buckets: the rollup
+--   step only sees the new load_id, i.e. the bucket the transaction enters
+-- - changed and moved transactions are recorded in core.transaction_revisions
+--   with their previous version; restamp_transaction_neighbours.sql then
+--   fills in the new load_id and re-stamps the neighbours
+WITH batch AS (
+    SELECT DISTINCT ON (transaction_id) *
+    FROM raw.transactions
+    WHERE ingestion_ts > COALESCE(%(from_ts)s::timestamp, '-infinity')
+      AND ingestion_ts <= %(to_ts)s
+      AND transaction_id IS NOT NULL
+    ORDER BY transaction_id, ingestion_ts DESC
+),
+
+new_merchants AS (
+    INSERT INTO core.merchants (merchant_id, merchant_category)
+    SELECT DISTINCT ON (merchant_id)
+        merchant_id,
+        merchant_category
+    FROM batch
+    WHERE merchant_id IS NOT NULL
+    ORDER BY merchant_id, ingestion_ts DESC
+    ON CONFLICT (merchant_id) DO NOTHING
+),
+
+-- device_type is not in raw.transactions
+new_devices AS (
+    INSERT INTO core.devices (device_id, first_seen_ts)
+    SELECT
+        device_id,
+        MIN(transaction_ts)
+    FROM batch
+    WHERE device_id IS NOT NULL
+    GROUP BY device_id
+    ON CONFLICT (device_id) DO NOTHING
+),
+
+-- core rows before this statement (all CTEs see the same snapshot)
+previous AS (
+    SELECT
+        ct.user_id,
+        ct.transaction_ts,
+        b.user_id AS new_user_id,
+        b.transaction_ts AS new_transaction_ts
+    FROM core.transactions ct
+    JOIN batch b
+      ON b.transaction_id = ct.transaction_id
+),
+
+stale_buckets AS (
+    INSERT INTO features.user_rollup_stale_buckets (user_id, activity_date)
+    SELECT DISTINCT
+        user_id,
+        transaction_ts::date
+    FROM previous
+    WHERE (user_id, transaction_ts::date)
+          IS DISTINCT FROM (new_user_id, new_transaction_ts::date)
+    ON CONFLICT (user_id, activity_date) DO NOTHING
+),
+
+transaction_keys AS (
+    INSERT INTO core.transaction_keys (transaction_id, transaction_ts)
+    SELECT
+        transaction_id,
+        transaction_ts
+    FROM batch
+    ON CONFLICT (transaction_id) DO UPDATE SET
+        transaction_ts = EXCLUDED.transaction_ts
+    WHERE core.transaction_keys.transaction_ts <> EXCLUDED.transaction_ts
+),
+
+revisions AS (
+    INSERT INTO core.transaction_revisions (
+        transaction_id,
+        previous_load_id,
+        previous_user_id,
+        previous_device_id,
+        previous_transaction_ts
+    )
+    SELECT
+        ct.transaction_id,
+        ct.load_id,
+        ct.user_id,
+        ct.device_id,
+        ct.transaction_ts
+    FROM core.transactions ct
+    JOIN batch b
+      ON b.transaction_id = ct.transaction_id
+    WHERE (
+        ct.user_id,
+        ct.device_id,
+        ct.merchant_id,
+        ct.amount,
+        ct.currency,
+        ct.transaction_country,
+        ct.transaction_ts
+    ) IS DISTINCT FROM (
+        b.user_id,
+        b.device_id,
+        b.merchant_id,
+        b.amount,
+        b.currency,
+        b.transaction_country,
+        b.transaction_ts
+    )
+),
+
+moved AS (
+    DELETE FROM core.transactions ct
+    USING batch b
+    WHERE ct.transaction_id = b.transaction_id
+      AND ct.transaction_ts <> b.transaction_ts
+)
+
 INSERT INTO core.transactions (
     transaction_id,
     user_id,
@@ -20,18 +144,28 @@ SELECT
     transaction_country,
     transaction_ts,
     false AS is_fraud
-FROM (
-    SELECT
-        *,
-        ROW_NUMBER() OVER (
-            PARTITION BY transaction_id
-            ORDER BY ingestion_ts DESC
-        ) AS rn
-    FROM raw.transactions
-) t
-WHERE rn = 1
-AND NOT EXISTS (
-	SELECT 1
-	FROM core.transactions ct
-	WHERE ct.transaction_id = t.transaction_id
+FROM batch
+
+ON CONFLICT (transaction_id, transaction_ts) DO UPDATE SET
+    user_id             = EXCLUDED.user_id,
+    device_id           = EXCLUDED.device_id,
+    merchant_id         = EXCLUDED.merchant_id,
+    amount              = EXCLUDED.amount,
+    currency            = EXCLUDED.currency,
+    transaction_country = EXCLUDED.transaction_country,
+    load_id             = DEFAULT
+WHERE (
+    core.transactions.user_id,
+    core.transactions.device_id,
+    core.transactions.merchant_id,
+    core.transactions.amount,
+    core.transactions.currency,
+    core.transactions.transaction_country
+) IS DISTINCT FROM (
+    EXCLUDED.user_id,
+    EXCLUDED.device_id,
+    EXCLUDED.merchant_id,
+    EXCLUDED.amount,
+    EXCLUDED.currency,
+    EXCLUDED.transaction_country
 );
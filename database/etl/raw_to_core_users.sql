@@ -1,29 +1,29 @@
--- users insertion
-INSERT INTO core.users(
-	user_id,
-	registration_date,
-	home_country,
-	risk_segment,
-	created_at
+-- Incremental users promotion (database/etl/promotion.py).
+-- Only raw rows with ingestion_ts in (from_ts, to_ts] are read
+-- (idx_raw_users_ingestion_ts). The latest version of each user wins:
+-- new users are inserted, changed ones updated, unchanged ones skipped.
+INSERT INTO core.users (
+    user_id,
+    registration_date,
+    home_country,
+    risk_segment,
+    created_at
 )
-SELECT 
-	user_id,
-	registration_date::date,
-	home_country,
-	risk_segment,
-	ingestion_ts AS created_at
-FROM (
-	SELECT 
-		  *,
-		  ROW_NUMBER() OVER(
-		      PARTITION BY user_id
-			  ORDER BY ingestion_ts DESC
-	  ) AS rn
-	FROM raw.users
-) u
-WHERE rn = 1
-AND NOT EXISTS (
-    SELECT 1
-    FROM core.users cu
-    WHERE cu.user_id = u.user_id
-);
\ No newline at end of file
+SELECT DISTINCT ON (user_id)
+    user_id,
+    registration_date::date,
+    home_country,
+    risk_segment,
+    ingestion_ts AS created_at
+FROM raw.users
+WHERE ingestion_ts > COALESCE(%(from_ts)s::timestamp, '-infinity')
+  AND ingestion_ts <= %(to_ts)s
+  AND user_id IS NOT NULL
+ORDER BY user_id, ingestion_ts DESC
+
+ON CONFLICT (user_id) DO UPDATE SET
+    registration_date = EXCLUDED.registration_date,
+    home_country      = EXCLUDED.home_country,
+    risk_segment      = EXCLUDED.risk_segment
+WHERE (core.users.registration_date, core.users.home_country, core.users.risk_segment)
+    IS DISTINCT FROM (EXCLUDED.registration_date, EXCLUDED.home_country, EXCLUDED.risk_segment);
@@ -0,0 +1,102 @@
+-- Runs after raw_to_core_transactions.sql, in the same transaction
+-- (database/etl/promotion.py).
+-- - the revisions that statement recorded get the new load_id and user_id
+-- - transactions whose features depended on the previous or the new
+--   position of a revised transaction get a new load_id, so the
+--   incremental feature steps recompute them:
+--   - same user, transaction_ts within 24h after the position (the 1h and
+--     24h windows [ts - span, ts) that contain it)
+--   - same user and device, the next transaction_ts after the position
+--     (is_new_device)
+-- - those re-stamped neighbours are recorded as revisions as well
+-- (idx_core_transactions_user_ts, idx_core_transactions_user_device_ts)
+WITH revised AS (
+    UPDATE core.transaction_revisions r
+    SET load_id = t.load_id,
+        user_id = t.user_id
+    FROM core.transactions t
+    WHERE r.load_id IS NULL
+      AND t.transaction_id = r.transaction_id
+    RETURNING
+        r.transaction_id,
+        r.previous_user_id,
+        r.previous_device_id,
+        r.previous_transaction_ts,
+        t.user_id,
+        t.device_id,
+        t.transaction_ts
+),
+
+positions AS (
+    SELECT previous_user_id AS user_id, previous_device_id AS device_id,
+           previous_transaction_ts AS transaction_ts
+    FROM revised
+    UNION
+    SELECT user_id, device_id, transaction_ts
+    FROM revised
+),
+
+neighbours AS (
+    SELECT
+        ct.transaction_id,
+        ct.transaction_ts,
+        ct.load_id
+    FROM positions p
+    JOIN core.transactions ct
+      ON ct.user_id = p.user_id
+     AND ct.transaction_ts > p.transaction_ts
+     AND ct.transaction_ts <= p.transaction_ts + INTERVAL '24 hour'
+
+    UNION
+
+    SELECT
+        ct.transaction_id,
+        ct.transaction_ts,
+        ct.load_id
+    FROM positions p
+    JOIN core.transactions ct
+      ON ct.user_id = p.user_id
+     AND ct.device_id = p.device_id
+     AND ct.transaction_ts = (
+         SELECT MIN(t.transaction_ts)
+         FROM core.transactions t
+         WHERE t.user_id = p.user_id
+           AND t.device_id = p.device_id
+           AND t.transaction_ts > p.transaction_ts
+     )
+),
+
+restamped AS (
+    UPDATE core.transactions ct
+    SET load_id = DEFAULT
+    FROM neighbours n
+    WHERE ct.transaction_id = n.transaction_id
+      AND ct.transaction_ts = n.transaction_ts
+      AND ct.transaction_id NOT IN (SELECT transaction_id FROM revised)
+    RETURNING
+        ct.load_id,
+        ct.transaction_id,
+        ct.user_id,
+        ct.device_id,
+        ct.transaction_ts,
+        n.load_id AS previous_load_id
+)
+
+INSERT INTO core.transaction_revisions (
+    load_id,
+    transaction_id,
+    user_id,
+    previous_load_id,
+    previous_user_id,
+    previous_device_id,
+    previous_transaction_ts
+)
+SELECT
+    load_id,
+    transaction_id,
+    user_id,
+    previous_load_id,
+    user_id,
+    device_id,
+    transaction_ts
+FROM restamped;
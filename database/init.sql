@@ -13,6 +13,7 @@ CREATE TABLE IF NOT EXISTS raw.users (
     ingestion_ts      TIMESTAMP DEFAULT now()
 );
 
+-- daily partitions by transaction_ts, managed by database/partitions.py
 CREATE TABLE raw.transactions (
     transaction_id      TEXT,
     user_id             TEXT,
@@ -24,7 +25,18 @@ CREATE TABLE raw.transactions (
     device_id           TEXT,
     transaction_ts      TIMESTAMP,
     ingestion_ts        TIMESTAMP DEFAULT now()
-);
+) PARTITION BY RANGE (transaction_ts);
+
+CREATE TABLE raw.transactions_default
+    PARTITION OF raw.transactions DEFAULT;
+
+-- raw -> core promotion reads only rows landed since its watermark
+-- (database/etl/promotion.py)
+CREATE INDEX idx_raw_users_ingestion_ts
+    ON raw.users (ingestion_ts);
+
+CREATE INDEX idx_raw_transactions_ingestion_ts
+    ON raw.transactions (ingestion_ts);
 
 
 -- core 
@@ -47,8 +59,19 @@ CREATE TABLE core.merchants (
     merchant_category TEXT
 );
 
-CREATE TABLE core.transactions (
+-- one row per transaction_id. The primary key of core.transactions has to
+-- include the partition key, so on its own it would allow the same
+-- transaction_id in two partitions; its foreign key to this table does not.
+-- Promotion moves transaction_ts here in the statement that moves the row.
+CREATE TABLE core.transaction_keys (
     transaction_id      TEXT PRIMARY KEY,
+    transaction_ts      TIMESTAMP NOT NULL,
+    UNIQUE (transaction_id, transaction_ts)
+);
+
+-- monthly partitions by transaction_ts, managed by database/partitions.py
+CREATE TABLE core.transactions (
+    transaction_id      TEXT,
     user_id             TEXT REFERENCES core.users(user_id),
     device_id           TEXT REFERENCES core.devices(device_id),
     merchant_id         TEXT REFERENCES core.merchants(merchant_id),
@@ -56,9 +79,47 @@ CREATE TABLE core.transactions (
     currency            TEXT,
     transaction_country TEXT,
     transaction_ts      TIMESTAMP,
-    is_fraud            BOOLEAN
+    is_fraud            BOOLEAN,
+    load_id             BIGSERIAL,    -- load order, drives incremental features
+    PRIMARY KEY (transaction_id, transaction_ts),
+    -- checked at commit: a moved row and its key change in one statement
+    FOREIGN KEY (transaction_id, transaction_ts)
+        REFERENCES core.transaction_keys (transaction_id, transaction_ts)
+        DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE (transaction_ts);
+
+CREATE TABLE core.transactions_default
+    PARTITION OF core.transactions DEFAULT;
+
+CREATE INDEX idx_core_transactions_user_ts
+    ON core.transactions (user_id, transaction_ts);
+
+CREATE INDEX idx_core_transactions_user_device_ts
+    ON core.transactions (user_id, device_id, transaction_ts);
+
+CREATE INDEX idx_core_transactions_load_id
+    ON core.transactions (load_id);
+
+CREATE INDEX idx_core_transactions_ts
+    ON core.transactions (transaction_ts);
+
+-- existing transactions promotion gave a new load_id: changed or moved
+-- ones, and their neighbours whose 1h / 24h features depended on them.
+-- Consumers that append by load_id (the online feature store) use it to
+-- replace the previous version instead of counting it twice.
+CREATE TABLE core.transaction_revisions (
+    load_id                  BIGINT,      -- new version, NULL until promotion ends
+    transaction_id           TEXT,
+    user_id                  TEXT,
+    previous_load_id         BIGINT,
+    previous_user_id         TEXT,
+    previous_device_id       TEXT,
+    previous_transaction_ts  TIMESTAMP
 );
 
+CREATE INDEX idx_core_transaction_revisions_load_id
+    ON core.transaction_revisions (load_id);
+
 
 -- features
 CREATE TABLE features.transaction_features_1h (
@@ -86,17 +147,88 @@ CREATE TABLE features.user_behavior_features (
     PRIMARY KEY (user_id, calculated_at)
 );
 
+-- per user-day buckets, window features are composed from these
+CREATE TABLE features.user_daily_rollups (
+    user_id              TEXT,
+    activity_date        DATE,
+    tx_count             INTEGER,
+    amount_sum           NUMERIC(18,2),
+    countries            TEXT[],      -- distinct transaction countries
+    updated_at           TIMESTAMP,
+    PRIMARY KEY (user_id, activity_date)
+);
+
+-- user-day buckets that promotion moved transactions out of (changed
+-- transaction_ts or user_id); the rollup step rebuilds and clears them
+CREATE TABLE features.user_rollup_stale_buckets (
+    user_id              TEXT,
+    activity_date        DATE,
+    PRIMARY KEY (user_id, activity_date)
+);
+
+CREATE TABLE features.user_window_features (
+    user_id              TEXT,
+    window_days          INTEGER,     -- 7 / 30 / 90
+    tx_count             INTEGER,
+    avg_amount           NUMERIC(12,2),
+    distinct_countries   INTEGER,
+    calculated_at        TIMESTAMP,
+    PRIMARY KEY (user_id, window_days)
+);
+
 
 -- mart 
+-- one row per transaction and scorer: the rule set version (score_source
+-- 'rules') from data generation, model versions from ml/batch_score.py
 CREATE TABLE mart.fraud_predictions (
-    transaction_id     TEXT PRIMARY KEY,
+    transaction_id     TEXT,
     fraud_probability  NUMERIC(5,4),
     model_version      TEXT,
     prediction_ts      TIMESTAMP,
     is_fraud           BOOLEAN,
-    score_source       TEXT
+    score_source       TEXT,
+    reasons            BIGINT,      -- rule reason mask (meta.fraud_reasons), NULL for models
+    load_id            BIGINT,      -- core.transactions load_id scored by a model, NULL for rules
+    PRIMARY KEY (transaction_id, model_version)
 );
 
+-- model input per transaction: point-in-time transaction features.
+-- load_id is the watermark for the training-data cache (ml/data.py) and
+-- the batch scoring checkpoint (ml/batch_score.py).
+CREATE VIEW features.model_features AS
+SELECT
+    t.transaction_id,
+    t.transaction_ts,
+    t.load_id,
+    t.amount,
+    f1.tx_count_last_1h,
+    f1.avg_amount_last_1h,
+    f1.is_new_device,
+    f1.is_foreign_tx,
+    f24.tx_count_last_24h,
+    f24.avg_amount_last_24h,
+    (t.transaction_ts::date - u.registration_date) AS user_age_days
+FROM core.transactions t
+JOIN core.users u
+  ON u.user_id = t.user_id
+JOIN features.transaction_features_1h f1
+  ON f1.transaction_id = t.transaction_id
+JOIN features.transaction_features_24h f24
+  ON f24.transaction_id = t.transaction_id;
+
+-- ML training rows: model features with the rule labels as target, one row
+-- per rule set version that labeled the transaction; ml/data.py reads one
+-- label_version
+CREATE VIEW features.training_dataset AS
+SELECT
+    m.*,
+    p.model_version AS label_version,
+    p.is_fraud
+FROM features.model_features m
+JOIN mart.fraud_predictions p
+  ON p.transaction_id = m.transaction_id
+ AND p.score_source = 'rules';
+
 CREATE TABLE mart.model_metrics_daily (
     metric_date   DATE,
     model_version TEXT,
@@ -118,6 +250,47 @@ CREATE TABLE meta.feature_registry (
     created_at       TIMESTAMP DEFAULT now()
 );
 
+CREATE TABLE meta.etl_watermarks (
+    watermark_name   TEXT PRIMARY KEY,   -- target table of the incremental step
+    last_load_id     BIGINT NOT NULL DEFAULT 0,
+    last_ingestion_ts TIMESTAMP,         -- raw -> core promotion steps
+    updated_at       TIMESTAMP DEFAULT now()
+);
+
+CREATE TABLE meta.pipeline_runs (
+    run_id          BIGSERIAL PRIMARY KEY,
+    pipeline_name   TEXT NOT NULL,
+    started_at      TIMESTAMP NOT NULL,
+    finished_at     TIMESTAMP,
+    wall_seconds    DOUBLE PRECISION,
+    status          TEXT NOT NULL,       -- running / success / failed
+    error           TEXT
+);
+
+CREATE TABLE meta.pipeline_step_metrics (
+    run_id          BIGINT REFERENCES meta.pipeline_runs (run_id) ON DELETE CASCADE,
+    step_name       TEXT,                -- "<parent>.<step>" for sub-steps
+    parent_step     TEXT,
+    started_at      TIMESTAMP NOT NULL,
+    wall_seconds    DOUBLE PRECISION,
+    cpu_seconds     DOUBLE PRECISION,    -- client side only
+    rows_affected   BIGINT,
+    status          TEXT NOT NULL,
+    error           TEXT,
+    plan            JSONB,               -- EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+    PRIMARY KEY (run_id, step_name)
+);
+
+CREATE INDEX idx_pipeline_step_metrics_step
+    ON meta.pipeline_step_metrics (step_name, started_at);
+
+-- input fingerprint of each step's last successful run (database/scheduler.py)
+CREATE TABLE meta.pipeline_step_state (
+    step_name          TEXT PRIMARY KEY,
+    input_fingerprint  TEXT NOT NULL,
+    updated_at         TIMESTAMP DEFAULT now()
+);
+
 CREATE TABLE meta.model_registry (
     model_name     TEXT,
     model_version  TEXT,
@@ -127,4 +300,96 @@ CREATE TABLE meta.model_registry (
     PRIMARY KEY (model_name, model_version)
 );
 
+-- fraud reason codes: bit of each rule reason in mart.fraud_predictions.reasons.
+-- The bits come from the rule files ("reason_bit"); a rule set registers its
+-- codes here before writing labels (data_generator/reasons.py) and a code
+-- that conflicts with a registered one is refused, so a bit is never reused
+-- or renumbered.
+CREATE TABLE meta.fraud_reasons (
+    reason_bit  SMALLINT PRIMARY KEY CHECK (reason_bit BETWEEN 0 AND 62),
+    reason      TEXT NOT NULL UNIQUE
+);
+
+-- mart.reason_mask(VARIADIC reasons TEXT[]): mask of the given reasons; an
+-- unknown reason is an error. Generated with the registered codes as
+-- constants and regenerated when a code is registered, so it reads no table
+-- and is IMMUTABLE: with constant arguments the mask is computed once when
+-- the query is planned.
+--   WHERE reasons & mart.reason_mask('new_device', 'high_risk_country') <> 0  -- any
+--   WHERE reasons & mart.reason_mask('new_device', 'high_risk_country')
+--       = mart.reason_mask('new_device', 'high_risk_country')                 -- all
+CREATE FUNCTION meta.compile_reason_mask()
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($f$
+        CREATE OR REPLACE FUNCTION mart.reason_mask(VARIADIC reasons TEXT[])
+        RETURNS BIGINT
+        LANGUAGE plpgsql IMMUTABLE STRICT AS $body$
+        DECLARE
+            codes CONSTANT JSONB := %L;
+            mask BIGINT := 0;
+            reason TEXT;
+        BEGIN
+            FOREACH reason IN ARRAY reasons LOOP
+                IF reason IS NULL OR NOT codes ? reason THEN
+                    RAISE EXCEPTION 'unknown fraud reason: %%', reason;
+                END IF;
+
+                mask := mask | (1::BIGINT << (codes ->> reason)::INTEGER);
+            END LOOP;
+
+            RETURN mask;
+        END
+        $body$
+    $f$, (
+        SELECT COALESCE(jsonb_object_agg(reason, reason_bit), '{}')
+        FROM meta.fraud_reasons
+    ));
+END
+$$;
+
+CREATE FUNCTION meta.fraud_reasons_changed()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM meta.compile_reason_mask();
+    RETURN NULL;
+END
+$$;
+
+-- per row: registering codes that are already there changes nothing
+CREATE TRIGGER fraud_reasons_compile
+AFTER INSERT OR UPDATE OR DELETE ON meta.fraud_reasons
+FOR EACH ROW EXECUTE FUNCTION meta.fraud_reasons_changed();
+
+SELECT meta.compile_reason_mask();
+
+-- not STRICT, so it is inlined: WHERE mart.has_reason(reasons, 'new_device')
+-- runs as WHERE reasons & 8 <> 0
+CREATE FUNCTION mart.has_reason(mask BIGINT, reason TEXT)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT mask & mart.reason_mask(reason) <> 0
+$$;
+
+-- reasons of a mask in bit order, as RuleSet.decode_reasons (data_generator/rules.py)
+CREATE FUNCTION mart.reason_names(mask BIGINT)
+RETURNS TEXT[]
+LANGUAGE sql STABLE STRICT AS $$
+    SELECT COALESCE(array_agg(reason ORDER BY reason_bit), '{}')
+    FROM meta.fraud_reasons
+    WHERE mask & (1::BIGINT << reason_bit) <> 0
+$$;
 
+-- one row per prediction and reason, for reason analytics:
+--   SELECT reason, count(*) FROM mart.fraud_prediction_reasons GROUP BY reason
+CREATE VIEW mart.fraud_prediction_reasons AS
+SELECT
+    p.transaction_id,
+    p.model_version,
+    p.is_fraud,
+    r.reason
+FROM mart.fraud_predictions p
+JOIN meta.fraud_reasons r
+  ON p.reasons & (1::BIGINT << r.reason_bit) <> 0;
@@ -0,0 +1,242 @@
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import json
+import os
+import resource
+import threading
+import time
+
+from psycopg2.extras import Json
+
+from database.connection import connection
+
+# Per-step metrics for pipeline runs.
+#
+#   run_id = start_run()
+#   with step("features_1h") as metrics:
+#       metrics.rows = execute(cur, sql, params, metrics)
+#   finish_run("success")
+#
+# Each step records wall time, CPU time (its thread and finished child
+# processes; SQL work done by the server is only in the wall time), rows
+# affected and, with PIPELINE_EXPLAIN=1, the EXPLAIN (ANALYZE, BUFFERS) plan
+# of single-statement SQL steps. Metrics go to meta.pipeline_runs /
+# meta.pipeline_step_metrics and, one JSON object per line, to PIPELINE_LOG.
+#
+# Steps nest: a step opened inside another is stored as "<parent>.<name>".
+# Child processes join the run through PIPELINE_RUN_ID / PIPELINE_PARENT_STEP
+# (see child_env()). Without an active run steps are only timed and logged.
+
+PIPELINE_LOG = os.getenv("PIPELINE_LOG", "logs/pipeline.jsonl")
+PIPELINE_EXPLAIN = os.getenv("PIPELINE_EXPLAIN", "0").lower() in ("1", "true", "yes")
+
+_run_id = None
+_run_started = None
+# open steps of the current thread, outermost first
+_local = threading.local()
+
+
+class StepMetrics:
+    def __init__(self, run_id, name, parent):
+        self.run_id = run_id
+        self.name = name
+        self.parent = parent
+        self.rows = None
+        self.plan = None
+        # None = success unless the step raises; e.g. "skipped"
+        self.status = None
+        self.explain = PIPELINE_EXPLAIN
+
+
+def _cpu_seconds() -> float:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.thread_time() + children.ru_utime + children.ru_stime
+
+
+def _log(event):
+    if not PIPELINE_LOG:
+        return
+
+    path = Path(PIPELINE_LOG)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, default=str) + "\n")
+
+
+def _store(query, params):
+    # metrics never fail the pipeline
+    try:
+        with connection() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchone() if cur.description else None
+    except Exception as e:
+        print(f"Pipeline metrics not stored: {e}")
+        return None
+
+
+def active_run_id():
+    global _run_id
+
+    if _run_id is None and os.getenv("PIPELINE_RUN_ID"):
+        _run_id = int(os.environ["PIPELINE_RUN_ID"])
+
+    return _run_id
+
+
+def child_env() -> dict:
+    # environment for a child process whose steps belong to the current step
+    env = dict(os.environ)
+
+    if active_run_id() is not None:
+        env["PIPELINE_RUN_ID"] = str(active_run_id())
+
+    parent = _current_step()
+
+    if parent is not None:
+        env["PIPELINE_PARENT_STEP"] = parent
+
+    return env
+
+
+def _open_steps() -> list:
+    if not hasattr(_local, "steps"):
+        _local.steps = []
+
+    return _local.steps
+
+
+def _current_step():
+    steps = _open_steps()
+
+    if steps:
+        return steps[-1]
+
+    return os.getenv("PIPELINE_PARENT_STEP") or None
+
+
+def start_run(pipeline_name="pipeline"):
+    global _run_id, _run_started
+
+    _run_started = time.perf_counter()
+    row = _store("""
+        INSERT INTO meta.pipeline_runs (pipeline_name, started_at, status)
+        VALUES (%s, %s, 'running')
+        RETURNING run_id
+    """, (pipeline_name, datetime.utcnow()))
+
+    _run_id = row[0] if row else None
+    _log({"event": "run_started", "run_id": _run_id, "pipeline": pipeline_name,
+          "ts": datetime.utcnow()})
+
+    return _run_id
+
+
+def finish_run(status, error=None):
+    wall = time.perf_counter() - _run_started if _run_started is not None else None
+
+    if _run_id is not None:
+        _store("""
+            UPDATE meta.pipeline_runs
+            SET finished_at = %s,
+                wall_seconds = %s,
+                status = %s,
+                error = %s
+            WHERE run_id = %s
+        """, (datetime.utcnow(), wall, status, error, _run_id))
+
+    _log({"event": "run_finished", "run_id": _run_id, "status": status,
+          "wall_seconds": wall, "error": error, "ts": datetime.utcnow()})
+
+
+@contextmanager
+def step(name):
+    parent = _current_step()
+    full_name = f"{parent}.{name}" if parent else name
+    metrics = StepMetrics(active_run_id(), full_name, parent)
+
+    started_at = datetime.utcnow()
+    wall_started = time.perf_counter()
+    cpu_started = _cpu_seconds()
+    status, error = None, None
+
+    _open_steps().append(full_name)
+
+    try:
+        yield metrics
+    except BaseException as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _open_steps().pop()
+        status = status or metrics.status or "success"
+        wall = time.perf_counter() - wall_started
+        cpu = _cpu_seconds() - cpu_started
+
+        record(metrics, started_at, wall, cpu, status, error)
+
+
+def record(metrics, started_at, wall, cpu, status, error):
+    print(f"[{metrics.name}] {wall:.2f}s wall, {cpu:.2f}s cpu"
+          + (f", {metrics.rows} rows" if metrics.rows is not None else "")
+          + (f", {status}" if status != "success" else ""))
+
+    _log({
+        "event": "step",
+        "run_id": metrics.run_id,
+        "step": metrics.name,
+        "parent": metrics.parent,
+        "started_at": started_at,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "rows": metrics.rows,
+        "status": status,
+        "error": error,
+        "plan": metrics.plan,
+    })
+
+    if metrics.run_id is None:
+        return
+
+    _store("""
+        INSERT INTO meta.pipeline_step_metrics (
+            run_id, step_name, parent_step, started_at,
+            wall_seconds, cpu_seconds, rows_affected, status, error, plan
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (run_id, step_name) DO UPDATE
+        SET parent_step = EXCLUDED.parent_step,
+            started_at = EXCLUDED.started_at,
+            wall_seconds = EXCLUDED.wall_seconds,
+            cpu_seconds = EXCLUDED.cpu_seconds,
+            rows_affected = EXCLUDED.rows_affected,
+            status = EXCLUDED.status,
+            error = EXCLUDED.error,
+            plan = EXCLUDED.plan
+    """, (
+        metrics.run_id, metrics.name, metrics.parent, started_at,
+        wall, cpu, metrics.rows, status, error,
+        Json(metrics.plan) if metrics.plan is not None else None
+    ))
+
+
+def is_single_statement(sql) -> bool:
+    code = "\n".join(
+        line for line in sql.splitlines() if not line.strip().startswith("--")
+    )
+    return code.strip().rstrip(";").count(";") == 0
+
+
+def execute(cur, sql, params=None, metrics=None) -> int:
+    # runs sql, returns cur.rowcount. With metrics.explain, a single
+    # statement is first run under EXPLAIN (ANALYZE, BUFFERS) in a savepoint
+    # that is rolled back, so the plan does not change the data.
+    if metrics is not None and metrics.explain and is_single_statement(sql):
+        cur.execute("SAVEPOINT pipeline_explain")
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql.strip().rstrip(";"), params)
+        metrics.plan = cur.fetchone()[0]
+        cur.execute("ROLLBACK TO SAVEPOINT pipeline_explain")
+
+    cur.execute(sql, params)
+    return cur.rowcount
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta
+import os
+import re
+
+from database.connection import connection
+
+# Partition lifecycle for tables range-partitioned on transaction_ts.
+#
+# - future partitions are created PARTITION_AHEAD_DAYS ahead
+# - partitions are created back to PARTITION_LOOKBACK_DAYS, so backdated
+#   generated data lands in a real partition instead of the default one
+# - raw partitions older than RAW_RETENTION_DAYS are dropped (no DELETE)
+# - core partitions older than CORE_DETACH_AFTER_DAYS, if set, are detached
+#   and kept as standalone tables for archiving
+#
+# python -m database.partitions
+
+PARTITION_AHEAD_DAYS = int(os.getenv("PARTITION_AHEAD_DAYS", "7"))
+PARTITION_LOOKBACK_DAYS = int(os.getenv("PARTITION_LOOKBACK_DAYS", "31"))
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "90"))
+CORE_DETACH_AFTER_DAYS = os.getenv("CORE_DETACH_AFTER_DAYS")
+
+PARTITIONED_TABLES = {
+    "raw.transactions": {
+        "granularity": "day",
+        "retention_days": RAW_RETENTION_DAYS,
+        "detach_after_days": None,
+    },
+    "core.transactions": {
+        "granularity": "month",
+        "retention_days": None,
+        "detach_after_days": int(CORE_DETACH_AFTER_DAYS) if CORE_DETACH_AFTER_DAYS else None,
+    },
+}
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_bounds(ts, granularity):
+    if granularity == "day":
+        lower = datetime(ts.year, ts.month, ts.day)
+        return lower, lower + timedelta(days=1)
+
+    lower = datetime(ts.year, ts.month, 1)
+    upper = datetime(ts.year + (ts.month == 12), ts.month % 12 + 1, 1)
+    return lower, upper
+
+
+def partition_name(table, lower, granularity) -> str:
+    suffix = lower.strftime("%Y%m%d" if granularity == "day" else "%Y%m")
+    return f"{table}_p{suffix}"
+
+
+def list_partitions(cur, table):
+    # (name, lower, upper) of bounded partitions, oldest first
+    cur.execute("""
+        SELECT
+            n.nspname || '.' || c.relname,
+            pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE i.inhparent = %s::regclass
+    """, (table,))
+
+    partitions = []
+
+    for name, bound in cur.fetchall():
+        match = _BOUND_RE.search(bound)
+
+        if match:
+            partitions.append((
+                name,
+                datetime.fromisoformat(match.group(1)),
+                datetime.fromisoformat(match.group(2))
+            ))
+
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def attach_partition(cur, table, name, lower, upper):
+    cur.execute(f"""
+        ALTER TABLE {table}
+        ATTACH PARTITION {name}
+        FOR VALUES FROM (%s) TO (%s)
+    """, (lower, upper))
+
+
+def detach_partition(cur, table, name):
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+
+
+def create_partition(cur, table, lower, upper, name):
+    default = f"{table}_default"
+
+    cur.execute(f"""
+        SELECT EXISTS (
+            SELECT 1 FROM {default}
+            WHERE transaction_ts >= %s AND transaction_ts < %s
+        )
+    """, (lower, upper))
+
+    if not cur.fetchone()[0]:
+        cur.execute(f"""
+            CREATE TABLE {name}
+            PARTITION OF {table}
+            FOR VALUES FROM (%s) TO (%s)
+        """, (lower, upper))
+        return
+
+    # rows for this range already sit in the default partition:
+    # move them into a standalone table, then attach it
+    cur.execute(f"""
+        CREATE TABLE {name}
+        (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    """)
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {default}
+            WHERE transaction_ts >= %s AND transaction_ts < %s
+            RETURNING *
+        )
+        INSERT INTO {name}
+        SELECT * FROM moved
+    """, (lower, upper))
+
+    attach_partition(cur, table, name, lower, upper)
+
+
+def ensure_partitions(cur, table, start, end, granularity) -> list:
+    existing = {lower for _, lower, _ in list_partitions(cur, table)}
+    created = []
+
+    lower, upper = partition_bounds(start, granularity)
+
+    while lower < end:
+        if lower not in existing:
+            name = partition_name(table, lower, granularity)
+            create_partition(cur, table, lower, upper, name)
+            created.append(name)
+
+        lower, upper = partition_bounds(upper, granularity)
+
+    return created
+
+
+def drop_expired_partitions(cur, table, retention_days, now) -> list:
+    cutoff = now - timedelta(days=retention_days)
+    dropped = []
+
+    for name, _, upper in list_partitions(cur, table):
+        # only partitions entirely older than the cutoff
+        if upper <= cutoff:
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+
+    return dropped
+
+
+def detach_old_partitions(cur, table, detach_after_days, now) -> list:
+    cutoff = now - timedelta(days=detach_after_days)
+    detached = []
+
+    for name, _, upper in list_partitions(cur, table):
+        if upper <= cutoff:
+            detach_partition(cur, table, name)
+            detached.append(name)
+
+    return detached
+
+
+def maintain_partitions(cur, now=None) -> dict:
+    now = now or datetime.now()
+    summary = {}
+
+    for table, policy in PARTITIONED_TABLES.items():
+        start = now - timedelta(days=PARTITION_LOOKBACK_DAYS)
+
+        if policy["retention_days"] is not None:
+            start = max(start, now - timedelta(days=policy["retention_days"]))
+
+        summary[table] = {
+            "created": ensure_partitions(
+                cur,
+                table,
+                start,
+                now + timedelta(days=PARTITION_AHEAD_DAYS),
+                policy["granularity"]
+            ),
+            "dropped": (
+                drop_expired_partitions(cur, table, policy["retention_days"], now)
+                if policy["retention_days"] is not None else []
+            ),
+            "detached": (
+                detach_old_partitions(cur, table, policy["detach_after_days"], now)
+                if policy["detach_after_days"] is not None else []
+            ),
+        }
+
+    return summary
+
+
+def main():
+    with connection() as conn, conn.cursor() as cur:
+        summary = maintain_partitions(cur)
+
+    for table, changes in summary.items():
+        print(
+            f"{table}: created {len(changes['created'])}, "
+            f"dropped {len(changes['dropped'])}, "
+            f"detached {len(changes['detached'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import hashlib
+import json
+import os
+import time
+
+from database.connection import connection
+from database.instrumentation import step
+
+# Dependency-aware step scheduler for the pipeline.
+#
+# - steps declare the steps they depend on; a step starts as soon as all of
+#   them succeeded (or were skipped), up to PIPELINE_MAX_WORKERS at a time
+#   on a thread pool, each with its own pooled connection
+# - a failed attempt is retried PIPELINE_RETRIES times, waiting
+#   PIPELINE_RETRY_DELAY seconds (doubling); steps run in one transaction,
+#   so a failed attempt leaves nothing behind
+# - a step with a fingerprint function is skipped when the fingerprint of its
+#   inputs equals the one stored in meta.pipeline_step_state after its last
+#   successful run
+# - when a step fails for good, its dependents are not started, independent
+#   steps still finish, then run_dag raises
+#
+# Total time is bounded by the slowest dependency chain (critical path), not
+# the sum of all steps.
+
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "3"))
+PIPELINE_RETRIES = int(os.getenv("PIPELINE_RETRIES", "2"))
+PIPELINE_RETRY_DELAY = float(os.getenv("PIPELINE_RETRY_DELAY", "1"))
+
+
+class Step:
+    # fn(metrics) does the work and may set metrics.rows;
+    # fingerprint(cur) returns a JSON-serializable summary of the inputs
+    def __init__(self, name, fn, depends_on=(), fingerprint=None, retries=PIPELINE_RETRIES):
+        self.name = name
+        self.fn = fn
+        self.depends_on = tuple(depends_on)
+        self.fingerprint = fingerprint
+        self.retries = retries
+
+
+def check_dag(steps):
+    names = {s.name for s in steps}
+
+    if len(names) != len(steps):
+        raise ValueError("Duplicate step names")
+
+    for s in steps:
+        unknown = set(s.depends_on) - names
+
+        if unknown:
+            raise ValueError(f"{s.name} depends on unknown steps {sorted(unknown)}")
+
+    # Kahn's algorithm: every step must become ready eventually
+    remaining = {s.name: set(s.depends_on) for s in steps}
+
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+
+        if not ready:
+            raise ValueError(f"Dependency cycle between {sorted(remaining)}")
+
+        for name in ready:
+            del remaining[name]
+
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def input_fingerprint(s):
+    if s.fingerprint is None:
+        return None
+
+    with connection() as conn, conn.cursor() as cur:
+        value = s.fingerprint(cur)
+
+    return hashlib.sha1(json.dumps(value, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def stored_fingerprint(name):
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT input_fingerprint
+            FROM meta.pipeline_step_state
+            WHERE step_name = %s
+        """, (name,))
+        row = cur.fetchone()
+
+    return row[0] if row else None
+
+
+def save_fingerprint(name, fingerprint):
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO meta.pipeline_step_state (step_name, input_fingerprint, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (step_name) DO UPDATE
+            SET input_fingerprint = EXCLUDED.input_fingerprint,
+                updated_at = EXCLUDED.updated_at
+        """, (name, fingerprint))
+
+
+def run_step(s) -> str:
+    # "success" or "skipped"; raises after the last failed attempt
+    fingerprint = input_fingerprint(s)
+
+    if fingerprint is not None and fingerprint == stored_fingerprint(s.name):
+        with step(s.name) as metrics:
+            metrics.status = "skipped"
+
+        return "skipped"
+
+    for attempt in range(s.retries + 1):
+        try:
+            with step(s.name) as metrics:
+                s.fn(metrics)
+            break
+        except Exception as e:
+            if attempt == s.retries:
+                raise
+
+            delay = PIPELINE_RETRY_DELAY * 2 ** attempt
+            print(f"[{s.name}] attempt {attempt + 1} failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+    if fingerprint is not None:
+        save_fingerprint(s.name, fingerprint)
+
+    return "success"
+
+
+def run_dag(steps, max_workers=PIPELINE_MAX_WORKERS) -> dict:
+    check_dag(steps)
+
+    by_name = {s.name: s for s in steps}
+    status = {}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="step") as pool:
+        running = {}
+
+        def submit_ready():
+            for s in steps:
+                if s.name in status or s.name in running.values():
+                    continue
+
+                deps = [status.get(d) for d in s.depends_on]
+
+                if any(d in ("failed", "blocked") for d in deps):
+                    status[s.name] = "blocked"
+                    print(f"[{s.name}] not started, a dependency failed")
+                elif all(d in ("success", "skipped") for d in deps):
+                    running[pool.submit(run_step, s)] = s.name
+
+        submit_ready()
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+
+                try:
+                    status[name] = future.result()
+                except Exception as e:
+                    status[name] = "failed"
+                    print(f"[{name}] failed: {e}")
+
+            # a blocked step can unblock others' decisions, so loop until stable
+            while True:
+                before = len(status)
+                submit_ready()
+
+                if len(status) == before:
+                    break
+
+    elapsed = time.perf_counter() - started
+    print(f"DAG finished in {elapsed:.2f}s: " + ", ".join(
+        f"{name} {status[name]}" for name in by_name
+    ))
+
+    failed = [name for name, state in status.items() if state == "failed"]
+
+    if failed:
+        raise RuntimeError(f"Pipeline steps failed: {', '.join(failed)}")
+
+    return status
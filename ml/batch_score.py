@@ -0,0 +1,259 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+from psycopg2 import sql
+
+from database.connection import connection
+from database.bulk import copy_rows_upsert
+from database.etl.incremental import features_load_id, lock_watermark, save_watermark
+from ml.data import NUMERIC_AS_FLOAT
+from ml.registry import MODEL_DIR, active_model_version, load_booster, load_threshold
+
+# Batch scoring of transactions with a registered model (default: the active one).
+#
+# - reads features.model_features rows without a prediction for the model
+#   version and load_id, in load_id order, BATCH_SCORE_CHUNK_ROWS at a time.
+#   Promotion gives an updated transaction a new load_id, so it is rescored
+#   and its prediction replaced
+# - scores chunks in a pool of BATCH_SCORE_WORKERS processes
+# - writes each chunk with COPY + upsert into mart.fraud_predictions and moves
+#   the checkpoint (meta.etl_watermarks, "batch_score:<version>") in the same
+#   transaction, in chunk order, so an interrupted run resumes after the last
+#   written chunk
+# - runs for the same version are serialized by a session advisory lock held
+#   until the run ends
+# - the run stops at the highest load_id with features: transactions
+#   promoted to core whose 1h / 24h features are not computed yet are left
+#   above the checkpoint for the next run
+#
+# python -m ml.batch_score [model_version]
+
+BATCH_SCORE_CHUNK_ROWS = int(os.getenv("BATCH_SCORE_CHUNK_ROWS", "100000"))
+BATCH_SCORE_WORKERS = int(os.getenv("BATCH_SCORE_WORKERS", str(os.cpu_count() or 1)))
+
+SCORE_SOURCE = "model"
+
+# data_generator.run's columns without reasons, plus the scored load_id;
+# not imported from there: spawned workers re-import this module and should
+# not pay for Faker
+PREDICTION_COLUMNS = (
+    "transaction_id",
+    "fraud_probability",
+    "is_fraud",
+    "model_version",
+    "score_source",
+    "prediction_ts",
+    "load_id"
+)
+
+UNSCORED_SQL = """
+    SELECT m.transaction_id, m.load_id, {features}
+    FROM features.model_features m
+    WHERE m.load_id > %(from_load_id)s
+      AND m.load_id <= %(to_load_id)s
+      AND NOT EXISTS (
+          SELECT 1
+          FROM mart.fraud_predictions p
+          WHERE p.transaction_id = m.transaction_id
+            AND p.model_version = %(model_version)s
+            AND p.load_id = m.load_id
+      )
+    ORDER BY m.load_id
+"""
+
+_booster = None
+
+
+def _init_worker(version, model_dir):
+    # one model per worker process, single-threaded: parallelism comes
+    # from the process pool
+    global _booster
+    _booster = load_booster(version, model_dir)
+
+
+def _score_chunk(X) -> np.ndarray:
+    return _booster.predict(X, num_threads=1)
+
+
+def checkpoint_name(version) -> str:
+    return f"batch_score:{version}"
+
+
+def lock_checkpoint(cur, version):
+    # session-level: survives the per-chunk commits, released by
+    # unlock_checkpoint; a second run of the version waits here
+    cur.execute("SELECT pg_advisory_lock(hashtext(%s))", (checkpoint_name(version),))
+
+
+def unlock_checkpoint(cur, version):
+    cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (checkpoint_name(version),))
+
+
+def scorable_load_id(cur, from_load_id) -> int:
+    # highest load_id whose 1h and 24h features are current, not MAX(load_id)
+    # of model_features: a row updated by promotion joins its old features
+    # until the feature steps reach its new load_id
+    return max(from_load_id, features_load_id(cur))
+
+
+def iter_unscored_chunks(conn, version, feature_names, from_load_id, to_load_id):
+    # (transaction_ids, load_ids, float32 feature matrix) per chunk
+    query = sql.SQL(UNSCORED_SQL).format(
+        features=sql.SQL(", ").join(sql.Identifier(name) for name in feature_names)
+    )
+
+    with conn.cursor(name="batch_score") as cur:
+        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cur)
+        cur.itersize = BATCH_SCORE_CHUNK_ROWS
+        cur.execute(query, {
+            "from_load_id": from_load_id,
+            "to_load_id": to_load_id,
+            "model_version": version,
+        })
+
+        while True:
+            rows = cur.fetchmany(BATCH_SCORE_CHUNK_ROWS)
+
+            if not rows:
+                return
+
+            # None -> NaN, booleans -> 0/1
+            X = pd.DataFrame.from_records(
+                [row[2:] for row in rows], columns=feature_names
+            ).astype(np.float32).to_numpy()
+
+            yield [row[0] for row in rows], [row[1] for row in rows], X
+
+
+def write_chunk(conn, version, threshold, transaction_ids, load_ids, probs, prediction_ts):
+    with conn.cursor() as cur:
+        copy_rows_upsert(
+            cur,
+            "mart.fraud_predictions",
+            PREDICTION_COLUMNS,
+            (
+                (transaction_id, float(prob), bool(prob >= threshold), version, SCORE_SOURCE,
+                 prediction_ts, load_id)
+                for transaction_id, load_id, prob in zip(transaction_ids, load_ids, probs)
+            ),
+            ("transaction_id", "model_version")
+        )
+        # rows come in load_id order
+        save_watermark(cur, checkpoint_name(version), load_ids[-1])
+
+    conn.commit()
+
+
+def make_scorer(version, model_dir, workers):
+    if workers == 1:
+        _init_worker(version, model_dir)
+        return None
+
+    # spawn: forked workers would inherit the parent's open DB connections
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(version, model_dir)
+    )
+
+
+def batch_score(version=None, workers=BATCH_SCORE_WORKERS, model_dir=MODEL_DIR) -> int:
+    with connection() as conn, conn.cursor() as cur:
+        version = version or active_model_version(cur)
+
+    if version is None:
+        raise RuntimeError("No active model in meta.model_registry")
+
+    # the write connection holds the advisory lock for the whole run
+    with connection() as read_conn, connection() as write_conn:
+        with write_conn.cursor() as cur:
+            lock_checkpoint(cur, version)
+
+        try:
+            return _batch_score(read_conn, write_conn, version, workers, model_dir)
+        finally:
+            write_conn.rollback()
+
+            with write_conn.cursor() as cur:
+                unlock_checkpoint(cur, version)
+
+            write_conn.commit()
+
+
+def _batch_score(read_conn, write_conn, version, workers, model_dir) -> int:
+    with write_conn.cursor() as cur:
+        from_load_id = lock_watermark(cur, checkpoint_name(version))
+        to_load_id = scorable_load_id(cur, from_load_id)
+
+    write_conn.commit()
+
+    feature_names = list(load_booster(version, model_dir).feature_name())
+    threshold = load_threshold(version, model_dir)
+    prediction_ts = datetime.utcnow()
+
+    print(f"Scoring load_id ({from_load_id}, {to_load_id}] with {version} on {workers} workers")
+
+    scorer = make_scorer(version, model_dir, workers)
+    pending = deque()
+    scored = 0
+    started = time.perf_counter()
+
+    def flush(write_conn):
+        nonlocal scored
+
+        transaction_ids, load_ids, result = pending.popleft()
+        probs = result.result() if scorer is not None else result
+
+        write_chunk(write_conn, version, threshold, transaction_ids, load_ids, probs, prediction_ts)
+
+        scored += len(transaction_ids)
+        elapsed = time.perf_counter() - started
+        print(f"{scored} rows scored, checkpoint load_id {load_ids[-1]}, "
+              f"{scored / elapsed:.0f} rows/s")
+
+    try:
+        for transaction_ids, load_ids, X in iter_unscored_chunks(
+            read_conn, version, feature_names, from_load_id, to_load_id
+        ):
+            result = scorer.submit(_score_chunk, X) if scorer is not None else _score_chunk(X)
+            pending.append((transaction_ids, load_ids, result))
+
+            # bounded read-ahead; chunks are written in order
+            if len(pending) > workers:
+                flush(write_conn)
+
+        while pending:
+            flush(write_conn)
+
+        # every row of model_features up to to_load_id is scored, even when
+        # the last ones were already scored by an earlier run
+        with write_conn.cursor() as cur:
+            save_watermark(cur, checkpoint_name(version), to_load_id)
+
+        write_conn.commit()
+    finally:
+        if scorer is not None:
+            scorer.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"Batch scoring finished: {scored} rows in {elapsed:.1f}s "
+          f"({scored / elapsed if elapsed else 0:.0f} rows/s)")
+
+    return scored
+
+
+def main(argv):
+    batch_score(version=argv[0] if argv else None)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,213 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+
+from database.connection import connection
+from database.etl.incremental import features_load_id
+
+# Chunked, typed and cached loader for features.training_dataset.
+#
+# - rows are streamed through a server-side cursor, TRAINING_CHUNK_ROWS at a time
+# - each chunk is downcast (float32, int8 booleans, smallest integers,
+#   categoricals for low-cardinality text) and written as one Parquet part
+# - the cache manifest stores the highest load_id fetched; later runs only
+#   fetch rows with a higher load_id and append a new part
+# - a transaction promotion revised is fetched again with its new load_id;
+#   the loaded dataset keeps only its latest row
+# - fetches stop at the load_id both transaction feature steps have reached
+#   (database.etl.incremental.features_load_id), so a row is only cached
+#   once its features are current; rule labels are written with the raw
+#   rows, before promotion, so they are always there
+#
+# The target is the labels of one rule set version: TRAINING_LABEL_VERSION,
+# default the version of the current rule set (data_generator/rules.py), so
+# a rule file with a new version trains on the labels it wrote.
+#
+# The cache is rebuilt when the query or label version changes or the database is behind the
+# cache (recreated). Backfilled feature rows keep their load_id, so run with
+# --refresh after a backfill.
+#
+# python -m ml.data [--refresh]
+
+TRAINING_CACHE_DIR = Path(os.getenv("TRAINING_CACHE_DIR", "ml/cache/training_dataset"))
+TRAINING_CHUNK_ROWS = int(os.getenv("TRAINING_CHUNK_ROWS", "200000"))
+TRAINING_LABEL_VERSION = os.getenv("TRAINING_LABEL_VERSION")
+
+TRAINING_QUERY = """
+    SELECT *
+    FROM features.training_dataset
+    WHERE load_id > %s
+      AND load_id <= %s
+      AND label_version = %s
+    ORDER BY load_id
+"""
+
+MANIFEST = "manifest.json"
+
+# NUMERIC arrives as float instead of Decimal objects
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "NUMERIC_AS_FLOAT",
+    lambda value, cur: float(value) if value is not None else None
+)
+
+
+def label_version() -> str:
+    if TRAINING_LABEL_VERSION:
+        return TRAINING_LABEL_VERSION
+
+    from data_generator.rules import get_rules
+
+    return get_rules().version
+
+
+def query_key() -> str:
+    return hashlib.sha1((TRAINING_QUERY + label_version()).encode()).hexdigest()[:12]
+
+
+def downcast(df) -> pd.DataFrame:
+    for column in df.columns:
+        series = df[column]
+
+        if series.dtype == bool:
+            df[column] = series.astype(np.int8)
+        elif series.dtype == object and series.map(type).isin({bool, type(None)}).all():
+            # nullable boolean column
+            df[column] = series.astype("float32")
+        elif pd.api.types.is_float_dtype(series):
+            df[column] = series.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == object and len(series) and series.nunique() < 0.5 * len(series):
+            df[column] = series.astype("category")
+
+    return df
+
+
+def read_manifest(cache_dir) -> dict:
+    path = cache_dir / MANIFEST
+
+    if not path.exists():
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(cache_dir, manifest):
+    tmp = cache_dir / (MANIFEST + ".tmp")
+
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp, cache_dir / MANIFEST)
+
+
+def fetch_new_parts(conn, cache_dir, manifest, to_load_id) -> int:
+    # streams rows above the manifest watermark into new Parquet parts
+    rows_fetched = 0
+
+    with conn.cursor(name="training_dataset") as cur:
+        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cur)
+        cur.itersize = TRAINING_CHUNK_ROWS
+        cur.execute(TRAINING_QUERY, (manifest["last_load_id"], to_load_id, label_version()))
+
+        while True:
+            rows = cur.fetchmany(TRAINING_CHUNK_ROWS)
+
+            if not rows:
+                break
+
+            columns = [c.name for c in cur.description]
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            del rows
+
+            # constant within the query, not a feature
+            chunk = downcast(chunk.drop(columns="label_version"))
+
+            first, last = int(chunk["load_id"].iloc[0]), int(chunk["load_id"].iloc[-1])
+            part = f"part_{first:012d}_{last:012d}.parquet"
+
+            chunk.to_parquet(cache_dir / part, index=False)
+
+            # the manifest only moves after the part is on disk
+            manifest["parts"].append(part)
+            manifest["last_load_id"] = last
+            write_manifest(cache_dir, manifest)
+
+            rows_fetched += len(chunk)
+
+    if to_load_id > manifest["last_load_id"]:
+        manifest["last_load_id"] = to_load_id
+        write_manifest(cache_dir, manifest)
+
+    return rows_fetched
+
+
+def sync_cache(cache_dir=TRAINING_CACHE_DIR, refresh=False) -> dict:
+    cache_dir = Path(cache_dir)
+    manifest = None if refresh else read_manifest(cache_dir)
+
+    with connection() as conn:
+        with conn.cursor() as cur:
+            db_load_id = features_load_id(cur)
+
+        if manifest is not None and (
+            manifest["query"] != query_key() or manifest["last_load_id"] > db_load_id
+        ):
+            manifest = None
+
+        if manifest is None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            manifest = {"query": query_key(), "last_load_id": 0, "parts": []}
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        rows = fetch_new_parts(conn, cache_dir, manifest, db_load_id)
+
+    print(f"Training cache: {rows} new rows, {len(manifest['parts'])} parts, "
+          f"load_id {manifest['last_load_id']}")
+
+    return manifest
+
+
+def load_training_dataset(cache_dir=TRAINING_CACHE_DIR, refresh=False) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cache_dir = Path(cache_dir)
+    manifest = sync_cache(cache_dir, refresh)
+
+    if not manifest["parts"]:
+        raise RuntimeError(f"features.training_dataset has no rows labeled {label_version()}")
+
+    # parts are downcast independently (e.g. int8 in one, int16 in another)
+    table = pa.concat_tables(
+        [pq.read_table(cache_dir / part) for part in manifest["parts"]],
+        promote_options="permissive"
+    )
+
+    # self_destruct frees Arrow buffers while converting
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+
+    # a transaction promotion revised (new load_id) is cached once per
+    # version; parts are in load_id order, so the last row is the current one
+    return df.drop_duplicates("transaction_id", keep="last", ignore_index=True)
+
+
+def main(argv):
+    df = load_training_dataset(refresh="--refresh" in argv)
+
+    print(f"{len(df)} rows, {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+    print(df.dtypes.to_string())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,116 @@
+import ctypes
+
+import numpy as np
+from lightgbm.basic import _LIB, _safe_call
+
+# Low-overhead LightGBM scoring for single rows and small batches.
+#
+# LGBMClassifier.predict_proba on a DataFrame pays a fixed cost per call
+# (DataFrame checks, feature name validation, array conversion, result
+# allocation) that dominates at 1-64 rows. FastPredictor calls the native
+# predictor on preallocated float32 buffers instead:
+#
+#   predictor = FastPredictor(booster, feature_names)
+#   predictor.rows[:n] = ...          # fill in predictor.feature_names order
+#   probs = predictor.predict(n)      # view into a preallocated buffer
+#
+# - one row:  LGBM_BoosterPredictForMatSingleRowFast with a FastConfig
+#   prepared once
+# - n rows:   LGBM_BoosterPredictForMat on the first n rows of the buffer
+#
+# Models trained on the float32 training cache (ml/data.py) split on float32
+# values, so float32 input scores exactly like float64.
+#
+# A FastPredictor owns its buffers and is not thread-safe: use one per thread.
+#
+# python -m benchmarks.inference [model_version]
+
+_DTYPE_FLOAT32 = 0
+_PREDICT_NORMAL = 0
+_ROW_MAJOR = 1
+
+INFERENCE_MAX_BATCH = 1024
+
+
+class FastPredictor:
+    def __init__(self, booster, feature_names=None, max_batch=INFERENCE_MAX_BATCH,
+                 num_threads=1):
+        self.booster = booster
+        self.feature_names = list(feature_names or booster.feature_name())
+        self.max_batch = max_batch
+
+        if self.feature_names != list(booster.feature_name()):
+            raise ValueError("feature_names must match the booster's feature order")
+
+        n_features = len(self.feature_names)
+
+        self.rows = np.zeros((max_batch, n_features), dtype=np.float32)
+        self.out = np.zeros(max_batch, dtype=np.float64)
+
+        # ctypes arguments that never change between calls
+        self._handle = booster._handle
+        self._rows_ptr = self.rows.ctypes.data_as(ctypes.c_void_p)
+        self._out_ptr = self.out.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+        self._out_len = ctypes.c_int64(0)
+        self._n_features = ctypes.c_int32(n_features)
+        self._num_iteration = ctypes.c_int(booster.best_iteration or -1)
+        # small batches do not benefit from OpenMP threads
+        self._parameter = ctypes.c_char_p(f"num_threads={num_threads}".encode())
+
+        self._fast_config = ctypes.c_void_p()
+        _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFastInit(
+            self._handle,
+            ctypes.c_int(_PREDICT_NORMAL),
+            ctypes.c_int(0),
+            self._num_iteration,
+            ctypes.c_int(_DTYPE_FLOAT32),
+            self._n_features,
+            self._parameter,
+            ctypes.byref(self._fast_config)
+        ))
+
+    def __del__(self):
+        if getattr(self, "_fast_config", None):
+            _LIB.LGBM_FastConfigFree(self._fast_config)
+            self._fast_config = None
+
+    def predict(self, n) -> np.ndarray:
+        # probabilities for the first n rows of self.rows; the result is a
+        # view that the next call overwrites
+        if n == 1:
+            _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFast(
+                self._fast_config,
+                self._rows_ptr,
+                ctypes.byref(self._out_len),
+                self._out_ptr
+            ))
+            return self.out[:1]
+
+        if not 0 < n <= self.max_batch:
+            raise ValueError(f"batch of {n} rows, buffers hold 1..{self.max_batch}")
+
+        _safe_call(_LIB.LGBM_BoosterPredictForMat(
+            self._handle,
+            self._rows_ptr,
+            ctypes.c_int(_DTYPE_FLOAT32),
+            ctypes.c_int32(n),
+            self._n_features,
+            ctypes.c_int(_ROW_MAJOR),
+            ctypes.c_int(_PREDICT_NORMAL),
+            ctypes.c_int(0),
+            self._num_iteration,
+            self._parameter,
+            ctypes.byref(self._out_len),
+            self._out_ptr
+        ))
+        return self.out[:n]
+
+    def predict_rows(self, X) -> np.ndarray:
+        # copies X (n x features, any numeric dtype) into the buffer
+        n = len(X)
+
+        if n > self.max_batch:
+            raise ValueError(f"batch of {n} rows, buffers hold 1..{self.max_batch}")
+
+        self.rows[:n] = X
+        return self.predict(n)
@@ -0,0 +1,65 @@
+from pathlib import Path
+import json
+
+# Model artifacts and meta.model_registry lookups shared by training,
+# batch scoring and the API.
+#
+# ml/models/{version}.pkl              fitted LGBMClassifier (joblib)
+# ml/models/{version}.txt              the same booster in LightGBM's native format
+# ml/models/{version}_threshold.json   {"threshold": ...}
+
+MODEL_NAME = "lightgbm_fraud"
+MODEL_DIR = "ml/models"
+
+# NOTIFY channel: ml/train.py announces new versions, ml/serving.py listens
+MODEL_REGISTRY_CHANNEL = "model_registry"
+
+
+def active_model_version(cur, model_name=MODEL_NAME):
+    cur.execute("""
+        SELECT model_version
+        FROM meta.model_registry
+        WHERE model_name = %s
+          AND is_active
+        ORDER BY trained_at DESC
+        LIMIT 1
+    """, (model_name,))
+
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def model_path(version, model_dir=MODEL_DIR) -> Path:
+    return Path(model_dir) / f"{version}.pkl"
+
+
+def native_model_path(version, model_dir=MODEL_DIR) -> Path:
+    return Path(model_dir) / f"{version}.txt"
+
+
+def threshold_path(version, model_dir=MODEL_DIR) -> Path:
+    return Path(model_dir) / f"{version}_threshold.json"
+
+
+def load_model(version, model_dir=MODEL_DIR):
+    import joblib
+
+    return joblib.load(model_path(version, model_dir))
+
+
+def load_booster(version, model_dir=MODEL_DIR):
+    # native file: no sklearn/joblib unpickling; versions trained before it
+    # existed fall back to the pickle
+    import lightgbm as lgb
+
+    path = native_model_path(version, model_dir)
+
+    if path.exists():
+        return lgb.Booster(model_file=str(path))
+
+    return load_model(version, model_dir).booster_
+
+
+def load_threshold(version, model_dir=MODEL_DIR) -> float:
+    with open(threshold_path(version, model_dir)) as f:
+        return json.load(f)["threshold"]
@@ -0,0 +1,165 @@
+import os
+import select
+import threading
+
+import numpy as np
+
+from database.connection import connection, get_connection
+from ml.inference import INFERENCE_MAX_BATCH, FastPredictor
+from ml.registry import (
+    MODEL_NAME,
+    MODEL_DIR,
+    MODEL_REGISTRY_CHANNEL,
+    active_model_version,
+    load_booster,
+    load_threshold
+)
+
+# Model cache for long-running consumers (API, workers).
+#
+# - the active model of meta.model_registry is loaded once per process from
+#   its native LightGBM file (ml/models/{version}.txt) and threshold
+# - a watcher thread LISTENs on MODEL_REGISTRY_CHANNEL (ml/train.py notifies
+#   after registering a model) and re-checks the registry every
+#   MODEL_POLL_SECONDS for changes made without a notification
+# - a new version is loaded next to the old one and swapped in by replacing
+#   a single reference; callers read `cache.current` once per prediction, so
+#   in-flight predictions finish on the model they started with
+#
+# Models are read-only after loading: a cache filled before forking worker
+# processes is shared copy-on-write.
+
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", "30"))
+
+
+class ServingModel:
+    # One registered version: booster, decision threshold and feature order
+    def __init__(self, version, booster, threshold):
+        self.version = version
+        self.booster = booster
+        self.threshold = threshold
+        self.feature_names = list(booster.feature_name())
+        # FastPredictor buffers are per thread
+        self._local = threading.local()
+
+    def vector(self, features) -> list:
+        # model feature order, NaN for features the caller does not compute
+        return [float(features.get(name, np.nan)) for name in self.feature_names]
+
+    def predict(self, X) -> np.ndarray:
+        if len(X) > INFERENCE_MAX_BATCH:
+            return self.booster.predict(X)
+
+        predictor = getattr(self._local, "predictor", None)
+
+        if predictor is None:
+            predictor = self._local.predictor = FastPredictor(self.booster, self.feature_names)
+
+        # the buffer is reused by the next call
+        return predictor.predict_rows(X).copy()
+
+
+def load_serving_model(version, model_dir=MODEL_DIR) -> ServingModel:
+    return ServingModel(
+        version,
+        load_booster(version, model_dir),
+        load_threshold(version, model_dir)
+    )
+
+
+class ModelCache:
+    def __init__(self, model_name=MODEL_NAME, model_dir=MODEL_DIR, poll_seconds=MODEL_POLL_SECONDS):
+        self.model_name = model_name
+        self.model_dir = model_dir
+        self.poll_seconds = poll_seconds
+
+        self._current = None
+        # serializes loads; readers never take it
+        self._load_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+    @property
+    def current(self) -> ServingModel:
+        # None while no model is active
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version if self._current is not None else None
+
+    def refresh(self, cur=None) -> bool:
+        # loads the active version if it changed; True when swapped
+        with self._load_lock:
+            if cur is None:
+                with connection() as conn, conn.cursor() as cur:
+                    version = active_model_version(cur, self.model_name)
+            else:
+                version = active_model_version(cur, self.model_name)
+
+            if version == self.version:
+                return False
+
+            model = load_serving_model(version, self.model_dir) if version is not None else None
+
+            previous, self._current = self.version, model
+            print(f"Model cache: {previous} -> {version}")
+
+            return True
+
+    def start(self):
+        self.refresh()
+
+        self._stopped.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-cache", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _wait_for_change(self, conn) -> bool:
+        # True on a notification, False after poll_seconds or on stop;
+        # wakes up every second to notice stop()
+        remaining = self.poll_seconds
+
+        while remaining > 0 and not self._stopped.is_set():
+            timeout = min(1.0, remaining)
+
+            if select.select([conn], [], [], timeout) != ([], [], []):
+                conn.poll()
+
+                if conn.notifies:
+                    conn.notifies.clear()
+                    return True
+
+            remaining -= timeout
+
+        return False
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            conn = None
+
+            try:
+                conn = get_connection()
+                conn.autocommit = True
+
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {MODEL_REGISTRY_CHANNEL}")
+
+                    while not self._stopped.is_set():
+                        self._wait_for_change(conn)
+
+                        if not self._stopped.is_set():
+                            self.refresh(cur)
+            except Exception as e:
+                # keep serving the current model, retry after a poll interval
+                print(f"Model cache refresh failed: {e}")
+                self._stopped.wait(self.poll_seconds)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -1,26 +1,31 @@
-from database.connection import get_connection
-import pandas as pd
-from sklearn.metrics import roc_auc_score, average_precision_score, precision_recall_curve
-import lightgbm as lgb
-import joblib
+from database.connection import connection
+from ml.registry import (
+    MODEL_NAME,
+    MODEL_DIR,
+    MODEL_REGISTRY_CHANNEL,
+    model_path,
+    native_model_path,
+    threshold_path
+)
+from ml.tuning import (
+    TUNE_TRIALS,
+    DEFAULT_PARAMS,
+    NUM_BOOST_ROUND,
+    EARLY_STOPPING_ROUNDS,
+    tune
+)
 from datetime import datetime
 import json
 import os
 
-MODEL_NAME = "lightgbm_fraud"
-MODEL_VERSION = f"lgb_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-MODEL_DIR = "ml/models"
+# pandas, scikit-learn, LightGBM and joblib are imported by the functions
+# that use them: importing this module stays cheap for callers that only
+# need its helpers
 
 
-def load_training_dataset():
-    conn = get_connection()
-    query = """
-        SELECT *
-        FROM features.training_dataset
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+def new_model_version() -> str:
+    # taken when training starts, not when the module is imported
+    return f"lgb_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
 
 
 def preprocess(df):
@@ -35,7 +40,7 @@ def preprocess(df):
     val_df = df.iloc[train_end:val_end]
     test_df = df.iloc[val_end:]
 
-    drop_cols = ["transaction_id", "is_fraud", "transaction_ts"]
+    drop_cols = ["transaction_id", "is_fraud", "transaction_ts", "load_id"]
 
     y_train = train_df["is_fraud"].astype(int)
     X_train = train_df.drop(columns=drop_cols)
@@ -55,15 +60,34 @@ def preprocess(df):
     return X_train, X_val, X_test, y_train, y_val, y_test
 
 
-def train_model(X_train, y_train, X_val, y_val):
+def search_params(X_train, y_train, X_val, y_val):
+
+    if TUNE_TRIALS <= 0:
+        return DEFAULT_PARAMS
+
+    import pandas as pd
+
+    # walk-forward CV over train + validation, the test split stays unseen
+    X = pd.concat([X_train, X_val])
+    y = pd.concat([y_train, y_val])
+
+    # only the parameters: the tuned round count is a mean over folds trained
+    # on fewer rows than X_train (the first on a fifth of train + validation),
+    # and more rows take more rounds; train_model early stops on X_val, the
+    # rows right after X_train, with the same patience as tuning
+    return tune(X.to_numpy(), y.to_numpy())["params"]
+
+
+def train_model(X_train, y_train, X_val, y_val, params=DEFAULT_PARAMS):
+    import lightgbm as lgb
 
     model = lgb.LGBMClassifier(
         objective="binary",
         class_weight="balanced",
-        n_estimators=2000,
-        learning_rate=0.05,
-        num_leaves=64,
-        random_state=42
+        n_estimators=NUM_BOOST_ROUND,
+        random_state=42,
+        verbosity=-1,
+        **params
     )
 
     model.fit(
@@ -71,14 +95,14 @@ def train_model(X_train, y_train, X_val, y_val):
         y_train,
         eval_set=[(X_val, y_val)],
         eval_metric="auc",
-        early_stopping_rounds=100,
-        verbose=100
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS), lgb.log_evaluation(100)]
     )
 
     return model
 
 
 def select_threshold(model, X_val, y_val, min_precision=0.9):
+    from sklearn.metrics import precision_recall_curve
 
     probs = model.predict_proba(X_val)[:, 1]
     precision, recall, thresholds = precision_recall_curve(y_val, probs)
@@ -96,6 +120,7 @@ def select_threshold(model, X_val, y_val, min_precision=0.9):
 
 
 def evaluate(model, X_test, y_test):
+    from sklearn.metrics import roc_auc_score, average_precision_score
 
     probs = model.predict_proba(X_test)[:, 1]
 
@@ -108,49 +133,52 @@ def evaluate(model, X_test, y_test):
     return roc, pr
 
 
-def log_model_and_metrics(roc, pr):
-
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # deactivating previous models
-    cur.execute("""
-        UPDATE meta.model_registry
-        SET is_active = FALSE
-        WHERE model_name = %s
-    """, (MODEL_NAME,))
-
-    # inserting new model
-    cur.execute("""
-        INSERT INTO meta.model_registry
-        (model_name, model_version, description, trained_at, is_active)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (
-        MODEL_NAME,
-        MODEL_VERSION,
-        "LightGBM fraud model with temporal split",
-        datetime.utcnow(),
-        True
-    ))
-
-    # inserting metrics
-    cur.execute("""
-        INSERT INTO mart.model_metrics_daily
-        (metric_date, model_version, auc, precision, recall)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (
-        datetime.utcnow().date(),
-        MODEL_VERSION,
-        roc,
-        None,  
-        None
-    ))
-
-    conn.commit()
-    conn.close()
+def log_model_and_metrics(version, roc, pr):
+
+    # commits on success, rolls back on error
+    with connection() as conn, conn.cursor() as cur:
+        # deactivating previous models
+        cur.execute("""
+            UPDATE meta.model_registry
+            SET is_active = FALSE
+            WHERE model_name = %s
+        """, (MODEL_NAME,))
+
+        # inserting new model
+        cur.execute("""
+            INSERT INTO meta.model_registry
+            (model_name, model_version, description, trained_at, is_active)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (
+            MODEL_NAME,
+            version,
+            "LightGBM fraud model with temporal split",
+            datetime.utcnow(),
+            True
+        ))
+
+        # inserting metrics
+        cur.execute("""
+            INSERT INTO mart.model_metrics_daily
+            (metric_date, model_version, auc, precision, recall)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (
+            datetime.utcnow().date(),
+            version,
+            roc,
+            None,  
+            None
+        ))
+
+        # wakes up serving caches once the transaction commits
+        cur.execute("SELECT pg_notify(%s, %s)", (MODEL_REGISTRY_CHANNEL, version))
 
 
 def main():
+    from ml.data import load_training_dataset
+    import joblib
+
+    version = new_model_version()
 
     if not os.path.exists(MODEL_DIR):
         os.makedirs(MODEL_DIR)
@@ -159,23 +187,28 @@ def main():
 
     X_train, X_val, X_test, y_train, y_val, y_test = preprocess(df)
 
-    model = train_model(X_train, y_train, X_val, y_val)
+    params = search_params(X_train, y_train, X_val, y_val)
+
+    model = train_model(X_train, y_train, X_val, y_val, params)
 
     threshold = select_threshold(model, X_val, y_val)
 
     roc, pr = evaluate(model, X_test, y_test)
 
     # saving model
-    model_path = f"{MODEL_DIR}/{MODEL_VERSION}.pkl"
-    joblib.dump(model, model_path)
+    path = model_path(version)
+    joblib.dump(model, path)
+
+    # native format for serving (ml/serving.py), best iteration only
+    model.booster_.save_model(str(native_model_path(version)))
 
     # save threshold
-    with open(f"{MODEL_DIR}/{MODEL_VERSION}_threshold.json", "w") as f:
+    with open(threshold_path(version), "w") as f:
         json.dump({"threshold": float(threshold)}, f)
 
-    log_model_and_metrics(roc, pr)
+    log_model_and_metrics(version, roc, pr)
 
-    print(f"Model saved: {model_path}")
+    print(f"Model saved: {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,246 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Walk-forward cross-validation and hyperparameter search.
+#
+# - rows (sorted by time) are split into expanding-window folds: fold k
+#   trains on everything before its validation block
+# - each fold is binned once into an lgb.Dataset and saved as a LightGBM
+#   binary; every trial in every worker reuses it, only booster parameters
+#   vary between trials
+# - (trial, fold) tasks run in a process pool of TUNE_WORKERS, each LightGBM
+#   call with TUNE_THREADS_PER_WORKER threads
+# - a trial moves on to its next fold only while its mean AUC so far is not
+#   below the median of other trials at the same fold (median pruning);
+#   within a fold, early stopping cuts boosting rounds
+# - the best trial's round count (mean best_iteration over the folds) is
+#   reported, not reused: ml/train.py fits on different rows and early stops
+#   on its own validation split
+
+# TUNE_TRIALS=0 trains with DEFAULT_PARAMS and skips the search
+TUNE_TRIALS = int(os.getenv("TUNE_TRIALS", "20"))
+CV_FOLDS = int(os.getenv("CV_FOLDS", "4"))
+TUNE_WORKERS = int(os.getenv("TUNE_WORKERS", str(os.cpu_count() or 1)))
+TUNE_THREADS_PER_WORKER = int(os.getenv(
+    "TUNE_THREADS_PER_WORKER", str(max(1, (os.cpu_count() or 1) // TUNE_WORKERS))
+))
+TUNE_SEED = int(os.getenv("TUNE_SEED", "42"))
+
+# trials that must report a fold before anything is pruned at that fold
+PRUNE_MIN_TRIALS = 4
+
+NUM_BOOST_ROUND = 2000
+EARLY_STOPPING_ROUNDS = 100
+
+# fixed at binning time, shared by all trials
+DATASET_PARAMS = {
+    "max_bin": 255,
+    "feature_pre_filter": False,
+    "verbosity": -1,
+}
+
+BASE_PARAMS = {
+    "objective": "binary",
+    "metric": "auc",
+    "is_unbalance": True,
+    "verbosity": -1,
+    "seed": 42,
+}
+
+DEFAULT_PARAMS = {
+    "learning_rate": 0.05,
+    "num_leaves": 64,
+}
+
+
+def sample_params(rng) -> dict:
+    return {
+        "learning_rate": float(np.exp(rng.uniform(np.log(0.01), np.log(0.2)))),
+        "num_leaves": int(rng.choice([15, 31, 63, 127])),
+        "min_data_in_leaf": int(rng.choice([10, 20, 50, 100, 200])),
+        "feature_fraction": float(rng.uniform(0.6, 1.0)),
+        "bagging_fraction": float(rng.uniform(0.6, 1.0)),
+        "bagging_freq": 1,
+        "lambda_l2": float(np.exp(rng.uniform(np.log(1e-3), np.log(10.0)))),
+    }
+
+
+def walk_forward_folds(y, n_folds) -> list:
+    # (train_end, valid_end) row offsets; the first block only trains.
+    # Folds without both classes in train and validation are skipped.
+    n = len(y)
+    block = n // (n_folds + 1)
+    folds = []
+
+    for k in range(1, n_folds + 1):
+        train_end = block * k
+        valid_end = n if k == n_folds else block * (k + 1)
+
+        train_y = y[:train_end]
+        valid_y = y[train_end:valid_end]
+
+        if len(np.unique(train_y)) < 2 or len(np.unique(valid_y)) < 2:
+            print(f"Skipping fold {k}: a single class in train or validation")
+            continue
+
+        folds.append((train_end, valid_end))
+
+    return folds
+
+
+def save_fold_datasets(X, y, folds, directory):
+    import lightgbm as lgb
+
+    for i, (train_end, valid_end) in enumerate(folds):
+        train = lgb.Dataset(
+            X[:train_end], y[:train_end], params=DATASET_PARAMS, free_raw_data=True
+        ).construct()
+        valid = lgb.Dataset(
+            X[train_end:valid_end], y[train_end:valid_end],
+            reference=train, params=DATASET_PARAMS, free_raw_data=True
+        ).construct()
+
+        train.save_binary(str(Path(directory) / f"fold_{i}_train.bin"))
+        valid.save_binary(str(Path(directory) / f"fold_{i}_valid.bin"))
+
+
+_fold_dir = None
+_threads = 1
+_datasets = {}
+
+
+def _init_worker(fold_dir, threads):
+    global _fold_dir, _threads
+    _fold_dir = fold_dir
+    _threads = threads
+
+
+def _fold_datasets(fold) -> tuple:
+    # loaded once per worker and fold, then reused by later trials
+    if fold not in _datasets:
+        import lightgbm as lgb
+
+        train = lgb.Dataset(str(Path(_fold_dir) / f"fold_{fold}_train.bin"), params=DATASET_PARAMS)
+        valid = lgb.Dataset(
+            str(Path(_fold_dir) / f"fold_{fold}_valid.bin"), reference=train, params=DATASET_PARAMS
+        )
+        _datasets[fold] = (train, valid)
+
+    return _datasets[fold]
+
+
+def _run_fold(params, fold) -> tuple:
+    import lightgbm as lgb
+
+    train, valid = _fold_datasets(fold)
+
+    booster = lgb.train(
+        {**BASE_PARAMS, **params, "num_threads": _threads},
+        train,
+        num_boost_round=NUM_BOOST_ROUND,
+        valid_sets=[valid],
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)]
+    )
+
+    return booster.best_score["valid_0"]["auc"], booster.best_iteration
+
+
+def should_prune(mean_auc, others) -> bool:
+    # others: the running means of the other trials at this fold, the trial's
+    # own value is not part of the median it is compared with
+    return len(others) >= PRUNE_MIN_TRIALS and mean_auc < np.median(others)
+
+
+def tune(X, y, n_trials=TUNE_TRIALS, n_folds=CV_FOLDS, workers=TUNE_WORKERS,
+         threads=TUNE_THREADS_PER_WORKER, seed=TUNE_SEED) -> dict:
+    # X, y sorted by time; returns the best trial
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+
+    folds = walk_forward_folds(y, n_folds)
+
+    if not folds:
+        raise RuntimeError("No usable walk-forward fold, not enough positives")
+
+    rng = np.random.default_rng(seed)
+    trials = [DEFAULT_PARAMS] + [sample_params(rng) for _ in range(n_trials - 1)]
+
+    results = defaultdict(list)    # trial -> [(auc, best_iteration)] per fold
+    reported = defaultdict(list)   # fold -> running mean AUC of every trial
+    pruned = set()
+
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as fold_dir:
+        save_fold_datasets(X, y, folds, fold_dir)
+
+        # spawn: forked workers would inherit the parent's open DB connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(fold_dir, threads)
+        ) as pool:
+            running = {}
+            next_trial = 0
+
+            def submit(trial, fold):
+                running[pool.submit(_run_fold, trials[trial], fold)] = (trial, fold)
+
+            def fill():
+                nonlocal next_trial
+
+                while next_trial < len(trials) and len(running) < workers:
+                    submit(next_trial, 0)
+                    next_trial += 1
+
+            fill()
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    trial, fold = running.pop(future)
+                    results[trial].append(future.result())
+
+                    mean_auc = float(np.mean([auc for auc, _ in results[trial]]))
+                    prune = should_prune(mean_auc, reported[fold])
+                    reported[fold].append(mean_auc)
+
+                    if fold + 1 == len(folds):
+                        continue
+
+                    # continuing trials go before new ones
+                    if prune:
+                        pruned.add(trial)
+                    else:
+                        submit(trial, fold + 1)
+
+                fill()
+
+    completed = {
+        trial: fold_results
+        for trial, fold_results in results.items()
+        if len(fold_results) == len(folds)
+    }
+
+    best_trial = max(completed, key=lambda t: np.mean([auc for auc, _ in completed[t]]))
+    best = {
+        "params": trials[best_trial],
+        "cv_auc": float(np.mean([auc for auc, _ in completed[best_trial]])),
+        "best_iteration": int(np.mean([it for _, it in completed[best_trial]])),
+    }
+
+    elapsed = time.perf_counter() - started
+    print(f"Tuning: {len(trials)} trials x {len(folds)} folds, {len(completed)} completed, "
+          f"{len(pruned)} pruned, {elapsed:.1f}s on {workers} workers x {threads} threads")
+    print(f"Best CV AUC {best['cv_auc']:.4f} (~{best['best_iteration']} rounds) with {best['params']}")
+
+    return best
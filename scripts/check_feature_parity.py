@@ -0,0 +1,164 @@
+import sys
+import tempfile
+from pathlib import Path
+
+from database.connection import connection
+from api.feature_store import OnlineFeatureStore
+
+# Compares the online feature store with the feature tables written by the
+# SQL ETL, value for value, then repeats the check on a store reloaded from
+# a snapshot. Run after the pipeline:
+#
+# python -m scripts.run_pipeline
+# python -m scripts.check_feature_parity
+#
+# With a snapshot path the store starts from that snapshot when it exists
+# (written by an earlier run of this script) and only syncs the rows loaded
+# since, which checks the incremental path, including transactions
+# promotion revised in between:
+#
+# python -m scripts.check_feature_parity /tmp/parity_store.pkl
+
+TRANSACTION_FEATURES_SQL = """
+    SELECT
+        t.transaction_id,
+        t.user_id,
+        t.transaction_ts,
+        t.device_id,
+        t.transaction_country,
+        f1.tx_count_last_1h,
+        f1.avg_amount_last_1h,
+        f1.is_new_device,
+        f1.is_foreign_tx,
+        f24.tx_count_last_24h,
+        f24.avg_amount_last_24h
+    FROM core.transactions t
+    JOIN features.transaction_features_1h f1
+      ON f1.transaction_id = t.transaction_id
+    JOIN features.transaction_features_24h f24
+      ON f24.transaction_id = t.transaction_id
+"""
+
+USER_BEHAVIOR_SQL = """
+    SELECT user_id, tx_count_7d, avg_amount_7d, distinct_countries_7d, calculated_at
+    FROM features.user_behavior_features
+"""
+
+TRANSACTION_FEATURES = (
+    "tx_count_last_1h",
+    "avg_amount_last_1h",
+    "is_new_device",
+    "is_foreign_tx",
+    "tx_count_last_24h",
+    "avg_amount_last_24h",
+)
+
+BEHAVIOR_FEATURES = ("tx_count_7d", "avg_amount_7d", "distinct_countries_7d")
+
+MAX_REPORTED = 10
+
+
+def compare_transactions(conn, store) -> tuple:
+    checked = 0
+    mismatches = []
+
+    with conn.cursor(name="parity_transactions") as cur:
+        cur.itersize = 50_000
+        cur.execute(TRANSACTION_FEATURES_SQL)
+
+        for row in cur:
+            transaction_id, user_id, ts, device_id, country = row[:5]
+            expected = dict(zip(TRANSACTION_FEATURES, row[5:]))
+            actual = store.transaction_features(user_id, ts, device_id, country)
+
+            checked += 1
+
+            if actual != expected:
+                mismatches.append((transaction_id, expected, actual))
+
+    return checked, mismatches
+
+
+def compare_user_behavior(conn, store) -> tuple:
+    with conn.cursor() as cur:
+        cur.execute(USER_BEHAVIOR_SQL)
+        rows = cur.fetchall()
+
+    mismatches = []
+    expected_users = set()
+
+    for user_id, tx_count, avg_amount, distinct_countries, calculated_at in rows:
+        expected = dict(zip(BEHAVIOR_FEATURES, (tx_count, avg_amount, distinct_countries)))
+        actual = store.user_behavior_features(user_id, now=calculated_at)
+        expected_users.add(user_id)
+
+        if actual != expected:
+            mismatches.append((user_id, expected, actual))
+
+    if rows:
+        # users the SQL has no row for must have no features either
+        now = rows[0][4]
+
+        for user_id in store.histories.keys() - expected_users:
+            actual = store.user_behavior_features(user_id, now=now)
+
+            if actual is not None:
+                mismatches.append((user_id, None, actual))
+
+    return len(rows), mismatches
+
+
+def check(conn, store, label) -> bool:
+    ok = True
+
+    for name, compare in (
+        ("transaction features", compare_transactions),
+        ("user behavior features", compare_user_behavior)
+    ):
+        checked, mismatches = compare(conn, store)
+        print(f"{label}: {name}: {checked} rows checked, {len(mismatches)} mismatches")
+
+        for key, expected, actual in mismatches[:MAX_REPORTED]:
+            print(f"  {key}: sql={expected} store={actual}")
+
+        ok = ok and not mismatches and checked > 0
+
+    return ok
+
+
+def main(argv):
+    snapshot = Path(argv[0]) if argv else None
+
+    if snapshot is not None and snapshot.exists():
+        store = OnlineFeatureStore.load(snapshot)
+        label = "incremental"
+    else:
+        # full history, so features of old transactions can be checked too
+        store = OnlineFeatureStore(retention_days=None)
+        label = "warm-up"
+
+    with connection() as conn:
+        rows = store.sync(conn)
+        print(f"{label}: synced {rows} transactions, {len(store.users)} users")
+
+        ok = check(conn, store, label)
+
+        if snapshot is not None:
+            store.save(snapshot)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "feature_store.pkl"
+            store.save(path)
+            restored = OnlineFeatureStore.load(path)
+
+        ok = check(conn, restored, "snapshot") and ok
+
+    if not ok:
+        print("Feature parity check FAILED")
+        sys.exit(1)
+
+    print("Feature parity check passed")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+import sys
+
+from data_generator import generate_columnar as columnar
+from data_generator.label_entities import label_entities
+from data_generator.label_transactions import label_transactions
+from data_generator.rules import DEFAULT_RULES_PATH, load_rules, use_rules
+
+# Checks that the two evaluators of a rule set agree, value for value:
+# - RuleSet.score, the generated scalar function (API, label_transactions)
+# - RuleSet.score_batch + reason_mask, the NumPy expressions (label_entities)
+# Both label the same generated transactions; scores, fraud flags and reason
+# masks must be identical. Needs no database. Run after changing a rule file
+# or the rule compiler:
+#
+# python -m scripts.check_rule_parity [path/to/rules.json] [n_users]
+
+SEED = 42
+N_MERCHANTS = 50
+MAX_REPORTED = 10
+
+
+def main(argv):
+    path = argv[0] if argv else DEFAULT_RULES_PATH
+    n_users = int(argv[1]) if len(argv) > 1 else 2000
+
+    rules = load_rules(path)
+    use_rules(rules)
+
+    store = columnar.generate_store(columnar.make_rng(SEED), n_users, N_MERCHANTS)
+
+    # row by row, in time order, from the same transactions
+    expected = {
+        tx[0]: tx[9:]
+        for tx in label_transactions(list(store.transaction_rows()), list(store.user_rows()))
+    }
+
+    label_entities(store)
+
+    checked = 0
+    mismatches = []
+
+    for tx in store.labeled_rows():
+        checked += 1
+
+        if tx[9:] != expected[tx[0]]:
+            mismatches.append((tx[0], expected[tx[0]], tx[9:]))
+
+    print(f"{rules.source}: {rules.version}, {checked} transactions checked, "
+          f"{len(mismatches)} mismatches")
+
+    for transaction_id, scalar, batch in mismatches[:MAX_REPORTED]:
+        print(f"  {transaction_id}: score={scalar} score_batch={batch}")
+
+    if not checked or mismatches or checked != len(expected):
+        print("Rule parity check FAILED")
+        sys.exit(1)
+
+    print("Rule parity check passed")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,50 +1,139 @@
-from pathlib import Path
-from database.connection import get_connection
+from database.connection import connection
+from database.etl.incremental import run_incremental, run_user_behavior, current_load_id, read_sql
+from database.etl.promotion import PROMOTION_STEPS, run_promotion, read_sql as read_promotion_sql
+from database.instrumentation import start_run, finish_run
+from database.partitions import maintain_partitions
+from database.scheduler import Step, run_dag
+import hashlib
 import sys
-import subprocess
 
-BASE_DIR = Path(__file__).resolve().parents[1]
+# Steps run on a dependency DAG (database/scheduler.py): the three feature
+# steps only need core.transactions and run concurrently. A step whose inputs
+# did not change since its last successful run is skipped.
+#
+# raw -> core promotion only reads raw rows landed since its ingestion_ts
+# watermark (database/etl/promotion.py).
+#
+# Every step is timed (wall / CPU), counted and stored in meta.pipeline_runs /
+# meta.pipeline_step_metrics and logs/pipeline.jsonl (database/instrumentation.py).
+# PIPELINE_EXPLAIN=1 also stores EXPLAIN (ANALYZE, BUFFERS) plans.
+#
+# python -m scripts.run_pipeline                    # generate new raw data, then ETL
+# python -m scripts.run_pipeline --skip-generation  # ETL over the current raw data
 
-def run_sql_file(path, name):
-    print(f"=== {name} ===")
+def sql_version(sql) -> str:
+    # a changed query invalidates the step's fingerprint
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
 
-    sql_path = BASE_DIR / path
-    sql = sql_path.read_text(encoding="utf-8")
 
-    conn = get_connection()
+def run_promotion_step(core_table, metrics):
+    # pooled connection: commit on success, rollback on error
+    with connection() as conn, conn.cursor() as cur:
+        metrics.rows = run_promotion(cur, core_table, metrics)
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql)
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
 
+def raw_fingerprint(core_table):
+    raw_table, _ = PROMOTION_STEPS[core_table]
+
+    # promotion never reads below its watermark, so only new rows matter
+    def fingerprint(cur):
+        cur.execute(f"SELECT MAX(ingestion_ts) FROM {raw_table}")
+        return [sql_version(read_promotion_sql(core_table)), cur.fetchone()[0]]
+
+    return fingerprint
+
+
+def core_fingerprint(sql):
+    def fingerprint(cur):
+        return [sql_version(sql), current_load_id(cur)]
+
+    return fingerprint
+
+
+def run_feature_step(feature_table, metrics):
+    with connection() as conn, conn.cursor() as cur:
+        metrics.rows = run_incremental(cur, feature_table, metrics)
+
+
+def run_user_behavior_step(metrics):
+    with connection() as conn, conn.cursor() as cur:
+        metrics.rows = run_user_behavior(cur)
+
+
+def run_partition_maintenance(metrics):
+    with connection() as conn, conn.cursor() as cur:
+        summary = maintain_partitions(cur)
+
+    metrics.rows = sum(len(c) for changes in summary.values() for c in changes.values())
 
-def main():
-    print("STEP 1: generate raw data")
-    subprocess.run([sys.executable, "-m", "data_generator.run"], check=True)
+    for table, changes in summary.items():
+        print(
+            f"{table}: created {len(changes['created'])}, "
+            f"dropped {len(changes['dropped'])}, "
+            f"detached {len(changes['detached'])}"
+        )
 
-    run_sql_file("database/etl/raw_to_core_users.sql",
-                "STEP 2.1: raw → core.users")
 
-    run_sql_file("database/etl/raw_to_core_transactions.sql",
-                "STEP 2.2: raw → core.transactions")
+def run_generation(metrics):
+    # in-process: no interpreter start-up, sub-steps nest under this step
+    from data_generator.run import main as generate
 
-    run_sql_file("database/etl/core_to_transaction_feature_1h.sql",
-                "STEP 3.1: features 1h")
+    generate()
 
-    run_sql_file("database/etl/core_to_transaction_feature_24h.sql",
-                "STEP 3.2: features 24h")
 
-    run_sql_file("database/etl/core_to_user_behavior_feature.sql",
-                "STEP 3.3: user behavior features")
+def pipeline_steps(generate=True):
+    steps = [Step("partition_maintenance", run_partition_maintenance)]
+    raw_deps = ["partition_maintenance"]
+
+    if generate:
+        steps.append(Step("generate_raw_data", run_generation, ["partition_maintenance"], retries=0))
+        raw_deps = ["generate_raw_data"]
+
+    steps += [
+        Step("raw_to_core_users",
+             lambda m: run_promotion_step("core.users", m),
+             raw_deps,
+             raw_fingerprint("core.users")),
+
+        # core.transactions references core.users
+        Step("raw_to_core_transactions",
+             lambda m: run_promotion_step("core.transactions", m),
+             raw_deps + ["raw_to_core_users"],
+             raw_fingerprint("core.transactions")),
+
+        Step("transaction_features_1h",
+             lambda m: run_feature_step("transaction_features_1h", m),
+             ["raw_to_core_transactions"],
+             core_fingerprint(read_sql("transaction_features_1h"))),
+
+        Step("transaction_features_24h",
+             lambda m: run_feature_step("transaction_features_24h", m),
+             ["raw_to_core_transactions"],
+             core_fingerprint(read_sql("transaction_features_24h"))),
+
+        # windows slide with NOW(): no fingerprint, runs every time
+        Step("user_behavior_features",
+             run_user_behavior_step,
+             ["raw_to_core_transactions"]),
+    ]
+
+    return steps
+
+
+def main(argv):
+    run_id = start_run("run_pipeline")
+    print(f"Pipeline run {run_id}")
+
+    try:
+        run_dag(pipeline_steps(generate="--skip-generation" not in argv))
+    except BaseException as e:
+        finish_run("failed", f"{type(e).__name__}: {e}")
+        raise
+
+    finish_run("success")
 
     print("PIPELINE FINISHED SUCCESSFULLY")
 
 
 if __name__ == "__main__": 
-    main()
+    main(sys.argv[1:])